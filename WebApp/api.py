@@ -0,0 +1,77 @@
+# api.py
+import json
+import numpy as np
+from flask import request, jsonify, Response, stream_with_context
+# change these imports between render and local
+from pipeline import iter_pipeline_results, resolve_options
+from preload import readiness
+
+# Largest batch accepted in a single request
+MAX_PAIRS = 5000
+
+# Convert NumPy scalars left in the results to plain Python values
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+# Read and validate the request body
+# Accepts {"pairs": [[StoreID, ItemID], ...] or [{"StoreID": .., "ItemID": ..}, ...], "options": {...}}
+# returns (pairs, options) or raises ValueError with a message for the client
+def parse_forecast_request(body):
+    if not isinstance(body, dict) or 'pairs' not in body:
+        raise ValueError("Request body must be a JSON object with a 'pairs' list")
+
+    raw_pairs = body['pairs']
+    if not isinstance(raw_pairs, list) or not raw_pairs:
+        raise ValueError("'pairs' must be a non-empty list")
+    if len(raw_pairs) > MAX_PAIRS:
+        raise ValueError(f"At most {MAX_PAIRS} pairs can be requested at once")
+
+    pairs = []
+    for pair in raw_pairs:
+        if isinstance(pair, dict):
+            pair = (pair.get('StoreID'), pair.get('ItemID'))
+        if not isinstance(pair, (list, tuple)) or len(pair) != 2:
+            raise ValueError(f"Invalid pair: {pair}")
+        # bool is a subclass of int and int() would truncate floats and parse strings, so only ints pass
+        if not all(isinstance(value, int) and not isinstance(value, bool) for value in pair):
+            raise ValueError(f"StoreID and ItemID must be integers: {list(pair)}")
+        pairs.append((pair[0], pair[1]))
+
+    options = resolve_options(body.get('options'))
+    return pairs, options
+
+# Register the bulk forecast and health check routes on the Dash Flask server
+def register_api_routes(server):
+
+    # Readiness check for the load balancer: 200 once models and reference data are loaded
+    @server.route('/healthz/ready', methods=['GET'])
+    def ready():
+        is_ready, details = readiness()
+        return jsonify({'status': 'ready' if is_ready else 'not ready', **details}), 200 if is_ready else 503
+
+    # Run every pair and return all results in one JSON document
+    @server.route('/api/forecast', methods=['POST'])
+    def forecast_json():
+        try:
+            pairs, options = parse_forecast_request(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        results = list(iter_pipeline_results(pairs, options))
+        return Response(json.dumps({'results': results}, default=_json_default), mimetype='application/json')
+
+    # Stream one JSON line per pair as soon as it completes
+    @server.route('/api/forecast/stream', methods=['POST'])
+    def forecast_ndjson():
+        try:
+            pairs, options = parse_forecast_request(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        def generate():
+            for result in iter_pipeline_results(pairs, options):
+                yield json.dumps(result, default=_json_default) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
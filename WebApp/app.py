@@ -1,13 +1,17 @@
 # app.py
 import os
 import dash
-from dash import html, dcc
+from dash import html, dcc, ctx, no_update
+from dash.exceptions import PreventUpdate
 from dash.dependencies import Input, Output, State
 import pandas as pd
 import plotly.graph_objs as fig
 # change these imports between render and local
 from layout import create_layout
-from callback import process_selection
+from callback import process_selection, refine_selection, create_history_figure
+from api import register_api_routes
+from scheduler import start_precompute_scheduler
+from preload import preload_shared_data
 from path_utils import BASE_DIR
 
 app = dash.Dash(__name__, assets_folder=os.path.join(BASE_DIR, "assets"), suppress_callback_exceptions=True)
@@ -15,18 +19,36 @@ server = app.server
 app.title = "DL Model Dashboard"
 app.layout = create_layout()
 
+# Register the bulk forecast API routes on the Flask server
+register_api_routes(server)
+
 # Register callbacks
+# A Submit on a cold pair returns a preview forecast and enables refine-interval, whose ticks
+# replace it with the full forecast once that is ready and then disable the interval again
 @app.callback(
     [Output('inventory-graph', 'figure'),
      Output('sales-graph', 'figure'),
      Output('purchases-graph', 'figure'),
      Output('results-container', 'children'),
-     Output('loading-output', 'children')],
-    [Input('submit-button', 'n_clicks')],
+     Output('loading-output', 'children'),
+     Output('refine-store', 'data'),
+     Output('refine-interval', 'disabled')],
+    [Input('submit-button', 'n_clicks'),
+     Input('refine-interval', 'n_intervals')],
     [State('store-dropdown', 'value'),
-     State('item-dropdown', 'value')]
+     State('item-dropdown', 'value'),
+     State('refine-store', 'data')]
 )
-def update_graphs(n_clicks, store_id, item_id):
+def update_graphs(n_clicks, n_intervals, store_id, item_id, refine):
+    if ctx.triggered_id == 'refine-interval':
+        result = refine_selection(refine) if refine else None
+        if result is None:
+            if refine:
+                raise PreventUpdate
+            return no_update, no_update, no_update, no_update, "", None, True
+        inventory_fig, sales_fig, purchases_fig, results_text = result
+        return inventory_fig, sales_fig, purchases_fig, results_text, "", None, True
+    
     if n_clicks is None or store_id is None or item_id is None:
         # Return empty figures for initial load
         empty_fig = fig.Figure().update_layout(
@@ -34,13 +56,29 @@ def update_graphs(n_clicks, store_id, item_id):
             xaxis=dict(title="Date"),
             yaxis=dict(title="Value")
         )
-        return empty_fig, empty_fig, empty_fig, html.Div("Select store and item, then click Submit"), ""
+        return empty_fig, empty_fig, empty_fig, html.Div("Select store and item, then click Submit"), "", None, True
     
     # Process the selection and generate the data
-    inventory_fig, sales_fig, purchases_fig, results_text = process_selection(store_id, item_id)
+    inventory_fig, sales_fig, purchases_fig, results_text, refine = process_selection(store_id, item_id)
     
-    return inventory_fig, sales_fig, purchases_fig, results_text, ""
+    return inventory_fig, sales_fig, purchases_fig, results_text, "", refine, refine is None
+
+# History graph, a lookup in the history cube so it does not wait for the Submit button
+@app.callback(
+    Output('history-graph', 'figure'),
+    [Input('store-dropdown', 'value'),
+     Input('item-dropdown', 'value'),
+     Input('history-grain', 'value'),
+     Input('history-scope', 'value')]
+)
+def update_history_graph(store_id, item_id, grain, scope):
+    return create_history_figure(store_id, item_id, grain, scope)
 
+# Development server, for production use: gunicorn -c gunicorn.conf.py (see wsgi.py)
 if __name__ == '__main__':
+    # The debug reloader runs this file in two processes, only preload and precompute in the one serving requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        preload_shared_data()
+        start_precompute_scheduler()
     port = int(os.environ.get("PORT", 8050))
     app.run(debug=True, host='0.0.0.0', port=port)
\ No newline at end of file
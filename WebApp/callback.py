@@ -1,25 +1,103 @@
 # callback.py
 import pandas as pd
-from dash import html
+from dash import html, no_update, Patch
 import plotly.express as px
+import plotly.graph_objs as go
 import datetime
 import os
 # change these imports between render and local
-from sales import run_sales_forecast
-from ledger import build_inventory_ledger
-from purchases import apply_purchase_strategy
-from data_loader import get_opening_stock, load_inventory_items, load_store_data
-from path_utils import get_data_path, DATA_DIR, MODELS_DIR
+from pipeline import compute_pair_plan
+from scheduler import get_scheduler
+from progressive import preview_trees, start_refinement, collect_refinement, forecast_deviation
+from data_loader import load_inventory_items, load_store_data, load_history_cube
+from path_utils import DATA_DIR, MODELS_DIR
+from store import save_ledger, save_purchase_orders
+from src.DataPrep.history_cube import ALL_ITEMS
 
 # Orchestrates the backend steps when a form is submitted
 # API endpoint to process the selection of store and item
 # This function is called when the user selects a store and item from the dropdowns
+# On a cold pair (no current precomputed plan) the figures are a preview from a subset of the
+# sales model's trees without purchase planning and the full plan is computed in the background,
+# refine_selection picks it up
+# returns (inventory_fig, sales_fig, purchases_fig, results_text, refine) where refine is None for a
+# full plan, otherwise the JSON serialisable state that refine_selection needs
 def process_selection(store_id, item_id):
     # Create directories if they don't exist
     for directory in [DATA_DIR, MODELS_DIR]:
         if not os.path.exists(directory):
             os.makedirs(directory)
     
+    # Use the precomputed plan for popular pairs if it is still current
+    scheduler = get_scheduler()
+    scheduler.record_request(store_id, item_id)
+    plan = scheduler.get_cached(store_id, item_id)
+    
+    if plan is None:
+        n_trees, total_trees, bias = preview_trees()
+        if n_trees is not None:
+            # Steps 1-3 with a forecast from the first n_trees trees, the full plan follows
+            plan = compute_pair_plan(store_id, item_id, n_trees=n_trees, purchases=False)
+            refine = {
+                'job': start_refinement(store_id, item_id),
+                'StoreID': store_id,
+                'ItemID': item_id,
+                'preview': plan[1]['SalesQuantity'].tolist(),
+                'preview_trees': n_trees,
+                'total_trees': total_trees
+            }
+            note = html.P(f"Preview from {n_trees} of {total_trees} trees without purchase orders, its total "
+                          f"sales are {bias:+.1f}% off the full forecast (measured on this model). "
+                          f"Planning the purchases on the full forecast...")
+            return (*create_plan_figures(store_id, item_id, plan, note, preview_bias=bias), refine)
+        
+        # Steps 1-4: Opening stock, sales forecast, inventory ledger and purchase orders
+        plan = compute_pair_plan(store_id, item_id)
+        scheduler.put(store_id, item_id, plan)
+    
+    return (*save_and_create_figures(store_id, item_id, plan), None)
+
+# Replace a preview with the full plan once its background refinement has finished
+# If the refinement failed the preview stays and the summary says why
+# returns (inventory_fig, sales_fig, purchases_fig, results_text), or None while it is still running
+def refine_selection(refine):
+    store_id, item_id = refine['StoreID'], refine['ItemID']
+    job = collect_refinement(refine['job'])
+    if job == 'running':
+        return None
+    
+    if job['error'] is not None:
+        print(f"Refinement failed for store {store_id}, item {item_id}: {job['error']}")
+        results_text = Patch()
+        results_text['props']['children'].append(html.P(
+            f"The full forecast could not be computed ({job['error']}), the preview is shown "
+            f"without purchase orders. Submit again to retry."
+        ))
+        return no_update, no_update, no_update, results_text
+    plan = job['plan']
+    
+    deviation = forecast_deviation(refine['preview'], plan[1])
+    print(f"Preview deviation for store {store_id}, item {item_id} "
+          f"({refine['preview_trees']} of {refine['total_trees']} trees): {deviation}")
+    note = html.P(
+        f"Refined to the full {refine['total_trees']} trees. The preview was off by "
+        f"{deviation['mae']:.2f} units per day on average (at most {deviation['max_abs']:.0f}, "
+        f"{deviation['days_changed']} days changed) and {deviation['total_pct']:+.1f}% on total sales."
+    )
+    return save_and_create_figures(store_id, item_id, plan, note)
+
+# Save the ledger and purchase orders of a full plan and create its figures
+def save_and_create_figures(store_id, item_id, plan, note=None):
+    _, _, purchases_data, sorted_inventory = plan
+    save_ledger(store_id, item_id, sorted_inventory)
+    save_purchase_orders(store_id, item_id, purchases_data)
+    return create_plan_figures(store_id, item_id, plan, note)
+
+# Create the inventory, sales and purchases figures and the text summary of a plan
+# note is an optional extra line for the summary, preview_bias (in percent) marks the sales forecast
+# as a preview and gives its measured bias on total sales
+def create_plan_figures(store_id, item_id, plan, note=None, preview_bias=None):
+    preview = preview_bias is not None
     # Load item and store details for display purposes
     items_df = load_inventory_items()
     stores_df = load_store_data()
@@ -27,22 +105,7 @@ def process_selection(store_id, item_id):
     item_desc = items_df[items_df['ItemID'] == item_id]['Description'].iloc[0] if not items_df[items_df['ItemID'] == item_id].empty else f"Item {item_id}"
     store_loc = stores_df[stores_df['StoreID'] == store_id]['Location'].iloc[0] if not stores_df[stores_df['StoreID'] == store_id].empty else f"Store {store_id}"
     
-    # Step 1: Get the opening stock and create inventory entry
-    opening_stock_data = get_opening_stock(store_id, item_id)
-    
-    # Step 2: Generate sales forecast
-    sales_data = run_sales_forecast(store_id, item_id)
-    
-    # Step 3: Build inventory ledger with sales data
-    inventory_data = build_inventory_ledger(opening_stock_data, sales_data)
-    
-    # Step 4: Generate purchase orders based on inventory levels
-    purchases_data, updated_inventory = apply_purchase_strategy(inventory_data, store_id, item_id)
-    
-    # Sort inventory data by date
-    sorted_inventory = updated_inventory.sort_values(by='Date')
-    inventory_path = get_data_path('inventoryLedger.csv')
-    sorted_inventory.to_csv(inventory_path, index=False)
+    opening_stock_data, sales_data, purchases_data, sorted_inventory = plan
     
     # Create the inventory graph
     inventory_fig = px.line(
@@ -57,14 +120,12 @@ def process_selection(store_id, item_id):
     )
     
     # Create the sales graph
-    sales_path = get_data_path('sales.csv')
-    sales_df = pd.read_csv(sales_path)
-    sales_df = sales_df[(sales_df['StoreID'] == store_id) & (sales_df['ItemID'] == item_id)]
+    sales_df = sales_data
     sales_fig = px.bar(
         sales_df, 
         x='SalesDate', 
         y='SalesQuantity',
-        title=f'Sales Forecast for {store_loc}, Item {item_id} - {item_desc}'
+        title=f'Sales Forecast for {store_loc}, Item {item_id} - {item_desc}' + (f' (preview, {preview_bias:+.1f}% on total sales)' if preview else '')
     )
     sales_fig.update_layout(
         xaxis_title='Date',
@@ -72,15 +133,13 @@ def process_selection(store_id, item_id):
     )
     
     # Create the purchases graph
-    purchases_path = get_data_path('purchases.csv')
-    purchases_df = pd.read_csv(purchases_path)
-    purchases_df = purchases_df[(purchases_df['StoreID'] == store_id) & (purchases_df['ItemID'] == item_id)]
+    purchases_df = purchases_data
     purchases_fig = px.scatter(
         purchases_df, 
         x='PODate', 
         y='Quantity',
         size='Quantity',
-        title=f'Purchase Orders for {store_loc}, Item {item_id} - {item_desc}'
+        title=f'Purchase Orders for {store_loc}, Item {item_id} - {item_desc}' + (' (planned on the full forecast)' if preview else '')
     )
     purchases_fig.update_layout(
         xaxis_title='Purchase Order Date',
@@ -97,7 +156,41 @@ def process_selection(store_id, item_id):
         html.P(f"Total sales forecast: {total_sales} units"),
         html.P(f"Total purchases planned: {total_purchases} units"),
         html.P(f"Final stock level: {final_stock} units"),
-        html.P(f"Simulation period: Jan 1 - July 31, 2025")
+        html.P(f"Simulation period: Jan 1 - July 31, 2025"),
+        *([note] if note is not None else [])
     ])
     
-    return inventory_fig, sales_fig, purchases_fig, results_text
\ No newline at end of file
+    return inventory_fig, sales_fig, purchases_fig, results_text
+
+# Create the 2016 history graph for a pair (scope 'item') or a whole store (scope 'store')
+# Sales and received purchase quantities are bars, the purchase order count a line on a second axis
+def create_history_figure(store_id, item_id, grain='week', scope='item'):
+    cube = load_history_cube()
+    if store_id is None or (scope == 'item' and item_id is None) or cube is None:
+        message = "History not available" if cube is None else "Select a store and item to see their history"
+        return go.Figure().update_layout(title=message, xaxis=dict(title="Date"), yaxis=dict(title="Quantity"))
+    
+    stores_df = load_store_data()
+    store_loc = stores_df[stores_df['StoreID'] == store_id]['Location'].iloc[0] if not stores_df[stores_df['StoreID'] == store_id].empty else f"Store {store_id}"
+    grain_label = {'day': 'Daily', 'week': 'Weekly', 'month': 'Monthly'}.get(grain, grain)
+    if scope == 'store':
+        history = cube.lookup(store_id, ALL_ITEMS, grain)
+        title = f'2016 {grain_label} History for {store_loc}, All Items'
+    else:
+        history = cube.lookup(store_id, item_id, grain)
+        title = f'2016 {grain_label} History for {store_loc}, Item {item_id}'
+    
+    history_fig = go.Figure([
+        go.Bar(x=history['Period'], y=history['SalesQuantity'], name='Sales'),
+        go.Bar(x=history['Period'], y=history['PurchaseQuantity'], name='Purchases received'),
+        go.Scatter(x=history['Period'], y=history['OrderCount'], name='Purchase orders',
+                   mode='lines+markers', yaxis='y2'),
+    ])
+    history_fig.update_layout(
+        title=title if not history.empty else f'{title} (no history)',
+        barmode='group',
+        xaxis_title='Date',
+        yaxis_title='Quantity',
+        yaxis2=dict(title='Purchase Orders', overlaying='y', side='right', rangemode='tozero')
+    )
+    return history_fig
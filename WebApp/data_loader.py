@@ -2,51 +2,73 @@
 import pandas as pd
 import os
 # change these imports between render and local
-from path_utils import get_data_path
+from path_utils import get_data_path, get_project_data_path
+from store import get_opening_stock_row, insert_opening_stock_if_missing
+from src.DataPrep.schema import read_table
+from src.DataPrep.history_cube import HistoryCube
+
+# Stores and Inventory reference data, loaded once per process (before forking when preloaded)
+# Callers only read these DataFrames, so every request and worker shares the same copy
+_reference_cache = {}
 
 # Load the opening stock data using store_id and item_id
 def get_opening_stock(store_id, item_id):
     
-    # Load the opening stock data using absolute path
-    opening_stock_path = get_data_path('OpeningStock.csv')
-    print(f"Loading opening stock from: {opening_stock_path}")
-    opening_stock = pd.read_csv(opening_stock_path)
-    
-    # Filter for the requested store and item
-    filtered_data = opening_stock[(opening_stock['StoreID'] == store_id) & 
-                                 (opening_stock['ItemID'] == item_id)]
+    # Indexed point lookup in the opening stock table
+    opening_stock = get_opening_stock_row(store_id, item_id)
     
     # If no data found, create a default entry
-    if filtered_data.empty:
-        default_data = {
-            'StoreID': store_id,
-            'ItemID': item_id,
-            'onHand': 100,  # Default starting inventory
-            'startDate': '2024-12-31'
-        }
-        
-        # Add to the CSV
-        opening_stock = pd.concat([opening_stock, pd.DataFrame([default_data])], ignore_index=True)
-        opening_stock.to_csv(opening_stock_path, index=False)
-        
-        return default_data
+    if opening_stock is None:
+        opening_stock = insert_opening_stock_if_missing(
+            store_id,
+            item_id,
+            on_hand=100,  # Default starting inventory
+            start_date='2024-12-31'
+        )
     
-    # Return the first matching row as a dictionary
-    return filtered_data.iloc[0].to_dict()
+    return opening_stock
 
 # Load the store data using absolute path
 def load_store_data():
-    store_path = get_data_path('Stores.csv')
-    print(f"Loading store data from: {store_path}")
-    return pd.read_csv(store_path)
+    if 'stores' not in _reference_cache:
+        store_path = get_data_path('Stores.csv')
+        print(f"Loading store data from: {store_path}")
+        _reference_cache['stores'] = read_table(store_path, 'Stores')
+    return _reference_cache['stores']
 
 # Load the inventory data using absolute path
 def load_inventory_items():
-    inventory_path = get_data_path('Inventory.csv')
-    print(f"Loading inventory data from: {inventory_path}")
-    df = pd.read_csv(inventory_path)
-    print(f"Loaded inventory columns: {df.columns.tolist()}")
-    return df
+    if 'inventory' not in _reference_cache:
+        inventory_path = get_data_path('Inventory.csv')
+        print(f"Loading inventory data from: {inventory_path}")
+        df = read_table(inventory_path, 'Inventory')
+        print(f"Loaded inventory columns: {df.columns.tolist()}")
+        _reference_cache['inventory'] = df
+    return _reference_cache['inventory']
+
+# Load the 2016 sales and purchases history cube built by data_load.process_all_data
+# returns None if the cube has not been built
+def load_history_cube():
+    if 'history_cube' not in _reference_cache:
+        cube_path = get_project_data_path('Processed', 'history_cube.npz')
+        if not os.path.exists(cube_path):
+            print(f"History cube not found at: {cube_path}")
+            return None
+        print(f"Loading history cube from: {cube_path}")
+        _reference_cache['history_cube'] = HistoryCube.load(cube_path)
+    return _reference_cache['history_cube']
+
+# Load the historical lead times (ReceivingDate - PODate) from the processed purchases
+def load_historical_lead_times():
+    purchases_path = get_project_data_path('Processed', 'Purchases.csv')
+    print(f"Loading historical purchases from: {purchases_path}")
+    purchases_df = read_table(purchases_path, 'Purchases', usecols=['StoreID', 'ItemID', 'PODate', 'ReceivingDate'])
+    lead_times = (purchases_df['ReceivingDate'] - purchases_df['PODate']).dt.days.astype('int16')
+    return pd.DataFrame({
+        'StoreID': purchases_df['StoreID'],
+        'ItemID': purchases_df['ItemID'],
+        'LeadTimeDays': lead_times
+    })
 
 # Copy the PKL model files from model training directory to the website directory
 def copy_model_files(model_name):
@@ -0,0 +1,37 @@
+# gunicorn.conf.py
+# Pre-fork serving for the dashboard and API: gunicorn -c gunicorn.conf.py
+# Environment variables:
+#   PORT                 port to listen on (default 8050)
+#   WEB_CONCURRENCY      worker processes (default: number of CPU cores)
+#   GUNICORN_THREADS     threads per worker (default 4)
+#   GUNICORN_TIMEOUT     seconds before a silent worker is restarted (default 120)
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:application'
+bind = f"0.0.0.0:{os.environ.get('PORT', 8050)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# Import wsgi.py (and load the models and reference data) in the parent before forking
+preload_app = True
+
+# Move everything loaded so far out of the garbage collector's view, otherwise the first
+# collection in each worker touches every object and copies the shared pages
+def when_ready(server):
+    gc.collect()
+    gc.freeze()
+
+# SQLite connections must not be shared across a fork
+def pre_fork(server, worker):
+    from store import close_connection
+    close_connection()
+
+# Each worker has its own plan cache, so each runs its own precompute thread
+# (the workers split PRECOMPUTE_CPU_BUDGET, set PRECOMPUTE_ENABLED=0 to turn it off)
+def post_fork(server, worker):
+    from scheduler import start_precompute_scheduler
+    start_precompute_scheduler(processes=server.cfg.workers)
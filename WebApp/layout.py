@@ -12,13 +12,13 @@ def create_layout():
     
     # Create dropdown options with descriptions
     store_options = [
-        {'label': f"{row['StoreID']} - {row['Location']}", 'value': row['StoreID']} 
+        {'label': f"{row['StoreID']} - {row['Location']}", 'value': int(row['StoreID'])} 
         for _, row in stores_df.iterrows()
     ]
     
     # Create dropdown options for items (there could be hundreds)
     item_options = [
-        {'label': f"{row['ItemID']} - {row['Description']}", 'value': row['ItemID']} 
+        {'label': f"{row['ItemID']} - {row['Description']}", 'value': int(row['ItemID'])} 
         for _, row in items_df.iterrows()
     ]
     
@@ -52,6 +52,10 @@ def create_layout():
                 type="circle",
                 children=html.Div(id="loading-output")
             ),
+            
+            # State of a preview forecast and the poll that replaces it with the full forecast
+            dcc.Store(id='refine-store'),
+            dcc.Interval(id='refine-interval', interval=500, disabled=True),
         ], className="controls-container"),
         
         html.Div(id='results-container', className="results-text"),
@@ -71,6 +75,33 @@ def create_layout():
             dcc.Graph(id='purchases-graph')
         ], className="graph-container"),
         
+        # 2016 actuals, updated as soon as the store, item, grain or scope changes
+        html.Div([
+            html.H3("2016 Sales and Purchase History"),
+            html.Div([
+                dcc.RadioItems(
+                    id='history-grain',
+                    options=[
+                        {'label': 'Day', 'value': 'day'},
+                        {'label': 'Week', 'value': 'week'},
+                        {'label': 'Month', 'value': 'month'}
+                    ],
+                    value='week',
+                    inline=True
+                ),
+                dcc.RadioItems(
+                    id='history-scope',
+                    options=[
+                        {'label': 'Selected item', 'value': 'item'},
+                        {'label': 'Whole store', 'value': 'store'}
+                    ],
+                    value='item',
+                    inline=True
+                ),
+            ], className="history-controls"),
+            dcc.Graph(id='history-graph')
+        ], className="graph-container"),
+        
         html.Link(
             rel='stylesheet',
             href='/assets/styles.css'
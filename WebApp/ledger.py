@@ -2,10 +2,10 @@
 import pandas as pd
 import os
 # change these imports between render and local
-from path_utils import get_data_path
+from store import save_ledger
 
 # Build the inventory ledger with opening stock and sales transactions
-def build_inventory_ledger(opening_stock_data, sales_data):
+def build_inventory_ledger(opening_stock_data, sales_data, save=True):
     # Initialize inventory ledger
     inventory_data = []
     
@@ -48,8 +48,8 @@ def build_inventory_ledger(opening_stock_data, sales_data):
     # Convert to DataFrame
     inventory_df = pd.DataFrame(inventory_data)
     
-    # Save to CSV using absolute path
-    inventory_path = get_data_path('inventoryLedger.csv')
-    inventory_df.to_csv(inventory_path, index=False)
+    # Save to the ledger store
+    if save:
+        save_ledger(store_id, item_id, inventory_df)
     
     return inventory_df
\ No newline at end of file
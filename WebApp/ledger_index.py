@@ -0,0 +1,194 @@
+# ledger_index.py
+# Point-in-time stock index over inventory ledgers
+# For every store-item pair the ledger dates are kept sorted with the running total of the entry
+# quantities (the stock level after each entry, the Opening entry's quantity is the opening stock).
+# All pairs share contiguous arrays sorted by (StoreID, ItemID, date), a pair's entries are one slice
+# given by offsets, so
+#   stock_on(store, item, date)  is a binary search in the pair's slice, and
+#   stock_levels_on(date)        is one vectorized binary search over every pair.
+# Entries appended to a pair are buffered and inserted into the arrays on the next query, so many
+# appends cost one merge, and a merge only sorts the new entries.
+# get_ledger_index returns an index over the ledgers in the store that store.save_ledger keeps current
+# (for the saves made by this process, each gunicorn worker has its own).
+import threading
+import numpy as np
+import pandas as pd
+# change these imports between render and local
+from store import load_all_ledgers, add_ledger_listener
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+# Entries are ordered by one int64 key: StoreID, ItemID and the day (days since EPOCH) packed into
+# 23, 20 and 20 bits (the sign bit is left clear)
+ID_BITS = 20
+DAY_BITS = 20
+STORE_BITS = 63 - ID_BITS - DAY_BITS
+
+# Values outside these ranges would overflow into a neighbouring field and alias another key
+# (days cover 1970-01-01 to 4840-11-25, past the last date pandas can hold, so only dates before 1970 fail)
+MAX_STORE_ID = (1 << STORE_BITS) - 1
+MAX_ITEM_ID = (1 << ID_BITS) - 1
+MAX_DAY = (1 << DAY_BITS) - 1
+
+
+# Raise ValueError if any of the values is outside 0..maximum
+def _check_range(name, values, maximum):
+    values = np.asarray(values, dtype=np.int64)
+    if values.size and (values.min() < 0 or values.max() > maximum):
+        bad = values[(values < 0) | (values > maximum)][0]
+        raise ValueError(f"{name} must be between 0 and {maximum} for the ledger index, got {bad}")
+    return values
+
+# Convert ledger dates (strings, datetimes) to days since EPOCH
+def _to_days(dates):
+    days = (pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[D]') - EPOCH).astype(np.int64)
+    return _check_range('Ledger dates (days since 1970-01-01)', days, MAX_DAY)
+
+# Convert one query date to days since EPOCH
+# Dates outside the key range are clamped to it, before 1970 no pair has entries and after the last
+# day every entry is on or before the date
+def _to_day(date):
+    return min(max(int((np.datetime64(pd.Timestamp(date), 'D') - EPOCH).astype(np.int64)), -1), MAX_DAY)
+
+# Key of each (StoreID, ItemID) pair, shifted so a day can be added
+def _pair_keys(store_ids, item_ids):
+    store_ids = _check_range('StoreID', store_ids, MAX_STORE_ID)
+    item_ids = _check_range('ItemID', item_ids, MAX_ITEM_ID)
+    return ((store_ids << ID_BITS) | item_ids) << DAY_BITS
+
+class LedgerIndex:
+    def __init__(self):
+        self.pairs = np.empty((0, 2), dtype=np.int64)  # (StoreID, ItemID) of each row, sorted
+        self.offsets = np.zeros(1, dtype=np.int64)     # entries of row r are offsets[r]:offsets[r + 1]
+        self.dates = np.empty(0, dtype=np.int64)
+        self.quantities = np.empty(0, dtype=np.int64)
+        self.levels = np.empty(0, dtype=np.int64)      # running total of quantities within each pair
+        self._keys = np.empty(0, dtype=np.int64)       # pair key + date of each entry, sorted
+        self._rows = {}
+        self._pending = []                             # (keys, quantities) to insert
+        self._replaced = set()                         # pair keys whose indexed entries are dropped on merge
+        self._lock = threading.RLock()
+
+    # Build an index from ledger DataFrames (build_inventory_ledger or apply_purchase_strategy output)
+    @classmethod
+    def from_ledgers(cls, ledgers):
+        index = cls()
+        for ledger in ledgers:
+            index.append(ledger)
+        index._merge()
+        return index
+
+    # Build an index from every ledger saved in the store
+    @classmethod
+    def from_store(cls):
+        return cls.from_ledgers([load_all_ledgers()])
+
+    # Add ledger entries (Date, StoreID, ItemID, Quantity columns), any number of pairs at once
+    def append(self, entries):
+        if entries.empty:
+            return
+        keys = _pair_keys(entries['StoreID'].to_numpy(), entries['ItemID'].to_numpy()) + _to_days(entries['Date'].to_numpy())
+        with self._lock:
+            self._pending.append((keys, entries['Quantity'].to_numpy(dtype=np.int64)))
+
+    # Replace a pair's ledger with a new one, as store.save_ledger does (it calls this for the shared index)
+    def replace(self, store_id, item_id, ledger):
+        with self._lock:
+            self._merge()
+            self._replaced.add(int(_pair_keys(store_id, item_id)))
+            self.append(ledger)
+
+    # Insert the pending entries into the contiguous arrays
+    # The pending entries are sorted on their own and inserted with a binary search, the indexed
+    # entries keep their order
+    def _merge(self):
+        with self._lock:
+            if not self._pending and not self._replaced:
+                return
+            keys, quantities = self._keys, self.quantities
+            if self._replaced:
+                keep = ~np.isin(keys >> DAY_BITS << DAY_BITS, np.fromiter(self._replaced, dtype=np.int64))
+                keys, quantities = keys[keep], quantities[keep]
+
+            if self._pending:
+                new_keys, new_quantities = (np.concatenate(column) for column in zip(*self._pending))
+                # Only the stock at the end of each day is queried, so the order of same-day entries doesn't matter
+                order = np.argsort(new_keys, kind='stable')
+                new_keys, new_quantities = new_keys[order], new_quantities[order]
+                positions = np.searchsorted(keys, new_keys, side='right')
+                keys = np.insert(keys, positions, new_keys)
+                quantities = np.insert(quantities, positions, new_quantities)
+            self._pending = []
+            self._replaced = set()
+            self._set_entries(keys, quantities)
+
+    # Set the arrays from the sorted entry keys and their quantities
+    def _set_entries(self, keys, quantities):
+        pair_keys = keys >> DAY_BITS
+        starts = np.flatnonzero(np.r_[True, pair_keys[1:] != pair_keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+        self._keys, self.quantities = keys, quantities
+        self.dates = keys & ((1 << DAY_BITS) - 1)
+        self.pairs = np.column_stack([pair_keys[starts] >> ID_BITS, pair_keys[starts] & ((1 << ID_BITS) - 1)]).reshape(-1, 2)
+        self.offsets = np.r_[starts, len(keys)].astype(np.int64)
+
+        # Running totals restart at each pair
+        totals = np.cumsum(quantities)
+        pair_start_totals = np.r_[0, totals][starts]
+        self.levels = totals - np.repeat(pair_start_totals, np.diff(self.offsets))
+        self._rows = {(int(s), int(i)): row for row, (s, i) in enumerate(self.pairs.tolist())}
+
+    # Stock level of a pair at the end of a date, None if the pair has no entries on or before it
+    def stock_on(self, store_id, item_id, date):
+        with self._lock:
+            self._merge()
+            row = self._rows.get((int(store_id), int(item_id)))
+            if row is None:
+                return None
+            start, end = self.offsets[row], self.offsets[row + 1]
+            position = np.searchsorted(self.dates[start:end], _to_day(date), side='right')
+            return int(self.levels[start + position - 1]) if position else None
+
+    # Stock level of every pair at the end of a date, pairs with no entries on or before it are left out
+    # returns a DataFrame with StoreID, ItemID and StockLevel
+    def stock_levels_on(self, date):
+        with self._lock:
+            self._merge()
+            day = _to_day(date)
+
+            # Search keys are ordered by pair and then date, so one search covers every pair
+            positions = np.searchsorted(self._keys, _pair_keys(self.pairs[:, 0], self.pairs[:, 1]) + day, side='right') - 1
+            found = positions >= self.offsets[:-1]
+
+            return pd.DataFrame({
+                'StoreID': self.pairs[found, 0],
+                'ItemID': self.pairs[found, 1],
+                'StockLevel': self.levels[positions[found]]
+            })
+
+    # Pairs whose stock level at the end of a date is below a threshold (e.g. the reorder point)
+    # returns a DataFrame with StoreID, ItemID and StockLevel
+    def below_threshold(self, date, threshold):
+        levels = self.stock_levels_on(date)
+        return levels[levels['StockLevel'] < threshold].reset_index(drop=True)
+
+
+# ==================================================================================
+# Shared index
+
+_shared_index = None
+_shared_lock = threading.Lock()
+
+# Index over the ledgers saved in the store, built on first use
+# It is registered with store.save_ledger before the ledgers are loaded, and holds its lock while
+# loading, so a ledger saved meanwhile is replaced after the load instead of being lost
+def get_ledger_index():
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            index = LedgerIndex()
+            with index._lock:
+                add_ledger_listener(index.replace)
+                index.append(load_all_ledgers())
+                index._merge()
+            _shared_index = index
+    return _shared_index
@@ -0,0 +1,315 @@
+# load_test.py
+# Load generator for the dashboard: replays Submit clicks against a running server by posting
+# to the Dash /_dash-update-component endpoint that drives update_graphs, and reports latency
+# percentiles, throughput and error rate.
+# When a Submit returns a preview forecast the request then polls refine-interval as the page
+# does, so the report has both the time to the first figures and the time to the full forecast.
+#
+# Run from the WebApp folder, e.g.
+#   python load_test.py --start-server gunicorn --concurrency 8 --requests 400 --repeat-ratio 0.5
+#   python load_test.py --url http://localhost:8050 --concurrency 4 --mix uniform
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import numpy as np
+# change these imports between render and local
+from path_utils import BASE_DIR, get_data_path, get_project_data_path
+from src.DataPrep.schema import read_table
+
+# The callback is found by its trigger, so the payload follows any change to its outputs or states
+SUBMIT_INPUT = ('submit-button', 'n_clicks')
+PAIR_STATES = {'store-dropdown': 'StoreID', 'item-dropdown': 'ItemID'}
+
+# Poll that replaces a preview forecast with the full forecast, and the state it carries
+REFINE_INPUT = ('refine-interval', 'n_intervals')
+REFINE_STATE = 'refine-store'
+REFINE_POLL_SECONDS = 0.5
+
+
+# ==================================================================================
+# Workload
+
+# Candidate store-item pairs and their request weights
+# mix 'volume' weights pairs by their share of historical sales (popular pairs get most traffic),
+# 'uniform' picks any pair with opening stock equally often
+# pool_size keeps only the top pairs by weight (all pairs if None)
+# returns (pairs array of [StoreID, ItemID], weights array)
+def load_pair_pool(mix='volume', pool_size=None):
+    if mix == 'volume':
+        sales_df = read_table(get_project_data_path('Processed', 'Sales.csv'), 'Sales',
+                              usecols=['StoreID', 'ItemID', 'SalesQuantity'])
+        volume = sales_df.groupby(['StoreID', 'ItemID'])['SalesQuantity'].sum().sort_values(ascending=False)
+        pairs = np.array(volume.index.tolist())
+        weights = volume.to_numpy(dtype=float)
+    elif mix == 'uniform':
+        opening_stock = read_table(get_data_path('OpeningStock.csv'), 'OpeningStock', usecols=['StoreID', 'ItemID'])
+        pairs = opening_stock.drop_duplicates().to_numpy()
+        weights = np.ones(len(pairs))
+    else:
+        raise ValueError(f"Unknown pair mix: {mix}")
+
+    if pool_size is not None:
+        pairs, weights = pairs[:pool_size], weights[:pool_size]
+    return pairs, weights / weights.sum()
+
+# Build the sequence of pairs to request
+# With probability repeat_ratio a request repeats a pair that was already requested (as a user
+# going back to a pair they looked at), otherwise a new pair is drawn from the pool weights
+def build_workload(pairs, weights, n_requests, repeat_ratio=0.3, seed=None):
+    rng = np.random.default_rng(seed)
+    fresh = pairs[rng.choice(len(pairs), size=n_requests, p=weights)]
+    repeats = rng.random(n_requests) < repeat_ratio
+
+    workload = []
+    for i in range(n_requests):
+        if repeats[i] and workload:
+            workload.append(workload[rng.integers(len(workload))])
+        else:
+            workload.append((int(fresh[i][0]), int(fresh[i][1])))
+    return workload
+
+
+# ==================================================================================
+# Dash Payload
+
+def _get_json(url, timeout=30):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+# Split a Dash output id ("..a.figure...b.children.." or "a.figure") into (id, property) pairs
+def _parse_outputs(output):
+    if output.startswith('..') and output.endswith('..'):
+        parts = output[2:-2].split('...')
+    else:
+        parts = [output]
+    return [tuple(part.rsplit('.', 1)) for part in parts]
+
+# Find the callback triggered by the Submit button in the app's callback list
+# returns the dependency entry of that callback
+def discover_submit_callback(base_url):
+    for callback in _get_json(f'{base_url}/_dash-dependencies'):
+        if any((i['id'], i['property']) == SUBMIT_INPUT for i in callback['inputs']):
+            return callback
+    raise RuntimeError(f"No callback triggered by {SUBMIT_INPUT[0]}.{SUBMIT_INPUT[1]} at {base_url}")
+
+# Request body for one Submit click on a store-item pair
+# With refine (the refine-store data of a preview) it is a refine-interval tick instead
+def build_payload(callback, store_id, item_id, n_clicks=1, refine=None):
+    values = {'StoreID': store_id, 'ItemID': item_id}
+    trigger = SUBMIT_INPUT if refine is None else REFINE_INPUT
+    outputs = [{'id': component_id, 'property': prop} for component_id, prop in _parse_outputs(callback['output'])]
+    return {
+        'output': callback['output'],
+        'outputs': outputs if len(outputs) > 1 else outputs[0],
+        'inputs': [
+            {'id': i['id'], 'property': i['property'], 'value': n_clicks if (i['id'], i['property']) == trigger else None}
+            for i in callback['inputs']
+        ],
+        'changedPropIds': [f'{trigger[0]}.{trigger[1]}'],
+        'state': [
+            {'id': s['id'], 'property': s['property'],
+             'value': refine if s['id'] == REFINE_STATE else values.get(PAIR_STATES.get(s['id']))}
+            for s in callback.get('state', [])
+        ],
+    }
+
+# refine-store data in a callback response, None when the response is a full forecast
+def _refine_state(response_body):
+    if not response_body:
+        return None
+    return json.loads(response_body).get('response', {}).get(REFINE_STATE, {}).get('data')
+
+
+# ==================================================================================
+# Runner
+
+# Send the workload from concurrency threads
+# A preview that has not been refined timeout seconds after the Submit counts as an error
+# returns a list of (latency seconds, seconds to the full forecast, ok, error message) in completion
+# order and the wall time, the two latencies are the same when no preview was returned
+def run_load(base_url, callback, workload, concurrency=4, timeout=120):
+    url = f'{base_url}/_dash-update-component'
+    results = []
+    results_lock = threading.Lock()
+    next_index = iter(range(len(workload)))
+    index_lock = threading.Lock()
+
+    # returns the response body, None for a 204 (callback raised PreventUpdate)
+    def post(payload):
+        request = urllib.request.Request(url, data=json.dumps(payload).encode(), headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.read() if response.status != 204 else None
+
+    def worker():
+        while True:
+            with index_lock:
+                i = next(next_index, None)
+            if i is None:
+                return
+            store_id, item_id = workload[i]
+            start = time.perf_counter()
+            latency = None
+            try:
+                refine = _refine_state(post(build_payload(callback, store_id, item_id, n_clicks=i + 1)))
+                latency = time.perf_counter() - start
+
+                # Poll like the page does until the preview has been replaced (204 = not ready yet)
+                final_latency = latency
+                ticks = 0
+                while refine is not None:
+                    if time.perf_counter() - start + REFINE_POLL_SECONDS > timeout:
+                        raise TimeoutError(f"preview of store {store_id}, item {item_id} not refined "
+                                           f"after {ticks} polls ({timeout}s)")
+                    time.sleep(REFINE_POLL_SECONDS)
+                    ticks += 1
+                    body = post(build_payload(callback, store_id, item_id, n_clicks=ticks, refine=refine))
+                    if body is not None:
+                        refine = _refine_state(body)
+                        final_latency = time.perf_counter() - start
+                ok, error = True, None
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                ok, error = False, str(e)
+                latency = final_latency = time.perf_counter() - start
+
+            with results_lock:
+                results.append((latency, final_latency, ok, error))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+# Summarise the results
+# Latency percentiles are over successful requests, throughput counts successful requests per second
+# latency is the time to the first figures, final_latency the time to the full forecast
+def summarise(results, wall_seconds, workload, concurrency):
+    latencies = np.array([latency for latency, _, ok, _ in results if ok]) * 1000
+    final_latencies = np.array([final_latency for _, final_latency, ok, _ in results if ok]) * 1000
+    errors = [error for _, _, ok, error in results if not ok]
+    report = {
+        'requests': len(results),
+        'concurrency': concurrency,
+        'distinct_pairs': len(set(workload)),
+        'errors': len(errors),
+        'error_rate': len(errors) / len(results) if results else 0.0,
+        'wall_seconds': round(wall_seconds, 3),
+        'throughput_rps': len(latencies) / wall_seconds if wall_seconds else 0.0,
+        'previews': int((final_latencies > latencies).sum()),
+    }
+    if len(latencies):
+        report.update({
+            'latency_ms_p50': float(np.percentile(latencies, 50)),
+            'latency_ms_p95': float(np.percentile(latencies, 95)),
+            'latency_ms_p99': float(np.percentile(latencies, 99)),
+            'latency_ms_mean': float(latencies.mean()),
+            'latency_ms_max': float(latencies.max()),
+            'final_latency_ms_p50': float(np.percentile(final_latencies, 50)),
+            'final_latency_ms_p95': float(np.percentile(final_latencies, 95)),
+            'final_latency_ms_p99': float(np.percentile(final_latencies, 99)),
+        })
+    if errors:
+        report['first_errors'] = errors[:5]
+    return report
+
+
+# ==================================================================================
+# Local Server
+
+# Start the dashboard in the background: 'dev' runs app.py, 'gunicorn' runs the pre-fork server
+# Waits until /healthz/ready answers 200
+def start_server(kind, port, ready_timeout=180):
+    env = {**os.environ, 'PORT': str(port)}
+    if kind == 'dev':
+        command = [sys.executable, 'app.py']
+    elif kind == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py']
+    else:
+        raise ValueError(f"Unknown server kind: {kind}")
+
+    # Own process group so the dev reloader's child and gunicorn's workers stop with it
+    process = subprocess.Popen(command, cwd=BASE_DIR, env=env, start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + ready_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/healthz/ready', timeout=5) as response:
+                if response.status == 200:
+                    return process
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(1)
+
+    stop_server(process)
+    raise RuntimeError(f"Server not ready after {ready_timeout}s")
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+# Run a load test, optionally against a server started for the test
+# returns the report dictionary
+def run_load_test(url=None, concurrency=4, n_requests=200, repeat_ratio=0.3, mix='volume', pool_size=200,
+                  warmup=0, seed=None, server=None, port=8060, timeout=120):
+    process = start_server(server, port) if server else None
+    base_url = (url or f'http://127.0.0.1:{port}').rstrip('/')
+    try:
+        callback = discover_submit_callback(base_url)
+        pairs, weights = load_pair_pool(mix, pool_size)
+        workload = build_workload(pairs, weights, warmup + n_requests, repeat_ratio, seed)
+
+        if warmup:
+            run_load(base_url, callback, workload[:warmup], concurrency, timeout)
+        results, wall_seconds = run_load(base_url, callback, workload[warmup:], concurrency, timeout)
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    report = summarise(results, wall_seconds, workload[warmup:], concurrency)
+    report.update({'mix': mix, 'repeat_ratio': repeat_ratio, 'pool_size': pool_size, 'server': server or base_url})
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Concurrent-user load test for the dashboard Submit callback')
+    parser.add_argument('--url', help='Base URL of a running server (default: the started server)')
+    parser.add_argument('--start-server', choices=['dev', 'gunicorn'], help='Start a local server for the test')
+    parser.add_argument('--port', type=int, default=8060, help='Port for the started server')
+    parser.add_argument('--concurrency', type=int, default=4, help='Simultaneous users')
+    parser.add_argument('--requests', type=int, default=200, help='Requests to measure')
+    parser.add_argument('--warmup', type=int, default=0, help='Requests sent before measuring')
+    parser.add_argument('--repeat-ratio', type=float, default=0.3, help='Share of requests repeating an earlier pair')
+    parser.add_argument('--mix', choices=['volume', 'uniform'], default='volume', help='How pairs are weighted')
+    parser.add_argument('--pool-size', type=int, default=200, help='Number of pairs requests are drawn from')
+    parser.add_argument('--timeout', type=float, default=120,
+                        help='Request timeout and the time a preview has to be refined in, in seconds')
+    parser.add_argument('--seed', type=int, help='Random seed for the workload')
+    parser.add_argument('--output', help='Write the report to this JSON file')
+    args = parser.parse_args()
+
+    if not args.url and not args.start_server:
+        parser.error('give --url of a running server or --start-server')
+
+    report = run_load_test(
+        url=args.url, concurrency=args.concurrency, n_requests=args.requests, repeat_ratio=args.repeat_ratio,
+        mix=args.mix, pool_size=args.pool_size, warmup=args.warmup, seed=args.seed, server=args.start_server,
+        port=args.port, timeout=args.timeout
+    )
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
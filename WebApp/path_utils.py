@@ -1,9 +1,16 @@
 import os
+import sys
 
 # Get the absolute path to the project directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 MODELS_DIR = os.path.join(BASE_DIR, 'models')
+PROJECT_DIR = os.path.dirname(BASE_DIR)
+PROJECT_DATA_DIR = os.path.join(PROJECT_DIR, 'Data')
+
+# Add the root directory to the system path so the shared src modules (e.g. the schema) can be imported
+if PROJECT_DIR not in sys.path:
+    sys.path.append(PROJECT_DIR)
 
 # Create directories if they don't exist
 for directory in [DATA_DIR, MODELS_DIR]:
@@ -16,4 +23,8 @@ def get_data_path(filename):
 
 # Get absolute path to a file in the models directory
 def get_model_path(filename):
-    return os.path.join(MODELS_DIR, filename)
\ No newline at end of file
+    return os.path.join(MODELS_DIR, filename)
+
+# Get absolute path to a file in the project Data folder, e.g. ('Processed', 'Purchases.csv')
+def get_project_data_path(folder, filename):
+    return os.path.join(PROJECT_DATA_DIR, folder, filename)
\ No newline at end of file
@@ -0,0 +1,155 @@
+# pipeline.py
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+# change these imports between render and local
+from sales import run_sales_forecast, load_forecast_model, check_forecast_mode
+from ledger import build_inventory_ledger
+from purchases import apply_purchase_strategy, load_leadtime_model
+from data_loader import get_opening_stock
+from store import PURCHASE_COLUMNS
+
+# Options accepted by the pipeline and their defaults
+DEFAULT_OPTIONS = {
+    'bottomline': 20,
+    'order_quantity': 50,
+    'min_days_between_orders': 7,
+    'lead_time_quantile': 0.5,
+    'forecast_mode': 'recursive',
+    'include_forecast': True,
+    'include_purchases': True,
+    'include_ledger': False
+}
+
+# Smallest value allowed for each integer option
+MIN_INT_OPTIONS = {
+    'bottomline': 0,
+    'order_quantity': 1,
+    'min_days_between_orders': 0
+}
+
+# How each option type is named in error messages
+TYPE_NAMES = {int: 'an integer', float: 'a number', bool: 'true or false', str: 'a string'}
+
+# Check the type of an option value against its default's type
+# returns the value (ints are accepted for float options and converted), raises ValueError otherwise
+def _check_option_type(name, value):
+    expected = type(DEFAULT_OPTIONS[name])
+    # bool is a subclass of int, so it is only accepted where a bool is expected
+    if isinstance(value, bool) and expected is not bool:
+        raise ValueError(f"{name} must be {TYPE_NAMES[expected]}, got {value!r}")
+    if expected is float and isinstance(value, int):
+        return float(value)
+    if not isinstance(value, expected):
+        raise ValueError(f"{name} must be {TYPE_NAMES[expected]}, got {value!r}")
+    return value
+
+# Merge user options over the defaults, rejecting unknown keys and values of the wrong type or range
+# raises ValueError with a message for the client
+def resolve_options(options=None):
+    if options is None:
+        options = {}
+    if not isinstance(options, dict):
+        raise ValueError("options must be a JSON object")
+    unknown = set(options) - set(DEFAULT_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown options: {sorted(unknown)}")
+    options = {name: _check_option_type(name, value) for name, value in options.items()}
+
+    for name, minimum in MIN_INT_OPTIONS.items():
+        if options.get(name, minimum) < minimum:
+            raise ValueError(f"{name} must be at least {minimum}")
+    if not 0 <= options.get('lead_time_quantile', 0.5) <= 1:
+        raise ValueError("lead_time_quantile must be between 0 and 1")
+    check_forecast_mode(options.get('forecast_mode', 'recursive'))
+    return {**DEFAULT_OPTIONS, **options}
+
+# Run the forecast -> ledger -> purchase plan steps for a single store-item pair
+# Nothing is written to the shared outputs so many pairs can run side by side
+# n_trees makes a preview plan from a forecast with only the first n_trees trees of the sales model,
+# purchases=False skips purchase planning (most of the time of a plan): the purchase orders are
+# empty and the ledger only has the opening stock and the sales
+# returns (opening_stock_data, sales_data, purchases_data, sorted_inventory)
+def compute_pair_plan(store_id, item_id, options=None, sales_model=None, leadtime_model=None, n_trees=None,
+                      purchases=True):
+    options = resolve_options(options)
+    opening_stock_data = get_opening_stock(store_id, item_id)
+    sales_data = run_sales_forecast(store_id, item_id, save=False, sales_model=sales_model,
+                                    mode=options['forecast_mode'], n_trees=n_trees)
+    inventory_data = build_inventory_ledger(opening_stock_data, sales_data, save=False)
+    if not purchases:
+        purchases_data = pd.DataFrame(columns=PURCHASE_COLUMNS).astype({'StoreID': int, 'ItemID': int, 'Quantity': int})
+        return opening_stock_data, sales_data, purchases_data, inventory_data.sort_values(by='Date')
+    purchases_data, updated_inventory = apply_purchase_strategy(
+        inventory_data, store_id, item_id,
+        bottomline=options['bottomline'],
+        standard_order_quantity=options['order_quantity'],
+        min_days_between_orders=options['min_days_between_orders'],
+        save=False,
+        leadtime_model=leadtime_model,
+        lead_time_quantile=options['lead_time_quantile']
+    )
+    sorted_inventory = updated_inventory.sort_values(by='Date')
+    return opening_stock_data, sales_data, purchases_data, sorted_inventory
+
+# Run the pipeline for a single store-item pair
+# returns a JSON serialisable dictionary
+def run_pair_pipeline(store_id, item_id, options, sales_model=None, leadtime_model=None):
+    options = resolve_options(options)
+    _, sales_data, purchases_data, sorted_inventory = compute_pair_plan(
+        store_id, item_id, options, sales_model, leadtime_model
+    )
+
+    result = {
+        'StoreID': store_id,
+        'ItemID': item_id,
+        'summary': {
+            'total_sales': int(sales_data['SalesQuantity'].sum()),
+            'total_purchases': int(purchases_data['Quantity'].sum()) if not purchases_data.empty else 0,
+            'purchase_orders': len(purchases_data),
+            'final_stock': int(sorted_inventory.iloc[-1]['StockLevel']) if not sorted_inventory.empty else 0
+        }
+    }
+    if options['include_forecast']:
+        result['forecast'] = sales_data[['SalesDate', 'SalesQuantity']].to_dict(orient='records')
+    if options['include_purchases']:
+        result['purchases'] = purchases_data[['PODate', 'ReceivingDate', 'Quantity']].to_dict(orient='records')
+    if options['include_ledger']:
+        result['ledger'] = sorted_inventory[['Date', 'TranType', 'Quantity', 'StockLevel']].to_dict(orient='records')
+
+    return result
+
+# Run the pipeline for a batch of (store_id, item_id) pairs
+# Models are loaded once for the whole batch and pairs run on a thread pool.
+# Results are yielded as each pair completes (not in input order), and at most
+# 2 x max_workers pairs are in flight so memory stays flat for large batches.
+# A failing pair yields an error entry instead of stopping the batch.
+def iter_pipeline_results(pairs, options=None, max_workers=4):
+    options = resolve_options(options)
+    forecast_mode, sales_model = load_forecast_model(options['forecast_mode'])
+    options = {**options, 'forecast_mode': forecast_mode}
+    leadtime_model = load_leadtime_model()
+
+    pairs = iter(pairs)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+
+        def submit_next():
+            for store_id, item_id in pairs:
+                future = executor.submit(run_pair_pipeline, store_id, item_id, options, sales_model, leadtime_model)
+                in_flight[future] = (store_id, item_id)
+                return True
+            return False
+
+        for _ in range(max_workers * 2):
+            if not submit_next():
+                break
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                store_id, item_id = in_flight.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield {'StoreID': store_id, 'ItemID': item_id, 'error': str(e)}
+                submit_next()
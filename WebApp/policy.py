@@ -0,0 +1,140 @@
+# policy.py
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+# change these imports between render and local
+from sales import run_sales_forecast
+from data_loader import get_opening_stock
+from purchases import predict_lead_time, load_lead_time_table, load_leadtime_model
+
+# Default policy grid searched when no values are given
+DEFAULT_REORDER_POINTS = list(range(0, 101, 10))
+DEFAULT_ORDER_QUANTITIES = list(range(10, 201, 10))
+DEFAULT_MIN_DAYS_BETWEEN_ORDERS = [1, 3, 7, 14]
+
+# Build every (reorder point, order quantity, min days between orders) combination
+# returns a DataFrame with one row per policy
+def build_policy_grid(reorder_points=None, order_quantities=None, min_days_between_orders=None):
+    reorder_points = DEFAULT_REORDER_POINTS if reorder_points is None else reorder_points
+    order_quantities = DEFAULT_ORDER_QUANTITIES if order_quantities is None else order_quantities
+    min_days_between_orders = DEFAULT_MIN_DAYS_BETWEEN_ORDERS if min_days_between_orders is None else min_days_between_orders
+
+    grid = np.array(np.meshgrid(reorder_points, order_quantities, min_days_between_orders, indexing='ij')).reshape(3, -1)
+    return pd.DataFrame({
+        'ReorderPoint': grid[0],
+        'OrderQuantity': grid[1],
+        'MinDaysBetweenOrders': grid[2]
+    })
+
+# Simulate every policy against one demand forecast at once
+# Stock levels are held in a policies x days array, each day is a single vectorised step over all policies.
+# Unlike apply_purchase_strategy, which uses the forecast to place each order lead time days ahead of
+# the shortfall, a policy only sees its own stock: an order is placed on the day the inventory position
+# (stock plus open orders) drops below the reorder point and received lead time days later.
+# Orders closer together than the policy's minimum gap are skipped.
+# lead_times is the lead time in days, one value for every policy or one per policy
+# returns the policies x days stock level array and the number of orders placed per policy
+def simulate_policies(demand, opening_stock, policy_grid, lead_times=0):
+    demand = np.asarray(demand, dtype=np.int64)
+    reorder_points = policy_grid['ReorderPoint'].to_numpy(dtype=np.int64)
+    order_quantities = policy_grid['OrderQuantity'].to_numpy(dtype=np.int64)
+    min_gaps = policy_grid['MinDaysBetweenOrders'].to_numpy(dtype=np.int64)
+
+    n_policies = len(policy_grid)
+    n_days = len(demand)
+    lead_times = np.broadcast_to(np.asarray(lead_times, dtype=np.int64), (n_policies,))
+    policies = np.arange(n_policies)
+
+    stock = np.full(n_policies, opening_stock, dtype=np.int64)
+    on_order = np.zeros(n_policies, dtype=np.int64)
+    # Receipts due on each day, orders arriving after the last day are never received
+    receipts = np.zeros((n_policies, n_days + int(lead_times.max(initial=0)) + 1), dtype=np.int64)
+    last_order = np.full(n_policies, -np.iinfo(np.int32).max, dtype=np.int64)
+    order_count = np.zeros(n_policies, dtype=np.int64)
+    stock_levels = np.empty((n_policies, n_days), dtype=np.int64)
+
+    for day in range(n_days):
+        stock = stock + receipts[:, day] - demand[day]
+        on_order -= receipts[:, day]
+
+        reorder = (stock + on_order < reorder_points) & (day - last_order >= min_gaps)
+        quantities = np.where(reorder, order_quantities, 0)
+        # Orders with no lead time arrive the same day
+        same_day = lead_times == 0
+        stock = stock + np.where(same_day, quantities, 0)
+        on_order += np.where(same_day, 0, quantities)
+        receipts[policies, day + lead_times] += np.where(same_day, 0, quantities)
+
+        last_order = np.where(reorder, day, last_order)
+        order_count += reorder
+        stock_levels[:, day] = stock
+
+    return stock_levels, order_count
+
+# Score and rank every policy for one forecast
+# Policies are ranked by stockout days, then average inventory, then number of orders (lower is better)
+# lead_times is passed to simulate_policies
+# returns the policy grid with StockoutDays, AvgInventory, OrderCount and Rank columns, best first
+def sweep_purchase_policies(sales_data, opening_stock_data, policy_grid=None, lead_times=0):
+    if policy_grid is None:
+        policy_grid = build_policy_grid()
+
+    demand = sales_data.sort_values(by='SalesDate')['SalesQuantity'].to_numpy()
+    stock_levels, order_count = simulate_policies(demand, opening_stock_data['onHand'], policy_grid, lead_times)
+
+    results = policy_grid.copy()
+    results['StockoutDays'] = (stock_levels <= 0).sum(axis=1)
+    results['AvgInventory'] = np.clip(stock_levels, 0, None).mean(axis=1)
+    results['OrderCount'] = order_count
+
+    order = np.lexsort((results['OrderCount'], results['AvgInventory'], results['StockoutDays']))
+    results = results.iloc[order].reset_index(drop=True)
+    results['Rank'] = np.arange(1, len(results) + 1)
+    return results
+
+# Lead time of each policy in the grid for a store-item pair, from the lead time table when it has
+# been built (the model otherwise, which depends on the order quantity)
+# returns an array with one lead time in days per policy
+def policy_lead_times(store_id, item_id, policy_grid, lead_time_quantile=0.5):
+    lead_time_table = load_lead_time_table()
+    leadtime_model = load_leadtime_model() if lead_time_table is None else None
+    lead_times = {
+        quantity: predict_lead_time(leadtime_model, store_id, item_id, quantity,
+                                    lead_time_table=lead_time_table, quantile=lead_time_quantile)
+        for quantity in policy_grid['OrderQuantity'].unique()
+    }
+    return policy_grid['OrderQuantity'].map(lead_times).to_numpy(dtype=np.int64)
+
+# Forecast one store-item pair and sweep the policy grid against it
+# opening_stock_data and lead_times are resolved by the caller, so workers only read shared data
+def optimize_pair_policy(store_id, item_id, opening_stock_data, lead_times, policy_grid=None):
+    sales_data = run_sales_forecast(store_id, item_id, save=False)
+    results = sweep_purchase_policies(sales_data, opening_stock_data, policy_grid, lead_times)
+    results.insert(0, 'ItemID', item_id)
+    results.insert(0, 'StoreID', store_id)
+    return results
+
+# Sweep the policy grid for many store-item pairs in parallel
+# pairs is a list of (store_id, item_id) tuples
+# Opening stock (which creates a default entry for a new pair) and lead times are resolved here,
+# before the workers start, so no worker writes to the opening stock store
+# returns the best policy per pair, or every ranked policy if top_n is None
+def optimize_policies(pairs, policy_grid=None, top_n=1, max_workers=None, lead_time_quantile=0.5):
+    if policy_grid is None:
+        policy_grid = build_policy_grid()
+
+    store_ids = [store_id for store_id, _ in pairs]
+    item_ids = [item_id for _, item_id in pairs]
+    opening_stocks = [get_opening_stock(store_id, item_id) for store_id, item_id in pairs]
+    lead_times = [policy_lead_times(store_id, item_id, policy_grid, lead_time_quantile) for store_id, item_id in pairs]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(optimize_pair_policy, store_ids, item_ids, opening_stocks, lead_times,
+                                    [policy_grid] * len(pairs)))
+
+    if top_n is not None:
+        results = [result.head(top_n) for result in results]
+
+    if not results:
+        return pd.DataFrame()
+    return pd.concat(results, ignore_index=True)
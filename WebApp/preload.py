@@ -0,0 +1,59 @@
+# preload.py
+import os
+import time
+# change these imports between render and local
+from sales import load_sales_model, SALES_MODEL_FILES, DIRECT_FORECAST_ENABLED
+from purchases import load_leadtime_model, load_lead_time_table
+from data_loader import load_store_data, load_inventory_items, load_history_cube
+from store import get_connection, close_connection
+from path_utils import get_model_path
+from progressive import preview_trees
+
+# Set once preload_shared_data has finished in this process (or the parent it was forked from)
+_preloaded = {}
+
+# Load the models and reference data into the module caches, and measure the preview's trees, so
+# every request reuses them
+# Under gunicorn (preload_app) this runs once in the parent before the workers are forked,
+# the workers then share the loaded objects copy-on-write instead of each loading their own.
+# Opening stock stays in SQLite: the database is created and seeded here and the parent's
+# connection is closed so that no worker inherits it.
+def preload_shared_data():
+    start = time.perf_counter()
+
+    for mode in SALES_MODEL_FILES:
+        if mode == 'direct' and not DIRECT_FORECAST_ENABLED:
+            continue
+        if os.path.exists(get_model_path(SALES_MODEL_FILES[mode])):
+            load_sales_model(mode)
+    load_leadtime_model()
+    load_lead_time_table()
+    load_store_data()
+    load_inventory_items()
+    load_history_cube()
+    preview_trees()
+
+    get_connection()
+    close_connection()
+
+    _preloaded['seconds'] = round(time.perf_counter() - start, 3)
+    _preloaded['pid'] = os.getpid()
+    print(f"Preloaded models and reference data in {_preloaded['seconds']}s")
+
+# Check whether this process can serve requests
+# returns (ready, details) where details is a JSON serialisable dictionary
+def readiness():
+    details = {
+        'pid': os.getpid(),
+        'preloaded': bool(_preloaded),
+        'sales_model': load_sales_model() is not None if _preloaded else False,
+    }
+    try:
+        get_connection().execute('SELECT 1').fetchone()
+        details['database'] = True
+    except Exception as e:
+        details['database'] = False
+        details['database_error'] = str(e)
+
+    ready = details['preloaded'] and details['sales_model'] and details['database']
+    return ready, details
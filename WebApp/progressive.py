@@ -0,0 +1,143 @@
+# progressive.py
+import os
+import threading
+import time
+import uuid
+import numpy as np
+# change these imports between render and local
+from pipeline import compute_pair_plan
+from scheduler import get_scheduler
+from sales import load_forecast_model, run_sales_forecast
+from store import insert_refinement_job, finish_refinement_job, load_refinement_job, delete_refinement_jobs_before
+from src.models.sales_forecast import count_trees
+
+# Trees of the sales model used for the preview forecast: 'auto' picks them from the measured bias
+# (see PREVIEW_MAX_BIAS_PCT), a number fixes them, 0 turns the preview off
+# The preview also skips purchase planning, most of a plan's time, so it is quick whatever the
+# number of trees (the 23 tree XGBoost model: ~0.3s for the preview, ~1s for the full plan)
+PREVIEW_TREES = os.environ.get('PREVIEW_TREES', 'auto')
+
+# Largest bias of the preview's total forecast sales against the full model's, in percent
+# The first rounds of a boosted model don't add up to its predictions yet, so a prefix forecasts low
+# (the 23 tree XGBoost model: -10% at 10 trees, -2.5% at 18, -1.7% at 20, 0% at 22)
+PREVIEW_MAX_BIAS_PCT = float(os.environ.get('PREVIEW_MAX_BIAS_PCT', 2))
+
+# A refinement still running after this many seconds is reported as failed (e.g. its worker died)
+JOB_TIMEOUT_SECONDS = 300
+
+# Refinements are dropped this many seconds after they started, collected or not (a pair submitted
+# twice shares one job, so collecting it doesn't remove it)
+JOB_TTL_SECONDS = 600
+
+# Refinements running on a thread of this process, by (StoreID, ItemID), so a pair is refined once
+_running = {}
+_running_lock = threading.Lock()
+
+# Measured preview (trees, bias) of each loaded sales model, by id (the models stay loaded)
+_preview_choices = {}
+_preview_lock = threading.Lock()
+
+
+# ==================================================================================
+# Preview
+
+# Total forecast sales of the first n_trees trees against the full model, in percent
+# The forecast kernels don't depend on the pair, so one pair measures every pair's preview
+def _preview_bias(sales_model, n_trees, full):
+    preview = run_sales_forecast(0, 0, save=False, sales_model=sales_model, n_trees=n_trees)
+    return forecast_deviation(preview['SalesQuantity'], full)['total_pct']
+
+# Fewest trees whose forecast, and that of every larger prefix, is within PREVIEW_MAX_BIAS_PCT of
+# the full model's, or PREVIEW_TREES trees when it is a number
+# returns (trees, bias in percent)
+def _choose_preview_trees(sales_model, total):
+    full = run_sales_forecast(0, 0, save=False, sales_model=sales_model)
+    if PREVIEW_TREES != 'auto':
+        n_trees = min(int(PREVIEW_TREES), total)
+        return n_trees, _preview_bias(sales_model, n_trees, full)
+
+    # Walk down from the full model, the bias grows as trees are dropped
+    n_trees, bias = total, 0.0
+    while n_trees > 1:
+        next_bias = _preview_bias(sales_model, n_trees - 1, full)
+        if abs(next_bias) > PREVIEW_MAX_BIAS_PCT:
+            break
+        n_trees, bias = n_trees - 1, next_bias
+    return n_trees, bias
+
+# Trees to use for a preview of the dashboard forecast, measured once per model
+# returns (preview trees, total trees, bias of the preview's total sales in percent), preview trees
+# and bias are None when there is no preview (previews turned off or the model is not a tree ensemble)
+def preview_trees():
+    _, sales_model = load_forecast_model()
+    total = count_trees(sales_model) if sales_model is not None else None
+    if PREVIEW_TREES in ('0', '') or total is None:
+        return None, total, None
+    with _preview_lock:
+        if id(sales_model) not in _preview_choices:
+            n_trees, bias = _choose_preview_trees(sales_model, total)
+            print(f"Preview forecast from {n_trees} of {total} trees, {bias:+.1f}% on total sales")
+            _preview_choices[id(sales_model)] = n_trees, bias
+        n_trees, bias = _preview_choices[id(sales_model)]
+    return n_trees, total, bias
+
+# How far the preview forecast (its SalesQuantity values) was from the full forecast's sales DataFrame
+# returns a JSON serialisable dictionary
+def forecast_deviation(preview_sales, final_sales):
+    preview = np.asarray(preview_sales, dtype=float)
+    final = final_sales['SalesQuantity'].to_numpy(dtype=float)
+    difference = preview - final
+    return {
+        'mae': float(np.abs(difference).mean()),
+        'max_abs': float(np.abs(difference).max()),
+        'days_changed': int((difference != 0).sum()),
+        'total_preview': int(preview.sum()),
+        'total_final': int(final.sum()),
+        'total_pct': float(difference.sum() / final.sum() * 100) if final.sum() else 0.0
+    }
+
+
+# ==================================================================================
+# Refinement
+# Jobs are kept in the SQLite store, so the gunicorn worker that serves a poll can collect a
+# refinement started by another worker
+
+def _refine(job_id, store_id, item_id):
+    try:
+        plan = compute_pair_plan(store_id, item_id)
+        get_scheduler().put(store_id, item_id, plan)
+        finish_refinement_job(job_id, plan=plan)
+    except Exception as e:
+        finish_refinement_job(job_id, error=str(e))
+    finally:
+        with _running_lock:
+            _running.pop((store_id, item_id), None)
+
+# Compute the full plan for a pair on a background thread
+# A pair that is already being refined in this process reuses the running job
+# returns the job id
+def start_refinement(store_id, item_id):
+    with _running_lock:
+        job_id = _running.get((store_id, item_id))
+        if job_id is not None:
+            return job_id
+        delete_refinement_jobs_before(time.time() - JOB_TTL_SECONDS)
+        job_id = uuid.uuid4().hex
+        insert_refinement_job(job_id, store_id, item_id)
+        _running[(store_id, item_id)] = job_id
+    threading.Thread(target=_refine, args=(job_id, store_id, item_id),
+                     name=f'refine-{store_id}-{item_id}', daemon=True).start()
+    return job_id
+
+# Collect a refinement
+# returns 'running' while it is still running, otherwise a dictionary with the full plan ('plan')
+# or an error message ('error') for a failed, timed out or unknown (e.g. expired) job
+def collect_refinement(job_id):
+    job = load_refinement_job(job_id)
+    if job is None:
+        return {'plan': None, 'error': "the refinement job is unknown, it may have expired"}
+    if job['Status'] == 'running':
+        if time.time() - job['Started'] < JOB_TIMEOUT_SECONDS:
+            return 'running'
+        job['Error'] = f"the refinement did not finish within {JOB_TIMEOUT_SECONDS} seconds"
+    return {'plan': job['Plan'], 'error': job['Error']}
@@ -5,17 +5,27 @@ import pickle
 import os
 from datetime import datetime, timedelta
 import random
-from path_utils import get_model_path, get_data_path
+from path_utils import get_model_path
 from data_loader import copy_model_files
+from store import save_purchase_orders
+from src.models.lead_time_table import LeadTimeTable
 
-# Generate purchase orders based on inventory levels
-def apply_purchase_strategy(inventory_df, store_id, item_id):
+# Lead time model and lookup table, loaded once per process and reloaded when the file changes
+_leadtime_model_cache = {}
+_lead_time_table_cache = {}
+
+# Load the leadtime model, creating a dummy model if the file doesn't exist
+def load_leadtime_model():
     
-    # using data loader, copy the leadtime_model.pkl file
-    copy_model_files("leadtime_model.pkl")
+    # using data loader, copy the leadtime_model.pkl file the first time it is loaded
+    if not _leadtime_model_cache:
+        copy_model_files("leadtime_model.pkl")
     
     # Path to the leadtime model
     leadtime_model_path = get_model_path('leadtime_model.pkl')
+    key = os.path.getmtime(leadtime_model_path) if os.path.exists(leadtime_model_path) else None
+    if key is not None and key in _leadtime_model_cache:
+        return _leadtime_model_cache[key]
     
     # Create a dummy leadtime model if the file doesn't exist
     if not os.path.exists(leadtime_model_path):
@@ -36,13 +46,40 @@ def apply_purchase_strategy(inventory_df, store_id, item_id):
         print(f"Error loading leadtime model: {e}. Using fallback approach.")
         leadtime_model = None
     
+    _leadtime_model_cache.clear()
+    _leadtime_model_cache[os.path.getmtime(leadtime_model_path)] = leadtime_model
+    return leadtime_model
+
+# Load the empirical lead time lookup table (leadtime_table.npz)
+# returns None if the table has not been built
+def load_lead_time_table():
+    table_path = get_model_path('leadtime_table.npz')
+    if not os.path.exists(table_path):
+        return None
+
+    key = os.path.getmtime(table_path)
+    if key not in _lead_time_table_cache:
+        _lead_time_table_cache.clear()
+        _lead_time_table_cache[key] = LeadTimeTable.load(table_path)
+    return _lead_time_table_cache[key]
+
+# Generate purchase orders based on inventory levels
+# bottomline is the reorder point, standard_order_quantity the fixed order size and
+# min_days_between_orders the minimum gap between two purchase orders
+# leadtime_model can be passed in to reuse an already loaded model across many pairs
+# lead_time_quantile picks the quantile of the historical lead times used when the lookup table
+# is available, e.g. 0.9 plans for slow deliveries
+def apply_purchase_strategy(inventory_df, store_id, item_id, bottomline=20, standard_order_quantity=50,
+                            min_days_between_orders=7, save=True, leadtime_model=None, lead_time_quantile=0.5):
+    
+    # The lookup table replaces model inference when it has been built
+    lead_time_table = load_lead_time_table()
+    if lead_time_table is None and leadtime_model is None:
+        leadtime_model = load_leadtime_model()
+    
     # Initialize purchases dataframe
     purchases_data = []
     
-    # Set bottom line (reorder point) and standard order quantity
-    bottomline = 20  # Reorder point
-    standard_order_quantity = 50  # Always order 50 items as specified
-    
     # Sort inventory by date
     inventory_df = inventory_df.sort_values(by='Date')
     
@@ -64,13 +101,16 @@ def apply_purchase_strategy(inventory_df, store_id, item_id):
             issue_date = row['DateObj']
             
             # Use a consistent lead time for this store-item combination
-            lead_time_days = predict_lead_time(leadtime_model, store_id, item_id, standard_order_quantity)
+            lead_time_days = predict_lead_time(
+                leadtime_model, store_id, item_id, standard_order_quantity,
+                lead_time_table=lead_time_table, quantile=lead_time_quantile
+            )
             
             # Calculate when we need to place the order
             order_date = issue_date - timedelta(days=lead_time_days)
             
-            # Skip if we've already placed an order within 7 days of this order date
-            if any(abs((order_date - pd.to_datetime(od)).days) < 7 for od in order_dates):
+            # Skip if we've already placed an order within min_days_between_orders of this order date
+            if any(abs((order_date - pd.to_datetime(od)).days) < min_days_between_orders for od in order_dates):
                 continue
             
             # Format dates as strings
@@ -114,9 +154,9 @@ def apply_purchase_strategy(inventory_df, store_id, item_id):
     # Convert to DataFrame
     purchases_df = pd.DataFrame(purchases_data) if purchases_data else pd.DataFrame(columns=['StoreID', 'ItemID', 'PODate', 'ReceivingDate', 'Quantity'])
     
-    # Save to CSV using absolute path
-    purchases_path = get_data_path('purchases.csv')
-    purchases_df.to_csv(purchases_path, index=False)
+    # Save to the purchase order store
+    if save:
+        save_purchase_orders(store_id, item_id, purchases_df)
     
     # Resort inventory by date (after adding purchases)
     inventory_df = inventory_df.sort_values(by='DateObj')
@@ -134,8 +174,12 @@ def apply_purchase_strategy(inventory_df, store_id, item_id):
     
     return purchases_df, inventory_df
 
-def predict_lead_time(model, store_id, item_id, quantity):
+def predict_lead_time(model, store_id, item_id, quantity, lead_time_table=None, quantile=0.5):
     """Predict lead time using the model with direct features (no one-hot encoding)"""
+    # Fast path: historical lead time quantile for the store-item pair (or its item / all orders)
+    if lead_time_table is not None:
+        return lead_time_table.lookup(store_id, item_id, quantile)
+    
     if model is None:
         return random.randint(3, 10)
     
@@ -4,15 +4,39 @@ import os
 from datetime import datetime
 from path_utils import get_model_path, get_data_path
 from data_loader import copy_model_files
+from src.DataPrep.schema import write_table
+from src.models.sales_forecast import FORECAST_KERNELS, TreeSubsetModel
 
-# Generate sales forecast for the given store and item
-def run_sales_forecast(store_id, item_id):
+# Model file for each forecast mode
+SALES_MODEL_FILES = {
+    'recursive': 'sales_model.pkl',
+    'direct': 'sales_direct_model.pkl'
+}
+
+# The direct model is only as good as the recursive one from real origin lags (benchmark_forecast_modes).
+# From the WebApp's default origin (INITIAL_SALES for every lag) it predicts a flat line over the
+# 212 days, so it has to be turned on explicitly with DIRECT_FORECAST_ENABLED=1
+DIRECT_FORECAST_ENABLED = os.environ.get('DIRECT_FORECAST_ENABLED', '0') == '1'
+
+# Loaded sales models per mode, reloaded when the model file changes
+_model_cache = {}
+
+# Load the sales model for a forecast mode, returns None if the model file doesn't exist
+# The model is loaded once per process and shared by every request
+def load_sales_model(mode='recursive'):
+    model_name = SALES_MODEL_FILES[mode]
     
-    # using data loader, copy the sales_model.pkl file
-    copy_model_files("sales_model.pkl")
+    # using data loader, copy the model file the first time it is loaded
+    if mode not in _model_cache:
+        copy_model_files(model_name)
     
     # Path to the sales model
-    sales_model_path = get_model_path('sales_model.pkl')
+    sales_model_path = get_model_path(model_name)
+    key = os.path.getmtime(sales_model_path) if os.path.exists(sales_model_path) else None
+    cached = _model_cache.get(mode)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    
     sales_model = None # Initialize the sales model to none
     
     # Try to load the model
@@ -22,77 +46,60 @@ def run_sales_forecast(store_id, item_id):
     else:
         print(f"Sales model not found at {sales_model_path}.")
     
+    _model_cache[mode] = (key, sales_model)
+    return sales_model
+
+# Check a forecast mode is known and turned on, raises ValueError with a message for the client
+def check_forecast_mode(mode):
+    if mode not in SALES_MODEL_FILES:
+        raise ValueError(f"forecast_mode must be one of {sorted(SALES_MODEL_FILES)}")
+    if mode == 'direct' and not DIRECT_FORECAST_ENABLED:
+        raise ValueError("forecast_mode 'direct' is experimental and turned off "
+                         "(set DIRECT_FORECAST_ENABLED=1 on the server to use it)")
+
+# Load the model for a forecast mode, falling back to the recursive model if the direct
+# model hasn't been trained
+# returns (mode, sales_model)
+def load_forecast_model(mode='recursive'):
+    check_forecast_mode(mode)
+    sales_model = load_sales_model(mode)
+    if sales_model is None and mode == 'direct':
+        print("Direct sales model not available. Using the recursive model.")
+        mode = 'recursive'
+        sales_model = load_sales_model(mode)
+    return mode, sales_model
+
+# Generate sales forecast for the given store and item
+# sales_model can be passed in to reuse an already loaded model across many pairs, it must be
+# the model for the mode: 'recursive' predicts day by day from the previous predictions,
+# 'direct' predicts the whole horizon in one call
+# n_trees forecasts with only the first n_trees trees of the model, a quick preview of the full forecast
+def run_sales_forecast(store_id, item_id, save=True, sales_model=None, mode='recursive', n_trees=None):
+    
+    if sales_model is None:
+        mode, sales_model = load_forecast_model(mode)
+    if n_trees is not None and sales_model is not None:
+        sales_model = TreeSubsetModel(sales_model, n_trees)
+    
     # Generate dates from January 1 to July 31, 2025
     start_date = datetime(2025, 1, 1)
     end_date = datetime(2025, 7, 31)
     date_range = pd.date_range(start=start_date, end=end_date)
     
-    # Build feature set with initial features that match the model training
-    features = []
-    for date in date_range:
-        features.append({
-            'SalesDate': date,
-            'Month': date.month,
-            'DayOfWeek': date.dayofweek,
-            'DayOfMonth': date.day,
-            'IsWeekend': 1 if date.dayofweek >= 5 else 0,
-            'StoreID': store_id,
-            'ItemID': item_id
-        })
-    
-    feature_df = pd.DataFrame(features)
-    
-    # Make predictions using model
-    if sales_model and hasattr(sales_model, 'predict'):
-        predictions = []
-        initial_sales = 10
-        
-        # Initialize the first prediction with initial sales 
-        for i in range(len(feature_df)):
-
-            # Produce lag features, give initial sales if out of bounds
-            lag_1 = predictions[i-1] if i > 0 else initial_sales
-            lag_7 = predictions[i-7] if i >= 7 else initial_sales
-            
-            # Calculate rolling average for the last 7 days
-            if i >= 7:
-                rolling_avg_7 = sum(predictions[i-7:i]) / 7
-            elif i > 0:
-                rolling_avg_7 = sum(predictions[:i]) / i
-            else:
-                rolling_avg_7 = initial_sales
-            
-            # Populate engineered features
-            row = feature_df.iloc[i]
-            features = {
-                'Lag_1': lag_1,
-                'Lag_7': lag_7,
-                'RollingAvg_7': rolling_avg_7,
-                'Month': row['Month'],
-                'DayOfWeek': row['DayOfWeek'],
-                'DayOfMonth': row['DayOfMonth'],
-                'IsWeekend': row['IsWeekend']
-            }
-            X_row = pd.DataFrame([features])
-            
-            # Predict using the loaded model
-            pred = sales_model.predict(X_row)[0]
-            pred = max(1, int(round(pred)))
-            predictions.append(pred)
-
-        # Produce sales quantity from model prediction
-        feature_df['SalesQuantity'] = predictions
- 
     # Create the sales dataframe
     sales_data = pd.DataFrame({
         'StoreID': store_id,
         'ItemID': item_id,
-        'SalesDate': feature_df['SalesDate'].dt.strftime('%Y-%m-%d'),
-        'SalesQuantity': feature_df['SalesQuantity']
+        'SalesDate': date_range.strftime('%Y-%m-%d')
     })
     
+    # Make predictions using model, the first day's lags use the initial sales
+    if sales_model and hasattr(sales_model, 'predict'):
+        sales_data['SalesQuantity'] = FORECAST_KERNELS[mode](sales_model, date_range)
+    
     # Save to CSV using absolute path
-    sales_path = get_data_path('sales.csv') # Save the data so it can be used in the graphing of the app
-    sales_data.to_csv(sales_path, index=False)
+    if save:
+        sales_path = get_data_path('sales.csv') # Save the data so it can be used in the graphing of the app
+        write_table(sales_data, sales_path, 'Sales')
     
-    return sales_data
\ No newline at end of file
+    return sales_data
@@ -0,0 +1,196 @@
+# scheduler.py
+import os
+import time
+import threading
+from collections import Counter, OrderedDict
+# change these imports between render and local
+from pipeline import compute_pair_plan
+from store import get_opening_stock_row
+from path_utils import get_model_path, get_project_data_path
+from src.DataPrep.schema import read_table
+
+# Rank store-item pairs by historical sales volume from Data/Processed/Sales.csv
+# returns a Series of each pair's share of total sales, indexed by (StoreID, ItemID)
+def load_sales_volume():
+    sales_path = get_project_data_path('Processed', 'Sales.csv')
+    print(f"Loading sales volume from: {sales_path}")
+    sales_df = read_table(sales_path, 'Sales', usecols=['StoreID', 'ItemID', 'SalesQuantity'])
+    volume = sales_df.groupby(['StoreID', 'ItemID'])['SalesQuantity'].sum()
+    return volume / volume.sum()
+
+# Version of everything a cached plan depends on: the model files, the lead time table and the pair's opening stock
+# A cached plan is stale as soon as any of these change
+def plan_version(store_id, item_id):
+    model_mtimes = tuple(
+        os.path.getmtime(path) if os.path.exists(path) else None
+        for path in (get_model_path('sales_model.pkl'), get_model_path('leadtime_model.pkl'),
+                     get_model_path('leadtime_table.npz'))
+    )
+    opening_stock = get_opening_stock_row(store_id, item_id)
+    opening_key = (opening_stock['onHand'], opening_stock['startDate']) if opening_stock else None
+    return model_mtimes + (opening_key,)
+
+# Background scheduler that precomputes plans for the most popular store-item pairs
+# Pairs are scored by historical sales volume share plus recent request share (weighted by
+# request_weight). Work only starts once no request has arrived for idle_seconds, and after
+# each plan the thread sleeps long enough to keep its CPU use under cpu_budget (0-1 of one core),
+# which is shared by the processes running a scheduler (see set_processes).
+# Precomputing only reads: pairs without opening stock are skipped rather than given a default entry.
+# The plan cache holds at most max_cached plans, the least recently used is dropped first.
+class PrecomputeScheduler:
+    def __init__(self, top_n=20, cpu_budget=0.25, idle_seconds=5, request_weight=1.0,
+                 poll_seconds=5, request_half_life=3600, max_cached=500):
+        if not 0 < cpu_budget <= 1:
+            raise ValueError(f"cpu_budget must be above 0 and at most 1, got {cpu_budget}")
+        if max_cached < top_n:
+            raise ValueError(f"max_cached ({max_cached}) must be at least top_n ({top_n})")
+        self.top_n = top_n
+        self.cpu_budget = cpu_budget
+        self.processes = 1
+        self.max_cached = max_cached
+        self.idle_seconds = idle_seconds
+        self.request_weight = request_weight
+        self.poll_seconds = poll_seconds
+        self.request_half_life = request_half_life
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._cache = OrderedDict()
+        self._requests = Counter()
+        self._requests_decayed_at = time.time()
+        self._last_request = 0.0
+        self._volume = None
+
+    # Number of processes (e.g. gunicorn workers) each running a scheduler, which split cpu_budget
+    def set_processes(self, processes):
+        self.processes = max(1, int(processes))
+
+    # Count a dashboard request for the pair, used for ranking and idle detection
+    def record_request(self, store_id, item_id):
+        with self._lock:
+            self._decay_requests()
+            self._requests[(store_id, item_id)] += 1
+            self._last_request = time.time()
+
+    # Halve the request counts every request_half_life seconds so old traffic fades out
+    def _decay_requests(self):
+        now = time.time()
+        factor = 0.5 ** ((now - self._requests_decayed_at) / self.request_half_life)
+        if factor < 0.99:
+            self._requests = Counter({pair: count * factor for pair, count in self._requests.items() if count * factor >= 0.01})
+            self._requests_decayed_at = now
+
+    # Return the top_n pairs by combined volume and request score
+    def ranked_pairs(self):
+        if self._volume is None:
+            self._volume = load_sales_volume()
+
+        with self._lock:
+            self._decay_requests()
+            total_requests = sum(self._requests.values())
+            request_share = {pair: count / total_requests for pair, count in self._requests.items()} if total_requests else {}
+
+        scores = self._volume.to_dict()
+        for pair, share in request_share.items():
+            scores[pair] = scores.get(pair, 0.0) + self.request_weight * share
+
+        ranked = sorted(scores.items(), key=lambda entry: entry[1], reverse=True)
+        return [(int(store_id), int(item_id)) for (store_id, item_id), _ in ranked[:self.top_n]]
+
+    # Return the precomputed plan for the pair if it is still current, otherwise None
+    def get_cached(self, store_id, item_id):
+        with self._lock:
+            entry = self._cache.get((store_id, item_id))
+            if entry is not None:
+                self._cache.move_to_end((store_id, item_id))
+        if entry is None:
+            return None
+        version, plan = entry
+        if version != plan_version(store_id, item_id):
+            return None
+        return plan
+
+    # Store a plan computed elsewhere (e.g. by the dashboard callback)
+    def put(self, store_id, item_id, plan):
+        version = plan_version(store_id, item_id)
+        with self._lock:
+            self._cache[(store_id, item_id)] = (version, plan)
+            self._cache.move_to_end((store_id, item_id))
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+    # Compute one stale plan among the ranked pairs, returns False if everything is current
+    def run_once(self):
+        for store_id, item_id in self.ranked_pairs():
+            if self._stop.is_set():
+                return False
+            if self.get_cached(store_id, item_id) is not None:
+                continue
+            # compute_pair_plan would insert a default opening stock entry
+            if get_opening_stock_row(store_id, item_id) is None:
+                continue
+
+            cpu_start = time.thread_time()
+            try:
+                plan = compute_pair_plan(store_id, item_id)
+                self.put(store_id, item_id, plan)
+            except Exception as e:
+                print(f"Precompute failed for store {store_id}, item {item_id}: {e}")
+            cpu_used = time.thread_time() - cpu_start
+
+            # Sleep so that cpu_used / (cpu_used + sleep) stays within this process's share of the budget
+            budget = self.cpu_budget / self.processes
+            self._stop.wait(cpu_used * (1 - budget) / budget)
+            return True
+        return False
+
+    # Main loop of the background thread
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                idle_for = time.time() - self._last_request
+            if idle_for < self.idle_seconds:
+                self._stop.wait(self.idle_seconds - idle_for)
+                continue
+            if not self.run_once():
+                self._stop.wait(self.poll_seconds)
+
+    # Start the background thread
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='precompute-scheduler', daemon=True)
+            self._thread.start()
+
+    # Stop the background thread
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+# Shared scheduler instance for the web app
+_scheduler = None
+
+# Get the shared scheduler, configured from environment variables:
+# PRECOMPUTE_TOP_N, PRECOMPUTE_CPU_BUDGET, PRECOMPUTE_IDLE_SECONDS and PRECOMPUTE_CACHE_SIZE
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = PrecomputeScheduler(
+            top_n=int(os.environ.get('PRECOMPUTE_TOP_N', 20)),
+            cpu_budget=float(os.environ.get('PRECOMPUTE_CPU_BUDGET', 0.25)),
+            idle_seconds=float(os.environ.get('PRECOMPUTE_IDLE_SECONDS', 5)),
+            max_cached=int(os.environ.get('PRECOMPUTE_CACHE_SIZE', 500))
+        )
+    return _scheduler
+
+# Start precomputing in the background, set PRECOMPUTE_ENABLED=0 to turn it off
+# processes is the number of processes starting a scheduler, they share PRECOMPUTE_CPU_BUDGET
+def start_precompute_scheduler(processes=1):
+    if os.environ.get('PRECOMPUTE_ENABLED', '1') == '0':
+        return None
+    scheduler = get_scheduler()
+    scheduler.set_processes(processes)
+    scheduler.start()
+    return scheduler
@@ -0,0 +1,162 @@
+# simulation.py
+import pandas as pd
+import numpy as np
+import os
+# change these imports between render and local
+from sales import run_sales_forecast, load_sales_model
+from ledger import build_inventory_ledger
+from purchases import apply_purchase_strategy, load_lead_time_table
+from data_loader import get_opening_stock, load_historical_lead_times
+from path_utils import get_project_data_path, get_model_path
+from src.models.sales_forecast import FEATURE_COLUMNS, is_bagged_forest, load_sales_training_data, early_stopping_rows
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+# Residual quantiles and historical lead times are loaded once per process
+_residual_cache = {}
+_lead_time_cache = {}
+
+# Rebuild the model features used for each forecast day from the point forecast
+# Matches the lag logic in recursive_forecast (src/models/sales_forecast.py)
+def build_forecast_features(sales_data, initial_sales=10):
+    predictions = sales_data['SalesQuantity'].astype(float).reset_index(drop=True)
+    dates = pd.to_datetime(sales_data['SalesDate']).reset_index(drop=True)
+    return pd.DataFrame({
+        'Lag_1': predictions.shift(1).fillna(initial_sales),
+        'Lag_7': predictions.shift(7).fillna(initial_sales),
+        'RollingAvg_7': predictions.shift(1).rolling(window=7, min_periods=1).mean().fillna(initial_sales),
+        'Month': dates.dt.month,
+        'DayOfWeek': dates.dt.dayofweek,
+        'DayOfMonth': dates.dt.day,
+        'IsWeekend': (dates.dt.dayofweek >= 5).astype(int)
+    })
+
+# Build a table of residual quantiles (actual - predicted) per prediction size bin
+# from the model's predictions on the historical rows it was not fitted on (the early stopping rows),
+# residuals on the rows it was fitted on are too small and would make the bands too narrow
+# returns (bin_edges, quantile_table) where quantile_table has one row of 101 quantiles per bin
+def build_residual_quantiles(sales_model, n_bins=10):
+    history = early_stopping_rows(load_sales_training_data(get_project_data_path('final', '')))
+
+    predicted = sales_model.predict(history[FEATURE_COLUMNS])
+    residuals = history['SalesQuantity'].to_numpy() - predicted
+
+    # Bin by predicted size so small sellers don't get the noise of large sellers
+    bin_edges = np.unique(np.quantile(predicted, np.linspace(0, 1, n_bins + 1))[1:-1])
+    bins = np.searchsorted(bin_edges, predicted, side='right')
+    quantile_table = np.vstack([
+        np.quantile(residuals[bins == b], np.linspace(0, 1, 101)) if np.any(bins == b) else np.zeros(101)
+        for b in range(len(bin_edges) + 1)
+    ])
+    return bin_edges, quantile_table
+
+# Get the cached residual quantile table, rebuilt when the model file changes
+def get_residual_quantiles(sales_model):
+    key = os.path.getmtime(get_model_path('sales_model.pkl'))
+    if key not in _residual_cache:
+        _residual_cache.clear()
+        _residual_cache[key] = build_residual_quantiles(sales_model)
+    return _residual_cache[key]
+
+# Draw demand paths around the point forecast
+# For bagged forests (RandomForest, ExtraTrees) each path follows one tree's predictions,
+# otherwise residuals are drawn from the historical residual quantiles of the model
+# returns a paths x days array of daily demand
+def sample_demand_paths(sales_model, sales_data, n_paths, rng):
+    point_forecast = sales_data['SalesQuantity'].to_numpy(dtype=float)
+
+    if is_bagged_forest(sales_model):
+        features = build_forecast_features(sales_data).to_numpy(dtype=float)
+        tree_predictions = np.vstack([tree.predict(features) for tree in sales_model.estimators_])
+        demand = tree_predictions[rng.integers(0, len(tree_predictions), size=n_paths)]
+    else:
+        bin_edges, quantile_table = get_residual_quantiles(sales_model)
+        day_bins = np.searchsorted(bin_edges, point_forecast, side='right')
+        quantile_idx = rng.integers(0, quantile_table.shape[1], size=(n_paths, len(point_forecast)))
+        demand = point_forecast[None, :] + quantile_table[day_bins[None, :], quantile_idx]
+
+    return np.clip(np.rint(demand), 0, None).astype(np.int64)
+
+# Get the historical lead times for a store-item pair
+# Falls back to the item's lead times in any store, then to all lead times
+# When the lookup table is built the samples are its quantiles at the midpoints of the table's
+# levels (0.025, 0.075, ..., 0.975), each standing for an equal share of the distribution, which
+# avoids filtering the full purchase history
+def get_lead_time_samples(store_id, item_id):
+    lead_time_table = load_lead_time_table()
+    if lead_time_table is not None:
+        quantiles, _ = lead_time_table.quantile_row(store_id, item_id)
+        levels = lead_time_table.levels
+        midpoints = (levels[:-1] + levels[1:]) / 2
+        return np.rint(np.interp(midpoints, levels, quantiles)).astype(np.int64)
+
+    if 'history' not in _lead_time_cache:
+        _lead_time_cache['history'] = load_historical_lead_times()
+    history = _lead_time_cache['history']
+
+    pair_mask = (history['StoreID'] == store_id) & (history['ItemID'] == item_id)
+    if pair_mask.any():
+        return history.loc[pair_mask, 'LeadTimeDays'].to_numpy()
+
+    item_mask = history['ItemID'] == item_id
+    if item_mask.any():
+        return history.loc[item_mask, 'LeadTimeDays'].to_numpy()
+
+    return history['LeadTimeDays'].to_numpy()
+
+# Propagate demand paths and purchase orders through the ledger for every path at once
+# Each order's receipt is its PODate plus a lead time drawn per path
+# returns a paths x days array of end of day stock levels
+def simulate_inventory_paths(demand_paths, opening_stock, purchases_df, dates, lead_time_samples, rng):
+    n_paths, n_days = demand_paths.shape
+    start_date = pd.Timestamp(dates[0])
+    receipts = np.zeros((n_paths, n_days), dtype=np.int64)
+
+    if not purchases_df.empty:
+        order_days = (pd.to_datetime(purchases_df['PODate']) - start_date).dt.days.to_numpy()
+        quantities = purchases_df['Quantity'].to_numpy(dtype=np.int64)
+
+        lead_times = rng.choice(lead_time_samples, size=(n_paths, len(order_days)))
+        receipt_days = order_days[None, :] + lead_times
+
+        # Receipts before the horizon count from day 0, receipts after it never arrive
+        in_horizon = receipt_days < n_days
+        path_idx = np.broadcast_to(np.arange(n_paths)[:, None], receipt_days.shape)
+        np.add.at(
+            receipts,
+            (path_idx[in_horizon], np.clip(receipt_days[in_horizon], 0, None)),
+            np.broadcast_to(quantities[None, :], receipt_days.shape)[in_horizon]
+        )
+
+    return opening_stock + np.cumsum(receipts - demand_paths, axis=1)
+
+# Run the Monte Carlo stockout-risk simulation for a store-item pair
+# returns a DataFrame with the stockout probability and stock level percentile bands per day
+def simulate_stockout_risk(store_id, item_id, n_paths=2000, percentiles=DEFAULT_PERCENTILES, seed=None):
+    rng = np.random.default_rng(seed)
+
+    # Deterministic plan: point forecast and the purchase orders placed against it
+    opening_stock_data = get_opening_stock(store_id, item_id)
+    sales_data = run_sales_forecast(store_id, item_id, save=False)
+    inventory_data = build_inventory_ledger(opening_stock_data, sales_data, save=False)
+    purchases_data, _ = apply_purchase_strategy(inventory_data, store_id, item_id, save=False)
+
+    # Uncertain demand and lead times around the plan
+    demand_paths = sample_demand_paths(load_sales_model(), sales_data, n_paths, rng)
+    lead_time_samples = get_lead_time_samples(store_id, item_id)
+    stock_paths = simulate_inventory_paths(
+        demand_paths, opening_stock_data['onHand'], purchases_data, sales_data['SalesDate'].to_numpy(),
+        lead_time_samples, rng
+    )
+
+    risk_df = pd.DataFrame({
+        'StoreID': store_id,
+        'ItemID': item_id,
+        'Date': sales_data['SalesDate'].to_numpy(),
+        'StockoutProbability': (stock_paths <= 0).mean(axis=0)
+    })
+    bands = np.percentile(stock_paths, percentiles, axis=0)
+    for p, band in zip(percentiles, bands):
+        risk_df[f'StockLevel_P{p}'] = band
+
+    return risk_df
@@ -0,0 +1,255 @@
+# store.py
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import pandas as pd
+# change these imports between render and local
+from path_utils import get_data_path
+from src.DataPrep.schema import read_table, DATE_FORMAT
+
+# SQLite database holding opening stock, inventory ledgers, purchase orders and the background
+# refinements of preview forecasts (shared by every gunicorn worker)
+DB_PATH = get_data_path('inventory.db')
+
+# Columns stored for each table, in the same order as the CSV outputs
+LEDGER_COLUMNS = ['Date', 'StoreID', 'ItemID', 'TranType', 'Quantity', 'StockLevel']
+PURCHASE_COLUMNS = ['StoreID', 'ItemID', 'PODate', 'ReceivingDate', 'Quantity']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS opening_stock (
+    StoreID INTEGER NOT NULL,
+    ItemID INTEGER NOT NULL,
+    onHand INTEGER NOT NULL,
+    startDate TEXT NOT NULL,
+    PRIMARY KEY (StoreID, ItemID)
+);
+CREATE INDEX IF NOT EXISTS idx_opening_stock_date ON opening_stock (StoreID, ItemID, startDate);
+
+CREATE TABLE IF NOT EXISTS ledger_entries (
+    id INTEGER PRIMARY KEY,
+    Date TEXT NOT NULL,
+    StoreID INTEGER NOT NULL,
+    ItemID INTEGER NOT NULL,
+    TranType TEXT NOT NULL,
+    Quantity INTEGER NOT NULL,
+    StockLevel INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ledger_entries_date ON ledger_entries (StoreID, ItemID, Date);
+
+CREATE TABLE IF NOT EXISTS purchase_orders (
+    id INTEGER PRIMARY KEY,
+    StoreID INTEGER NOT NULL,
+    ItemID INTEGER NOT NULL,
+    PODate TEXT NOT NULL,
+    ReceivingDate TEXT NOT NULL,
+    Quantity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_purchase_orders_date ON purchase_orders (StoreID, ItemID, PODate);
+
+CREATE TABLE IF NOT EXISTS refinement_jobs (
+    JobID TEXT PRIMARY KEY,
+    StoreID INTEGER NOT NULL,
+    ItemID INTEGER NOT NULL,
+    Status TEXT NOT NULL,
+    Error TEXT,
+    PlanData BLOB,
+    Started REAL NOT NULL,
+    Finished REAL
+);
+"""
+
+# One connection per thread (and per process, so forked workers never share a handle)
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+
+# Functions called with (store_id, item_id, inventory_df) after a pair's ledger has been saved
+_ledger_listeners = []
+
+# Open a connection in WAL mode so readers never block the single writer
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+# Get the connection for the current thread, creating the database on first use
+def get_connection(db_path=None):
+    db_path = db_path or DB_PATH
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid() or _local.db_path != db_path:
+        conn = _connect(db_path)
+        _local.conn, _local.pid, _local.db_path = conn, os.getpid(), db_path
+    if db_path not in _initialized:
+        init_db(conn, db_path)
+    return conn
+
+# Close the connection for the current thread (e.g. before forking workers)
+def close_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+# Create the tables and seed opening stock from OpeningStock.csv if the table is empty
+def init_db(conn, db_path=None):
+    db_path = db_path or DB_PATH
+    with _init_lock:
+        if db_path in _initialized:
+            return
+        conn.executescript(SCHEMA)
+        if conn.execute('SELECT COUNT(*) FROM opening_stock').fetchone()[0] == 0:
+            seed_opening_stock(conn)
+        _initialized.add(db_path)
+
+# Load OpeningStock.csv into the opening_stock table, keeping the first row per pair
+def seed_opening_stock(conn):
+    opening_stock_path = get_data_path('OpeningStock.csv')
+    if not os.path.exists(opening_stock_path):
+        return
+    print(f"Seeding opening stock from: {opening_stock_path}")
+    opening_stock = read_table(opening_stock_path, 'OpeningStock')
+    opening_stock['startDate'] = opening_stock['startDate'].dt.strftime(DATE_FORMAT)
+    rows = opening_stock[['StoreID', 'ItemID', 'onHand', 'startDate']].itertuples(index=False, name=None)
+    with conn:
+        conn.executemany(
+            'INSERT OR IGNORE INTO opening_stock (StoreID, ItemID, onHand, startDate) VALUES (?, ?, ?, ?)',
+            ((int(s), int(i), int(o), d) for s, i, o, d in rows)
+        )
+
+# ----------------------------------------------------------------------------------
+# Opening stock
+
+# Point lookup of the opening stock for a store-item pair, returns a dict or None
+def get_opening_stock_row(store_id, item_id):
+    row = get_connection().execute(
+        'SELECT StoreID, ItemID, onHand, startDate FROM opening_stock WHERE StoreID = ? AND ItemID = ?',
+        (int(store_id), int(item_id))
+    ).fetchone()
+    if row is None:
+        return None
+    return dict(zip(['StoreID', 'ItemID', 'onHand', 'startDate'], row))
+
+# Insert the opening stock row only if the pair doesn't have one yet
+# returns the row that is stored for the pair (which may have been inserted by another worker)
+def insert_opening_stock_if_missing(store_id, item_id, on_hand, start_date):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            'INSERT INTO opening_stock (StoreID, ItemID, onHand, startDate) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (StoreID, ItemID) DO NOTHING',
+            (int(store_id), int(item_id), int(on_hand), str(start_date))
+        )
+    return get_opening_stock_row(store_id, item_id)
+
+# Insert or update the opening stock row for a store-item pair
+def upsert_opening_stock(store_id, item_id, on_hand, start_date):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            'INSERT INTO opening_stock (StoreID, ItemID, onHand, startDate) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (StoreID, ItemID) DO UPDATE SET onHand = excluded.onHand, startDate = excluded.startDate',
+            (int(store_id), int(item_id), int(on_hand), str(start_date))
+        )
+
+# ----------------------------------------------------------------------------------
+# Ledger entries and purchase orders
+
+# Convert pandas / NumPy values to types sqlite3 can bind
+def _to_sql_value(value):
+    if isinstance(value, pd.Timestamp):
+        return value.strftime(DATE_FORMAT)
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+# Replace the stored rows for one store-item pair in a single transaction
+def _replace_pair_rows(table, columns, store_id, item_id, df):
+    conn = get_connection()
+    placeholders = ', '.join('?' for _ in columns)
+    rows = [tuple(_to_sql_value(v) for v in row) for row in df[columns].itertuples(index=False, name=None)]
+    with conn:
+        conn.execute(f'DELETE FROM {table} WHERE StoreID = ? AND ItemID = ?', (int(store_id), int(item_id)))
+        conn.executemany(f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders})', rows)
+
+# Range query over one store-item pair, optionally between two dates (inclusive)
+def _load_pair_rows(table, columns, date_column, store_id, item_id, start_date=None, end_date=None):
+    query = f'SELECT {", ".join(columns)} FROM {table} WHERE StoreID = ? AND ItemID = ?'
+    params = [int(store_id), int(item_id)]
+    if start_date is not None:
+        query += f' AND {date_column} >= ?'
+        params.append(str(start_date))
+    if end_date is not None:
+        query += f' AND {date_column} <= ?'
+        params.append(str(end_date))
+    query += f' ORDER BY {date_column}, id'
+    return pd.read_sql_query(query, get_connection(), params=params)
+
+# Call listener(store_id, item_id, inventory_df) whenever a ledger is saved (e.g. the LedgerIndex)
+def add_ledger_listener(listener):
+    _ledger_listeners.append(listener)
+
+# Save the inventory ledger for a store-item pair, replacing any previous ledger
+def save_ledger(store_id, item_id, inventory_df):
+    _replace_pair_rows('ledger_entries', LEDGER_COLUMNS, store_id, item_id, inventory_df)
+    for listener in _ledger_listeners:
+        listener(store_id, item_id, inventory_df)
+
+# Load the inventory ledger for a store-item pair
+def load_ledger(store_id, item_id, start_date=None, end_date=None):
+    return _load_pair_rows('ledger_entries', LEDGER_COLUMNS, 'Date', store_id, item_id, start_date, end_date)
+
+# Load the inventory ledgers of every store-item pair, ordered by pair and date
+def load_all_ledgers():
+    query = f'SELECT {", ".join(LEDGER_COLUMNS)} FROM ledger_entries ORDER BY StoreID, ItemID, Date, id'
+    return pd.read_sql_query(query, get_connection())
+
+# Save the purchase orders for a store-item pair, replacing any previous orders
+def save_purchase_orders(store_id, item_id, purchases_df):
+    _replace_pair_rows('purchase_orders', PURCHASE_COLUMNS, store_id, item_id, purchases_df)
+
+# Load the purchase orders for a store-item pair
+def load_purchase_orders(store_id, item_id, start_date=None, end_date=None):
+    return _load_pair_rows('purchase_orders', PURCHASE_COLUMNS, 'PODate', store_id, item_id, start_date, end_date)
+
+# ----------------------------------------------------------------------------------
+# Refinement jobs
+
+# Record a refinement job that has started (Status 'running')
+def insert_refinement_job(job_id, store_id, item_id):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO refinement_jobs (JobID, StoreID, ItemID, Status, Started) VALUES (?, ?, ?, 'running', ?)",
+            (job_id, int(store_id), int(item_id), time.time())
+        )
+
+# Record the result of a refinement job: the plan (Status 'done') or an error message (Status 'failed')
+def finish_refinement_job(job_id, plan=None, error=None):
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            'UPDATE refinement_jobs SET Status = ?, Error = ?, PlanData = ?, Finished = ? WHERE JobID = ?',
+            ('failed' if error is not None else 'done', error,
+             pickle.dumps(plan) if error is None else None, time.time(), job_id)
+        )
+
+# Load a refinement job, returns a dict (PlanData unpickled to Plan) or None if the job is unknown
+def load_refinement_job(job_id):
+    row = get_connection().execute(
+        'SELECT JobID, StoreID, ItemID, Status, Error, PlanData, Started, Finished FROM refinement_jobs WHERE JobID = ?',
+        (job_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    job = dict(zip(['JobID', 'StoreID', 'ItemID', 'Status', 'Error', 'PlanData', 'Started', 'Finished'], row))
+    job['Plan'] = pickle.loads(job.pop('PlanData')) if job['PlanData'] is not None else None
+    return job
+
+# Delete the refinement jobs started before a time (seconds since the epoch)
+def delete_refinement_jobs_before(started_before):
+    conn = get_connection()
+    with conn:
+        conn.execute('DELETE FROM refinement_jobs WHERE Started < ?', (started_before,))
@@ -0,0 +1,63 @@
+# test_api.py
+# Bulk forecast API through the Flask test client: results for valid requests, 400 for invalid ones
+# Run from the WebApp folder: python -m pytest tests
+import os
+import sys
+import json
+import pytest
+from flask import Flask
+
+# WebApp modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import store
+from api import register_api_routes
+
+
+# The pipeline seeds opening stock in the store, keep it out of the app's database
+@pytest.fixture(scope='module', autouse=True)
+def temporary_store(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(store, 'DB_PATH', str(tmp_path_factory.mktemp('store') / 'inventory.db'))
+        yield
+        store.close_connection()
+
+# The API routes on a bare Flask server, without the Dash app and its startup work
+@pytest.fixture(scope='module')
+def client():
+    server = Flask(__name__)
+    register_api_routes(server)
+    return server.test_client()
+
+def test_forecast(client):
+    response = client.post('/api/forecast', json={'pairs': [[1, 1004], {'StoreID': 1, 'ItemID': 1010}]})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert sorted((result['StoreID'], result['ItemID']) for result in results) == [(1, 1004), (1, 1010)]
+    assert all('error' not in result and result['forecast'] for result in results)
+
+def test_forecast_stream(client):
+    response = client.post('/api/forecast/stream', json={'pairs': [[1, 1004]], 'options': {'order_quantity': 30}})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert [(result['StoreID'], result['ItemID']) for result in map(json.loads, lines)] == [(1, 1004)]
+
+@pytest.mark.parametrize('body', [
+    None,
+    {},
+    {'pairs': []},
+    {'pairs': [[1]]},
+    {'pairs': [[1.0, 1004]]},
+    {'pairs': [[1, 1004.5]]},
+    {'pairs': [[True, 1004]]},
+    {'pairs': [['1', 1004]]},
+    {'pairs': [{'StoreID': 1}]},
+    {'pairs': [[1, 1004]], 'options': {'unknown': 1}},
+    {'pairs': [[1, 1004]], 'options': {'order_quantity': True}},
+])
+@pytest.mark.parametrize('route', ['/api/forecast', '/api/forecast/stream'])
+def test_invalid_requests(client, route, body):
+    response = client.post(route, json=body) if body is not None else client.post(route, data='not json')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
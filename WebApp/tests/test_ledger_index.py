@@ -0,0 +1,118 @@
+# test_ledger_index.py
+# LedgerIndex against the StockLevel of the ledgers it indexes
+# Run from the WebApp folder: python -m pytest tests
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# WebApp modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import store
+import ledger_index
+from ledger import build_inventory_ledger
+from purchases import apply_purchase_strategy
+from ledger_index import LedgerIndex, get_ledger_index
+
+QUERY_DATES = ['2024-12-31', '2025-01-01', '2025-01-02', '2025-02-14', '2025-03-31', '2025-05-17', '2025-07-31', '2025-08-01']
+
+
+# Ledger of a pair with purchase orders, as compute_pair_plan builds it
+def make_ledger(store_id, item_id, on_hand, seed):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2025-01-01', '2025-07-31')
+    sales = pd.DataFrame({'SalesDate': dates.strftime('%Y-%m-%d'), 'SalesQuantity': rng.integers(0, 6, len(dates))})
+    opening = {'StoreID': store_id, 'ItemID': item_id, 'onHand': on_hand, 'startDate': '2025-01-01'}
+    inventory = build_inventory_ledger(opening, sales, save=False)
+    _, ledger = apply_purchase_strategy(inventory, store_id, item_id, save=False)
+    return ledger
+
+# Stock level of every pair at the end of a date from the ledgers' own StockLevel column
+# The last entry of a day holds the stock at the end of the day (same-day entries are in ledger order)
+def expected_levels(ledgers, date):
+    rows = []
+    for ledger in ledgers:
+        on_or_before = ledger[pd.to_datetime(ledger['Date']) <= pd.Timestamp(date)]
+        if not on_or_before.empty:
+            last = on_or_before.iloc[-1]
+            rows.append((int(last['StoreID']), int(last['ItemID']), int(last['StockLevel'])))
+    return pd.DataFrame(rows, columns=['StoreID', 'ItemID', 'StockLevel']).sort_values(['StoreID', 'ItemID']).reset_index(drop=True)
+
+def assert_matches(index, ledgers):
+    for date in QUERY_DATES:
+        expected = expected_levels(ledgers, date)
+        actual = index.stock_levels_on(date).astype('int64').reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual, expected.astype('int64'), check_dtype=False)
+        for store_id, item_id, level in expected.itertuples(index=False, name=None):
+            assert index.stock_on(store_id, item_id, date) == level
+
+
+@pytest.fixture
+def ledgers():
+    return [make_ledger(1, 1004, 120, 1), make_ledger(1, 1010, 40, 2), make_ledger(3, 1004, 15, 3)]
+
+def test_from_ledgers(ledgers):
+    assert_matches(LedgerIndex.from_ledgers(ledgers), ledgers)
+
+def test_append(ledgers):
+    index = LedgerIndex.from_ledgers(ledgers[:1])
+
+    # The second ledger arrives in two parts, later dates first, and the third is a new pair
+    second = ledgers[1]
+    cut = len(second) // 2
+    index.append(second.iloc[cut:])
+    assert_matches(index, ledgers[:1] + [second.iloc[cut:].assign(StockLevel=second['Quantity'].iloc[cut:].cumsum())])
+    index.append(second.iloc[:cut])
+    index.append(ledgers[2])
+    assert_matches(index, ledgers)
+
+def test_replace(ledgers):
+    index = LedgerIndex.from_ledgers(ledgers)
+    replacement = make_ledger(1, 1010, 300, 4)
+    index.replace(1, 1010, replacement)
+    assert_matches(index, [ledgers[0], replacement, ledgers[2]])
+
+    # Replacing with a shorter ledger drops the entries it doesn't have
+    shorter = replacement[pd.to_datetime(replacement['Date']) <= pd.Timestamp('2025-03-01')]
+    index.replace(1, 1010, shorter)
+    assert_matches(index, [ledgers[0], shorter, ledgers[2]])
+
+def test_shared_index_follows_save_ledger(ledgers, tmp_path, monkeypatch):
+    monkeypatch.setattr(store, 'DB_PATH', str(tmp_path / 'inventory.db'))
+    monkeypatch.setattr(store, '_ledger_listeners', [])
+    monkeypatch.setattr(ledger_index, '_shared_index', None)
+
+    store.save_ledger(1, 1004, ledgers[0])
+    index = get_ledger_index()
+    assert_matches(index, ledgers[:1])
+
+    store.save_ledger(1, 1010, ledgers[1])
+    replacement = make_ledger(1, 1004, 60, 5)
+    store.save_ledger(1, 1004, replacement)
+    assert_matches(index, [replacement, ledgers[1]])
+    store.close_connection()
+
+@pytest.mark.parametrize('store_id, item_id, date', [
+    (1 << 23, 1004, '2025-01-01'),
+    (-1, 1004, '2025-01-01'),
+    (1, 1 << 20, '2025-01-01'),
+    (1, -1, '2025-01-01'),
+    (1, 1004, '1969-12-31'),
+    (1, 1004, '1900-01-01'),
+])
+def test_out_of_range_keys_are_rejected(store_id, item_id, date):
+    # These would overflow into the neighbouring field of the packed key and alias another pair or day
+    entries = pd.DataFrame({'Date': [date], 'StoreID': [store_id], 'ItemID': [item_id], 'Quantity': [5]})
+    with pytest.raises(ValueError):
+        LedgerIndex().append(entries)
+    with pytest.raises(ValueError):
+        LedgerIndex().replace(store_id, item_id, entries)
+
+def test_query_dates_outside_the_key_range(ledgers):
+    index = LedgerIndex.from_ledgers(ledgers)
+    assert index.stock_on(1, 1004, '1960-01-01') is None
+    assert index.stock_levels_on('1960-01-01').empty
+    assert index.stock_on(1, 1004, '2262-01-01') == int(ledgers[0]['StockLevel'].iloc[-1])
+    assert len(index.stock_levels_on('2262-01-01')) == len(ledgers)
@@ -0,0 +1,65 @@
+# test_policy.py
+# Purchase policy simulation on small hand-checked cases
+# Run from the WebApp folder: python -m pytest tests
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# WebApp modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from policy import build_policy_grid, simulate_policies, sweep_purchase_policies
+
+
+def test_receipts_arrive_after_the_lead_time():
+    # Reorder point 10, 20 units, 3 day lead time: orders on days 0, 4 and 8, received on days 3 and 7
+    # (the day 8 order would arrive after the last day)
+    grid = build_policy_grid([10], [20], [1])
+    stock_levels, order_count = simulate_policies([5] * 10, 12, grid, lead_times=3)
+
+    assert stock_levels[0].tolist() == [7, 2, -3, 12, 7, 2, -3, 12, 7, 2]
+    assert order_count.tolist() == [3]
+
+def test_same_day_receipt_without_lead_time():
+    grid = build_policy_grid([10], [20], [1])
+    stock_levels, order_count = simulate_policies([5] * 4, 12, grid, lead_times=0)
+
+    assert stock_levels[0].tolist() == [27, 22, 17, 12]
+    assert order_count.tolist() == [1]
+
+def test_minimum_gap_between_orders():
+    # The stock is below the reorder point every day, a 3 day gap allows orders on days 0 and 3 only
+    grid = build_policy_grid([10], [5], [3])
+    stock_levels, order_count = simulate_policies([4] * 6, 12, grid, lead_times=0)
+
+    assert stock_levels[0].tolist() == [13, 9, 5, 6, 2, -2]
+    assert order_count.tolist() == [2]
+
+def test_per_policy_lead_times():
+    grid = build_policy_grid([10], [20, 30], [1])
+    stock_levels, _ = simulate_policies([5] * 4, 12, grid, lead_times=[1, 2])
+
+    assert stock_levels.tolist() == [[7, 22, 17, 12], [7, 2, 27, 22]]
+
+def test_ranking_order():
+    sales = pd.DataFrame({
+        'SalesDate': pd.date_range('2025-01-01', periods=20).strftime('%Y-%m-%d'),
+        'SalesQuantity': [3] * 20
+    })
+    grid = build_policy_grid([0, 10, 30], [10, 40], [1, 7])
+    results = sweep_purchase_policies(sales, {'onHand': 15}, grid, lead_times=2)
+
+    keys = list(zip(results['StockoutDays'], results['AvgInventory'], results['OrderCount']))
+    assert keys == sorted(keys)
+    assert results['Rank'].tolist() == list(range(1, len(grid) + 1))
+
+    # Never reordering runs out, so it ranks below every policy that avoids stockouts
+    never = results[results['ReorderPoint'] == 0]
+    assert (never['StockoutDays'] > 0).all()
+    assert results['StockoutDays'].iloc[0] == 0
+    assert never['Rank'].min() > (results['StockoutDays'] == 0).sum()
+
+    # Equal stockouts and inventory: fewer orders ranks first
+    ties = results.groupby(['StockoutDays', 'AvgInventory'])['OrderCount']
+    assert ties.apply(lambda counts: counts.is_monotonic_increasing).all()
@@ -0,0 +1,46 @@
+# test_simulation.py
+# Monte Carlo stockout risk: band ordering, probability range and reproducibility
+# Run from the WebApp folder: python -m pytest tests
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# WebApp modules use flat imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import store
+from simulation import simulate_stockout_risk, simulate_inventory_paths
+
+
+# The simulation seeds opening stock in the store, keep it out of the app's database
+@pytest.fixture(scope='module', autouse=True)
+def temporary_store(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(store, 'DB_PATH', str(tmp_path_factory.mktemp('store') / 'inventory.db'))
+        yield
+        store.close_connection()
+
+@pytest.fixture(scope='module')
+def risk():
+    return simulate_stockout_risk(1, 1004, n_paths=300, percentiles=(10, 50, 90), seed=7)
+
+def test_bands_are_ordered(risk):
+    assert (risk['StockLevel_P10'] <= risk['StockLevel_P50']).all()
+    assert (risk['StockLevel_P50'] <= risk['StockLevel_P90']).all()
+
+def test_stockout_probability_is_a_probability(risk):
+    assert risk['StockoutProbability'].between(0, 1).all()
+
+def test_same_seed_same_result(risk):
+    again = simulate_stockout_risk(1, 1004, n_paths=300, percentiles=(10, 50, 90), seed=7)
+    pd.testing.assert_frame_equal(risk, again)
+
+def test_receipts_follow_the_sampled_lead_time():
+    # One order of 10 on day 1 with a fixed 2 day lead time: received on day 3
+    demand = np.ones((2, 5), dtype=np.int64)
+    purchases = pd.DataFrame({'PODate': ['2025-01-02'], 'Quantity': [10]})
+    dates = pd.date_range('2025-01-01', periods=5)
+    stock = simulate_inventory_paths(demand, 3, purchases, dates, np.array([2]), np.random.default_rng(0))
+    assert stock.tolist() == [[2, 1, 0, 9, 8]] * 2
@@ -0,0 +1,11 @@
+# wsgi.py
+# Production entry point, run from the WebApp folder with: gunicorn -c gunicorn.conf.py
+# With preload_app the models and reference data below are loaded once in the gunicorn
+# parent process and shared by every forked worker.
+# change these imports between render and local
+from app import server
+from preload import preload_shared_data
+
+preload_shared_data()
+
+application = server
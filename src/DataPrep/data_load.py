@@ -6,6 +6,9 @@ import os
 import shutil
 import pandas as pd
 import kagglehub
+from .schema import read_table, write_table
+from .telemetry import track_stage, record_rows
+from .history_cube import create_history_cube
 
 
 
@@ -30,6 +33,7 @@ def run_inventory_analysis(download=False, process=True):
 # Process Dataset
 # main function to process all data files
 # returns tuple containing all processed DataFrames
+@track_stage()
 def process_all_data(raw_path, processed_path, download):
     # Step 1: Download dataset if required
     if download:
@@ -40,13 +44,13 @@ def process_all_data(raw_path, processed_path, download):
     
     # Load original DataFrames for later use in creating the inventory master
     sales_file = os.path.join(raw_path, 'SalesFINAL12312016.csv')
-    sales_df_orig = pd.read_csv(sales_file)
+    sales_df_orig = read_table(sales_file, 'SalesRaw', usecols=['Brand', 'Description'])
     
     purchases_file = os.path.join(raw_path, 'PurchasesFINAL12312016.csv')
-    purchases_df_orig = pd.read_csv(purchases_file)
+    purchases_df_orig = read_table(purchases_file, 'PurchasesRaw', usecols=['Brand', 'Description'])
     
     opening_stock_file = os.path.join(raw_path, 'BegInvFINAL12312016.csv')
-    opening_stock_df_orig = pd.read_csv(opening_stock_file)
+    opening_stock_df_orig = read_table(opening_stock_file, 'OpeningStockRaw', usecols=['Brand', 'Description'])
     
     # Step 3: Process each dataset
     print("Processing sales data...")
@@ -64,6 +68,9 @@ def process_all_data(raw_path, processed_path, download):
     print("Creating stores file...")
     stores_df = create_stores_file(raw_path, processed_path)
     
+    print("Creating history cube...")
+    create_history_cube(processed_path, sales_cleaned, purchases_cleaned)
+    
     print("All processing complete!")
     
     return {
@@ -117,16 +124,16 @@ def split_inventory_id(df):
 # Create Sales.csv (StoreID, ItemID, SalesQuantity, SalesDate)
 # ingests and cleans the sales data
 # returns a DataFrame with cleaned sales data and saves it to a CSV file
+@track_stage()
 def process_sales_data(raw_path, processed_path):
     # Load the Sales.csv file
     sales_file = os.path.join(raw_path, 'SalesFINAL12312016.csv')
-    sales_df = pd.read_csv(sales_file)
+    sales_df = read_table(sales_file, 'SalesRaw', usecols=['InventoryId', 'Store', 'SalesQuantity', 'SalesDate'])
     
     # Clean Sales.csv
     sales_cleaned = sales_df[['InventoryId', 'Store', 'SalesQuantity', 'SalesDate']]
     
-    # Strip whitespace and filter for stores "1" and "2"
-    sales_cleaned['Store'] = sales_cleaned['Store'].astype(str).str.strip()
+    # Filter for stores "1" and "2" (whitespace is stripped by the schema)
     sales_cleaned = sales_cleaned[sales_cleaned['Store'].isin(['1', '2'])]
     
     # Apply split function to separate the composite InventoryId
@@ -139,8 +146,8 @@ def process_sales_data(raw_path, processed_path):
     sales_cleaned.rename(columns={'Store': 'StoreID'}, inplace=True)
     sales_cleaned.rename(columns={'ItemId': 'ItemID'}, inplace=True)
     
-    # Save the cleaned Sales.csv
-    sales_cleaned.to_csv(os.path.join(processed_path, 'Sales.csv'), index=False)
+    # Save the cleaned Sales.csv (converts the split ItemID strings to int32)
+    sales_cleaned = write_table(sales_cleaned, os.path.join(processed_path, 'Sales.csv'), 'Sales')
     
     return sales_cleaned
 
@@ -148,16 +155,16 @@ def process_sales_data(raw_path, processed_path):
 # Create Purchases.csv (StoreID, ItemID, Quantity, PODate, ReceivingDate)
 # ingests and cleans the purchases data
 # returns a DataFrame with cleaned purchases data and saves it to a CSV file
+@track_stage()
 def process_purchases_data(raw_path, processed_path):
     # Load the Purchases.csv file
     purchases_file = os.path.join(raw_path, 'PurchasesFINAL12312016.csv')
-    purchases_df = pd.read_csv(purchases_file)
+    purchases_df = read_table(purchases_file, 'PurchasesRaw', usecols=['InventoryId', 'Store', 'PODate', 'ReceivingDate', 'Quantity'])
     
     # Clean Purchases.csv
     purchases_cleaned = purchases_df[['InventoryId', 'Store', 'PODate', 'ReceivingDate', 'Quantity']]
     
-    # Strip whitespace and filter for stores "1" and "2"
-    purchases_cleaned['Store'] = purchases_cleaned['Store'].astype(str).str.strip()
+    # Filter for stores "1" and "2" (whitespace is stripped by the schema)
     purchases_cleaned = purchases_cleaned[purchases_cleaned['Store'].isin(['1', '2'])]
     
     # Apply split function
@@ -170,8 +177,8 @@ def process_purchases_data(raw_path, processed_path):
     purchases_cleaned.rename(columns={'Store': 'StoreID'}, inplace=True)
     purchases_cleaned.rename(columns={'ItemId': 'ItemID'}, inplace=True)
     
-    # Save the cleaned Purchases.csv
-    purchases_cleaned.to_csv(os.path.join(processed_path, 'Purchases.csv'), index=False)
+    # Save the cleaned Purchases.csv (converts the split ItemID strings to int32)
+    purchases_cleaned = write_table(purchases_cleaned, os.path.join(processed_path, 'Purchases.csv'), 'Purchases')
     
     return purchases_cleaned
 
@@ -179,16 +186,16 @@ def process_purchases_data(raw_path, processed_path):
 # Create OpeningStock.csv (StoreID, ItemID, onHand, startDate)
 # ingests and cleans the opening stock data
 # returns a DataFrame with cleaned opening stock data and saves it to a CSV file
+@track_stage()
 def process_opening_stock_data(raw_path, processed_path):
     # Load the beginning inventory file
     opening_stock_file = os.path.join(raw_path, 'BegInvFINAL12312016.csv')
-    opening_stock_df = pd.read_csv(opening_stock_file)
+    opening_stock_df = read_table(opening_stock_file, 'OpeningStockRaw', usecols=['InventoryId', 'Store', 'onHand', 'startDate'])
     
     # Clean BegInvFINAL12312016.csv
     opening_stock_cleaned = opening_stock_df[['InventoryId', 'Store', 'onHand', 'startDate']]
     
-    # Strip whitespace from Store and keep only store "1" and "2"
-    opening_stock_cleaned['Store'] = opening_stock_cleaned['Store'].astype(str).str.strip()
+    # Keep only store "1" and "2" (whitespace is stripped by the schema)
     opening_stock_cleaned = opening_stock_cleaned[opening_stock_cleaned['Store'].isin(['1', '2'])]
     
     # Replace the startDate with 2015-12-31
@@ -205,7 +212,7 @@ def process_opening_stock_data(raw_path, processed_path):
     opening_stock_cleaned.rename(columns={'ItemId': 'ItemID'}, inplace=True)
     
     # Save the cleaned beginning inventory
-    opening_stock_cleaned.to_csv(os.path.join(processed_path, 'OpeningStock.csv'), index=False)
+    opening_stock_cleaned = write_table(opening_stock_cleaned, os.path.join(processed_path, 'OpeningStock.csv'), 'OpeningStock')
     
     return opening_stock_cleaned
 
@@ -213,6 +220,7 @@ def process_opening_stock_data(raw_path, processed_path):
 # Create Inventory.csv (ItemID, Description)
 # ingests and cleans the inventory data from multiple sources
 # returns a DataFrame with cleaned inventory data and saves it to a CSV file
+@track_stage()
 def create_inventory_master(sales_df, purchases_df, opening_stock_df, processed_path):
     # Pull ItemID and Description from original CSVs
     sales_info = sales_df[['Brand', 'Description']].rename(columns={'Brand': 'ItemID'})
@@ -221,10 +229,11 @@ def create_inventory_master(sales_df, purchases_df, opening_stock_df, processed_
     
     # Combine and deduplicate
     inventory_df = pd.concat([sales_info, purchases_info, opening_info])
+    record_rows(rows_in=len(inventory_df))
     inventory_df.drop_duplicates(subset=['ItemID', 'Description'], keep='first', inplace=True)
     
     # Save Inventory Master file
-    inventory_df.to_csv(os.path.join(processed_path, 'Inventory.csv'), index=False)
+    inventory_df = write_table(inventory_df, os.path.join(processed_path, 'Inventory.csv'), 'Inventory')
     
     return inventory_df
 
@@ -232,10 +241,11 @@ def create_inventory_master(sales_df, purchases_df, opening_stock_df, processed_
 # Create Stores.csv (StoreID, Location)
 # ingests and cleans the store data
 # returns a DataFrame with cleaned store data and saves it to a CSV file
+@track_stage()
 def create_stores_file(raw_path, processed_path):
     # Extract InventoryID from BeginInv file only
     beg_inv_file = os.path.join(raw_path, 'BegInvFINAL12312016.csv')
-    beg_inv_df = pd.read_csv(beg_inv_file)
+    beg_inv_df = read_table(beg_inv_file, 'OpeningStockRaw', usecols=['InventoryId'])
     
     # Extract inventory IDs and filter for valid format
     inventory_ids = pd.Series(beg_inv_df['InventoryId'].dropna().unique())
@@ -252,6 +262,6 @@ def create_stores_file(raw_path, processed_path):
     stores_df = split_data[['StoreID', 'Location']].drop_duplicates()
     
     # Save to CSV
-    stores_df.to_csv(os.path.join(processed_path, 'Stores.csv'), index=False)
+    stores_df = write_table(stores_df, os.path.join(processed_path, 'Stores.csv'), 'Stores')
     
     return stores_df
\ No newline at end of file
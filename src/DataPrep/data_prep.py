@@ -1,5 +1,8 @@
 #import packages
+import os
 import pandas as pd
+from .schema import read_table, write_table
+from .telemetry import track_stage
 
 
 # Load the csv files
@@ -33,24 +36,23 @@ Stores.csv
 """
 
 # load the data
-inventory_df = pd.read_csv('../../Data/Processed/Inventory.csv')
-opening_stock_df = pd.read_csv('../../Data/Processed/OpeningStock.csv')
-purchases_df = pd.read_csv('../../Data/Processed/Purchases.csv')
-sales_df = pd.read_csv('../../Data/Processed/Sales.csv')
-stores_df = pd.read_csv('../../Data/Processed/Stores.csv')
-
-# convert the date columns to datetime format
-purchases_df['PODate'] = pd.to_datetime(purchases_df['PODate'])
-purchases_df['ReceivingDate'] = pd.to_datetime(purchases_df['ReceivingDate'])
-sales_df['SalesDate'] = pd.to_datetime(sales_df['SalesDate'])
-opening_stock_df['startDate'] = pd.to_datetime(opening_stock_df['startDate'])
+# the schema gives every table compact dtypes and parses the date columns to datetime
+def load_processed_data(processed_path='../../Data/Processed/'):
+    return {
+        'inventory': read_table(os.path.join(processed_path, 'Inventory.csv'), 'Inventory'),
+        'opening_stock': read_table(os.path.join(processed_path, 'OpeningStock.csv'), 'OpeningStock'),
+        'purchases': read_table(os.path.join(processed_path, 'Purchases.csv'), 'Purchases'),
+        'sales': read_table(os.path.join(processed_path, 'Sales.csv'), 'Sales'),
+        'stores': read_table(os.path.join(processed_path, 'Stores.csv'), 'Stores'),
+    }
 
 
 
 # ==================================================================================
 # Create a lead_time_data.csv file
 # This will be used to train a lead time model
-def create_lead_time_data():
+@track_stage()
+def create_lead_time_data(processed_path='../../Data/Processed/', prepped_path='../../Data/Prepped/'):
     """
     Lead_time_data.csv:
     Column Name     | Description
@@ -66,8 +68,11 @@ def create_lead_time_data():
     Month           | Month of PODate               (optional feature)
     Day             | Day of week PODate was placed (optional feature)
 """
+    data = load_processed_data(processed_path)
+    inventory_df, stores_df = data['inventory'], data['stores']
+
     # Create a new dataframe for lead time data
-    lead_time_df = purchases_df.copy()
+    lead_time_df = data['purchases'].copy()
 
     # add the description and store location to the lead time data
     lead_time_df = lead_time_df.merge(inventory_df[['ItemID', 'Description']], on='ItemID', how='left')
@@ -100,7 +105,7 @@ def create_lead_time_data():
         ]]
 
     # Save lead_time_csv to prepped data folder
-    lead_time_df.to_csv('../../Data/Prepped/lead_time_data.csv', index=False)
+    lead_time_df = write_table(lead_time_df, os.path.join(prepped_path, 'lead_time_data.csv'), 'lead_time_data')
 
     # return lead_time_df for notebook to use
     return lead_time_df
@@ -109,7 +114,8 @@ def create_lead_time_data():
 # ==================================================================================
 # Create a sales_forecast.csv file
 # This will be used to train a lead time model
-def create_sales_forecast_data():
+@track_stage()
+def create_sales_forecast_data(processed_path='../../Data/Processed/', prepped_path='../../Data/Prepped/'):
     """
     Sales_forecast.csv:
     Column Name     | Description
@@ -124,8 +130,11 @@ def create_sales_forecast_data():
     DayOfWeek       | Day of week of sale
     """
 
+    data = load_processed_data(processed_path)
+    inventory_df, stores_df = data['inventory'], data['stores']
+
     # Create a new dataframe for sales forecast data
-    sales_forecast_df = sales_df.copy()
+    sales_forecast_df = data['sales'].copy()
 
     # add the description and store location to the sales forecast data
     sales_forecast_df = sales_forecast_df.merge(inventory_df[['ItemID', 'Description']], on='ItemID', how='left')
@@ -168,7 +177,7 @@ def create_sales_forecast_data():
         ]]
 
     # Save lead_time_csv to prepped data folder
-    sales_forecast_df.to_csv('../../Data/Prepped/sales_forecast_data.csv', index=False)
+    sales_forecast_df = write_table(sales_forecast_df, os.path.join(prepped_path, 'sales_forecast_data.csv'), 'sales_forecast_data')
 
     # return lead_time_df for notebook to use
     return sales_forecast_df
\ No newline at end of file
@@ -0,0 +1,155 @@
+# ==================================================================================
+# History rollup cube
+# Pre-aggregates the 2016 actuals in Data/Processed/Sales.csv and Purchases.csv to
+#   (StoreID, ItemID, period) -> sales quantity, purchase quantity, purchase order count
+# at day, week and month grain, plus a whole-store rollup stored under ItemID = ALL_ITEMS.
+# Purchases are counted on their ReceivingDate, when the stock arrives (as in the ledger).
+#
+# Each grain is kept as contiguous arrays sorted by (StoreID, ItemID, period) with an offsets
+# array per store-item key, so the history of any pair at any grain is a dictionary lookup
+# plus an array slice instead of a scan of the raw rows.
+
+import os
+import numpy as np
+import pandas as pd
+from .schema import read_table
+from .telemetry import track_stage, record_io
+
+# Period start dates for each grain: weeks start on Monday, months on the 1st
+GRAINS = {
+    'day': 'D',
+    'week': 'W-SUN',
+    'month': 'M',
+}
+
+# ItemID used for the whole-store rollup
+ALL_ITEMS = 0
+
+VALUE_COLUMNS = ['SalesQuantity', 'PurchaseQuantity', 'OrderCount']
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+# ==================================================================================
+# Cube
+
+class HistoryCube:
+    def __init__(self, grains):
+        # grains: {grain: {'keys', 'offsets', 'periods', 'SalesQuantity', 'PurchaseQuantity', 'OrderCount'}}
+        self.grains = grains
+        self._rows = {
+            grain: {key: i for i, key in enumerate(arrays['keys'].tolist())}
+            for grain, arrays in grains.items()
+        }
+
+    # Pack a store-item pair into one int64 key
+    @staticmethod
+    def pair_key(store_id, item_id):
+        return (int(store_id) << 32) | int(item_id)
+
+    # History of a store-item pair (or the whole store with item_id=ALL_ITEMS) at a grain
+    # returns a DataFrame with Period, SalesQuantity, PurchaseQuantity and OrderCount
+    # (empty if the pair has no history)
+    def lookup(self, store_id, item_id=ALL_ITEMS, grain='week'):
+        if grain not in self.grains:
+            raise ValueError(f"Unknown grain: {grain}, expected one of {list(self.grains)}")
+        arrays = self.grains[grain]
+        row = self._rows[grain].get(self.pair_key(store_id, item_id))
+        if row is None:
+            return pd.DataFrame({'Period': pd.to_datetime([]), **{c: np.array([], dtype=np.int32) for c in VALUE_COLUMNS}})
+
+        start, end = arrays['offsets'][row], arrays['offsets'][row + 1]
+        return pd.DataFrame({
+            'Period': pd.to_datetime(EPOCH + arrays['periods'][start:end]),
+            **{column: arrays[column][start:end] for column in VALUE_COLUMNS}
+        })
+
+    # Save every grain to one compressed .npz file
+    def save(self, path):
+        np.savez_compressed(path, **{
+            f'{grain}__{name}': array
+            for grain, arrays in self.grains.items()
+            for name, array in arrays.items()
+        })
+
+    # Load a cube saved with save()
+    @classmethod
+    def load(cls, path):
+        grains = {}
+        with np.load(path) as data:
+            for name in data.files:
+                grain, array_name = name.split('__', 1)
+                grains.setdefault(grain, {})[array_name] = data[name]
+        return cls(grains)
+
+
+# ==================================================================================
+# Build
+
+# Aggregate daily totals to one grain, including the whole-store rollup
+# returns the contiguous arrays of the grain
+def _build_grain(daily, freq):
+    df = daily.copy()
+    df['Period'] = df['Date'].dt.to_period(freq).dt.start_time
+
+    by_item = df.groupby(['StoreID', 'ItemID', 'Period'], as_index=False)[VALUE_COLUMNS].sum()
+    by_store = df.groupby(['StoreID', 'Period'], as_index=False)[VALUE_COLUMNS].sum()
+    by_store['ItemID'] = ALL_ITEMS
+
+    cube = pd.concat([by_item, by_store], ignore_index=True).sort_values(['StoreID', 'ItemID', 'Period'])
+    keys = (cube['StoreID'].to_numpy(dtype=np.int64) << 32) | cube['ItemID'].to_numpy(dtype=np.int64)
+
+    # Offsets of each key's first row, plus the end of the last key
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return {
+        'keys': keys[starts],
+        'offsets': np.r_[starts, len(keys)].astype(np.int64),
+        'periods': (cube['Period'].to_numpy().astype('datetime64[D]') - EPOCH).astype(np.int32),
+        **{column: cube[column].to_numpy(dtype=np.int32) for column in VALUE_COLUMNS},
+    }
+
+# Build the cube from processed sales and purchases DataFrames
+def build_history_cube(sales_df, purchases_df, grains=GRAINS):
+    sales = pd.DataFrame({
+        'StoreID': sales_df['StoreID'],
+        'ItemID': sales_df['ItemID'],
+        'Date': sales_df['SalesDate'],
+        'SalesQuantity': sales_df['SalesQuantity'],
+        'PurchaseQuantity': 0,
+        'OrderCount': 0,
+    })
+    purchases = pd.DataFrame({
+        'StoreID': purchases_df['StoreID'],
+        'ItemID': purchases_df['ItemID'],
+        'Date': purchases_df['ReceivingDate'],
+        'SalesQuantity': 0,
+        'PurchaseQuantity': purchases_df['Quantity'],
+        'OrderCount': 1,
+    })
+
+    # Daily totals first, the coarser grains and the store rollup are built from these
+    daily = pd.concat([sales, purchases], ignore_index=True)
+    daily = daily.groupby(['StoreID', 'ItemID', 'Date'], as_index=False)[VALUE_COLUMNS].sum()
+
+    return HistoryCube({grain: _build_grain(daily, freq) for grain, freq in grains.items()})
+
+# Build the cube from Sales.csv and Purchases.csv in processed_path and save it there
+@track_stage()
+def create_history_cube(processed_path='../../Data/Processed/', sales_df=None, purchases_df=None):
+    # DataFrames passed in by process_all_data are counted here, files are counted by read_table
+    if sales_df is None:
+        sales_df = read_table(os.path.join(processed_path, 'Sales.csv'), 'Sales')
+    else:
+        record_io(rows_in=len(sales_df))
+    if purchases_df is None:
+        purchases_df = read_table(os.path.join(processed_path, 'Purchases.csv'), 'Purchases')
+    else:
+        record_io(rows_in=len(purchases_df))
+
+    cube = build_history_cube(sales_df, purchases_df)
+    cube_path = os.path.join(processed_path, 'history_cube.npz')
+    cube.save(cube_path)
+
+    record_io(rows_out=sum(len(arrays['periods']) for arrays in cube.grains.values()),
+              bytes_written=os.path.getsize(cube_path))
+    return cube
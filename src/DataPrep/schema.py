@@ -0,0 +1,205 @@
+# ==================================================================================
+# Central schema registry for every CSV table in the project
+# Gives each column an explicit compact dtype so that all readers and writers agree:
+# int32 IDs (ItemID is always an int, never a string), categorical text columns,
+# datetime64 dates and int16/int32 quantities.
+
+import os
+import pandas as pd
+from .telemetry import record_read, record_write
+
+
+# ==================================================================================
+# Table Schemas
+# column name -> dtype, 'datetime' marks date columns (parsed to datetime64, written as yyyy-mm-dd)
+
+DATE = 'datetime'
+
+SCHEMAS = {
+    # Raw Kaggle files (only the columns that are used)
+    'SalesRaw': {
+        'InventoryId': 'string',
+        'Store': 'string',
+        'Brand': 'int32',
+        'Description': 'category',
+        'SalesQuantity': 'int32',
+        'SalesDate': DATE,
+    },
+    'PurchasesRaw': {
+        'InventoryId': 'string',
+        'Store': 'string',
+        'Brand': 'int32',
+        'Description': 'category',
+        'PODate': DATE,
+        'ReceivingDate': DATE,
+        'Quantity': 'int32',
+    },
+    'OpeningStockRaw': {
+        'InventoryId': 'string',
+        'Store': 'string',
+        'Brand': 'int32',
+        'Description': 'category',
+        'onHand': 'int32',
+        'startDate': DATE,
+    },
+
+    # Data/Processed
+    'Sales': {
+        'StoreID': 'int32',
+        'SalesQuantity': 'int32',
+        'SalesDate': DATE,
+        'ItemID': 'int32',
+    },
+    'Purchases': {
+        'StoreID': 'int32',
+        'PODate': DATE,
+        'ReceivingDate': DATE,
+        'Quantity': 'int32',
+        'ItemID': 'int32',
+    },
+    'OpeningStock': {
+        'StoreID': 'int32',
+        'onHand': 'int32',
+        'startDate': DATE,
+        'ItemID': 'int32',
+    },
+    'Inventory': {
+        'ItemID': 'int32',
+        'Description': 'category',
+    },
+    'Stores': {
+        'StoreID': 'int32',
+        'Location': 'category',
+    },
+
+    # Data/Prepped and Data/final
+    'lead_time_data': {
+        'PODate': DATE,
+        'ReceivingDate': DATE,
+        'LeadTimeDays': 'int16',
+        'ItemID': 'int32',
+        'Description': 'category',
+        'StoreID': 'int32',
+        'Location': 'category',
+        'Quantity': 'int32',
+        'Week': 'int8',
+        'Month': 'int8',
+        'Day': 'int8',
+    },
+    'sales_forecast_data': {
+        'SalesDate': DATE,
+        'ItemID': 'int32',
+        'StoreID': 'int32',
+        'SalesQuantity': 'int32',
+        # The lag features are model inputs and float32 would change the values written to Data/final
+        'Lag_1': 'float64',
+        'Lag_7': 'float64',
+        'RollingAvg_7': 'float64',
+        'Month': 'int8',
+        'DayOfWeek': 'int8',
+    },
+}
+
+# Date format used when writing date columns
+DATE_FORMAT = '%Y-%m-%d'
+
+# (table, folder, file name) of every dataset under Data/
+DATASET_FILES = [
+    ('Sales', 'Processed', 'Sales.csv'),
+    ('Purchases', 'Processed', 'Purchases.csv'),
+    ('OpeningStock', 'Processed', 'OpeningStock.csv'),
+    ('Inventory', 'Processed', 'Inventory.csv'),
+    ('Stores', 'Processed', 'Stores.csv'),
+    ('lead_time_data', 'Prepped', 'lead_time_data.csv'),
+    ('sales_forecast_data', 'Prepped', 'sales_forecast_data.csv'),
+    ('lead_time_data', 'final', 'lead_time_data.csv'),
+    ('sales_forecast_data', 'final', 'sales_forecast_data.csv'),
+]
+
+
+# ==================================================================================
+# Read / Write
+
+# Cast the columns of df that appear in the table schema to their compact dtypes
+# Columns that are not in the schema are left unchanged
+def apply_schema(df, table):
+    schema = SCHEMAS[table]
+    df = df.copy()
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            continue
+        if dtype == DATE:
+            df[column] = pd.to_datetime(df[column])
+        elif dtype == 'category':
+            df[column] = df[column].astype('string').astype('category')
+        elif dtype == 'string':
+            df[column] = df[column].astype('string').str.strip()
+        else:
+            df[column] = pd.to_numeric(df[column]).astype(dtype)
+    return df
+
+# dtypes passed to read_csv, dates and categories are read as strings and converted afterwards
+def _read_dtypes(table, usecols=None):
+    return {
+        column: ('string' if dtype in (DATE, 'category') else dtype)
+        for column, dtype in SCHEMAS[table].items()
+        if usecols is None or column in usecols
+    }
+
+# Read a CSV file using the table schema
+# usecols limits the columns read, any other read_csv arguments are passed through
+# Floats are parsed round-trip so a file read and written again is unchanged
+def read_table(path, table, usecols=None, **kwargs):
+    dtypes = _read_dtypes(table, usecols)
+    kwargs.setdefault('float_precision', 'round_trip')
+    df = pd.read_csv(path, usecols=usecols, dtype=dtypes, **kwargs)
+    record_read(path, len(df))
+    return apply_schema(df, table)
+
+# Read a CSV file in chunks of chunksize rows, applying the table schema to each chunk
+def iter_table(path, table, chunksize=100_000, usecols=None, **kwargs):
+    dtypes = _read_dtypes(table, usecols)
+    kwargs.setdefault('float_precision', 'round_trip')
+    with pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunksize, **kwargs) as reader:
+        for i, chunk in enumerate(reader):
+            # The file's bytes are counted once, with the first chunk
+            record_read(path if i == 0 else None, len(chunk))
+            yield apply_schema(chunk, table)
+
+# Write a DataFrame to CSV using the table schema, dates are written as yyyy-mm-dd
+# returns the DataFrame with the schema applied
+def write_table(df, path, table, **kwargs):
+    df = apply_schema(df, table)
+    size_before = os.path.getsize(path) if kwargs.get('mode', 'w') == 'a' and os.path.exists(path) else 0
+    df.to_csv(path, index=False, date_format=DATE_FORMAT, **kwargs)
+    record_write(os.path.getsize(path) - size_before, len(df))
+    return df
+
+
+# ==================================================================================
+# Memory Footprint Report
+
+# Compare the memory used by each dataset with inferred dtypes vs the schema dtypes
+# returns a DataFrame with one row per file found and prints the totals
+def memory_footprint_report(data_path='../../Data/'):
+    rows = []
+    for table, folder, filename in DATASET_FILES:
+        path = os.path.join(data_path, folder, filename)
+        if not os.path.exists(path):
+            continue
+        inferred_bytes = pd.read_csv(path).memory_usage(deep=True).sum()
+        schema_bytes = read_table(path, table).memory_usage(deep=True).sum()
+        rows.append({
+            'File': f'{folder}/{filename}',
+            'InferredMB': inferred_bytes / 1024 ** 2,
+            'SchemaMB': schema_bytes / 1024 ** 2,
+        })
+
+    report = pd.DataFrame(rows)
+    if not report.empty:
+        report['SavedPct'] = 100 * (1 - report['SchemaMB'] / report['InferredMB'])
+        total_inferred = report['InferredMB'].sum()
+        total_schema = report['SchemaMB'].sum()
+        print(f"Total: {total_inferred:.2f} MB inferred -> {total_schema:.2f} MB with schema "
+              f"({100 * (1 - total_schema / total_inferred):.1f}% saved)")
+    return report
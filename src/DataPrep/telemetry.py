@@ -0,0 +1,256 @@
+# ==================================================================================
+# Run telemetry for the offline data pipeline
+# Stages are functions decorated with @track_stage. For each stage this records:
+#   wall and CPU time, rows and bytes read and written (counted by read_table / write_table in
+#   schema.py, or added with record_rows), rows per second and peak memory (RSS): the process peak
+#   when the stage finished and how far the stage raised it above the peak when it started.
+# Stages can be nested (process_all_data runs process_sales_data, ...), a parent's counters
+# include its children's. The outermost stage is a run: when it finishes a JSON run report is
+# written to artifacts/run_reports/ under a new name, so reports from earlier runs are kept and
+# load_run_reports can show which stage got slower as the data grew.
+
+import json
+import os
+import platform
+import threading
+import time
+from functools import wraps
+import pandas as pd
+
+# resource is not available on Windows, peak memory is then not reported
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Where run reports are written, RUN_REPORT_DIR overrides it
+REPORT_DIR = os.environ.get('RUN_REPORT_DIR', os.path.join(PROJECT_DIR, 'artifacts', 'run_reports'))
+
+# Stack of active stages per thread (pipeline stages run on separate threads)
+_local = threading.local()
+
+# Outermost stages running in this process, on any thread. The peak RSS is process wide, so it is
+# only reset when no other run is active, and a run that overlapped another can't claim the peak.
+_active_runs = []
+_runs_lock = threading.Lock()
+
+
+# ==================================================================================
+# Memory
+
+# Peak resident set size of this process in MB, None if it cannot be measured
+# On Linux this is VmHWM, which reset_peak_rss can reset so a run gets its own peak
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1024 ** 2 if platform.system() == 'Darwin' else max_rss / 1024
+
+# Reset the peak RSS to the current RSS (Linux only), returns False if not supported
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+# ==================================================================================
+# Stages
+
+class StageRecord:
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.rows_in = 0
+        self.rows_out = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.children = []
+        self.peak_rss_mb = None
+        self.baseline_rss_mb = None
+        self._peak_reset = False
+        self._overlapped = False
+
+    def start(self):
+        self.started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._thread_cpu = time.thread_time()
+        # Only an outermost stage with no other run active resets the peak, so a parent's peak
+        # covers its children and a run on another thread doesn't lose its peak
+        if self.parent is None:
+            with _runs_lock:
+                for run in _active_runs:
+                    run._overlapped = True
+                self._overlapped = bool(_active_runs)
+                self._peak_reset = not _active_runs and reset_peak_rss()
+                _active_runs.append(self)
+        self.baseline_rss_mb = peak_rss_mb()
+
+    def finish(self, status='ok', error=None):
+        self.wall_seconds = time.perf_counter() - self._wall
+        self.cpu_seconds = time.process_time() - self._cpu
+        self.thread_cpu_seconds = time.thread_time() - self._thread_cpu
+        self.peak_rss_mb = peak_rss_mb()
+        self.status = status
+        self.error = error
+        if self.parent is None:
+            with _runs_lock:
+                _active_runs.remove(self)
+
+    # How far the process peak rose above its value when the stage started, in MB
+    # 0 means the stage stayed below the peak it started with
+    def peak_rss_growth_mb(self):
+        if self.peak_rss_mb is None or self.baseline_rss_mb is None:
+            return None
+        return self.peak_rss_mb - self.baseline_rss_mb
+
+    def to_dict(self):
+        rows = max(self.rows_in, self.rows_out)
+        return {
+            'name': self.name,
+            'status': self.status,
+            'error': self.error,
+            'started_at': self.started_at,
+            'wall_seconds': round(self.wall_seconds, 4),
+            'cpu_seconds': round(self.cpu_seconds, 4),
+            'thread_cpu_seconds': round(self.thread_cpu_seconds, 4),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'rows_per_second': round(rows / self.wall_seconds, 1) if self.wall_seconds > 0 else None,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'peak_rss_mb': round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+            'peak_rss_growth_mb': round(self.peak_rss_growth_mb(), 1) if self.peak_rss_growth_mb() is not None else None,
+            'peak_rss_is_stage_peak': self._peak_reset and not self._overlapped,
+            'stages': [child.to_dict() for child in self.children],
+        }
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+# Add rows and bytes to every active stage (the current stage and its parents)
+def record_io(rows_in=0, rows_out=0, bytes_read=0, bytes_written=0):
+    for stage in _stack():
+        stage.rows_in += rows_in
+        stage.rows_out += rows_out
+        stage.bytes_read += bytes_read
+        stage.bytes_written += bytes_written
+
+# Add rows that a stage takes in or produces without reading or writing a file
+def record_rows(rows_in=0, rows_out=0):
+    record_io(rows_in=rows_in, rows_out=rows_out)
+
+# Called by read_table / iter_table (path None when the file's bytes were already counted, no bytes
+# are counted for a file object, e.g. a partition of a file)
+def record_read(path, rows):
+    if _stack():
+        is_file = isinstance(path, (str, os.PathLike)) and os.path.exists(path)
+        record_io(rows_in=rows, bytes_read=os.path.getsize(path) if is_file else 0)
+
+# Called by write_table
+def record_write(bytes_written, rows):
+    if _stack():
+        record_io(rows_out=rows, bytes_written=bytes_written)
+
+# Decorator that records a stage, the outermost stage writes a run report when it finishes
+def track_stage(name=None):
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = _stack()
+            parent = stack[-1] if stack else None
+            record = StageRecord(stage_name, parent)
+            if parent is not None:
+                parent.children.append(record)
+
+            stack.append(record)
+            record.start()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                # KeyboardInterrupt, SystemExit, ... still finish the record so the report is written
+                record.finish('failed' if isinstance(e, Exception) else 'interrupted', f'{type(e).__name__}: {e}')
+                raise
+            else:
+                record.finish()
+            finally:
+                stack.pop()
+                if parent is None:
+                    write_run_report(record)
+            return result
+        return wrapper
+    return decorator
+
+
+# ==================================================================================
+# Run Reports
+
+# Write the report for a finished outermost stage, returns the report path
+def write_run_report(record, report_dir=None):
+    report_dir = report_dir or REPORT_DIR
+    os.makedirs(report_dir, exist_ok=True)
+    report = {
+        'run': record.name,
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'pid': os.getpid(),
+        **record.to_dict(),
+    }
+
+    timestamp = time.strftime('%Y%m%dT%H%M%S')
+    path = os.path.join(report_dir, f'{record.name}_{timestamp}_{os.getpid()}.json')
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"[{record.name}] {record.status} in {record.wall_seconds:.2f}s "
+          f"({record.rows_in} rows in, {record.rows_out} rows out, peak RSS {report['peak_rss_mb']} MB, "
+          f"+{report['peak_rss_growth_mb']} MB in the stage), "
+          f"report: {path}")
+    return path
+
+# Flatten every run report into one row per stage, oldest run first
+# returns a DataFrame to compare a stage's time, throughput and memory across runs
+def load_run_reports(report_dir=None, run=None):
+    report_dir = report_dir or REPORT_DIR
+    rows = []
+    if os.path.isdir(report_dir):
+        for filename in sorted(os.listdir(report_dir)):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(report_dir, filename)) as f:
+                report = json.load(f)
+            if run is not None and report['run'] != run:
+                continue
+
+            pending = [(report, '')]
+            while pending:
+                stage, prefix = pending.pop(0)
+                path = f"{prefix}/{stage['name']}" if prefix else stage['name']
+                rows.append({
+                    'report': filename,
+                    'run': report['run'],
+                    'run_started_at': report['started_at'],
+                    'stage': path,
+                    **{key: value for key, value in stage.items() if key not in ('name', 'stages', 'run', 'host', 'python', 'pid')},
+                })
+                pending.extend((child, path) for child in stage['stages'])
+
+    df = pd.DataFrame(rows)
+    return df.sort_values('run_started_at', kind='stable').reset_index(drop=True) if not df.empty else df
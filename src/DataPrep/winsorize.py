@@ -0,0 +1,306 @@
+# ==================================================================================
+# Outlier treatment (winsorization) as a pipeline stage
+# Replaces the scipy winsorize step in Data_understanding.ipynb that produced Data/final:
+#   Pass 1 streams the prepped data in chunks and builds a mergeable quantile sketch per
+#          partition (file), the sketches are merged to get the clipping bounds.
+#   Pass 2 streams the data again and clips each chunk to the bounds.
+# Neither pass holds a whole dataset in memory. Each file is split into byte ranges (partitions) and
+# both passes run the partitions in parallel, pass 2 writes one part per partition and the parts are
+# joined in order.
+
+import io
+import math
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from .schema import iter_table, write_table
+
+
+# ==================================================================================
+# Quantile Sketch
+
+# Mergeable approximate-quantile sketch with log-spaced buckets (DDSketch style)
+# Any quantile is returned within relative_accuracy of the true value, and two sketches
+# built on different partitions merge into the sketch of the combined data.
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    # Add an array of values to the sketch
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+
+        self.count += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.zero_count += int(np.count_nonzero(values == 0))
+        self._add_buckets(self.positive, values[values > 0])
+        self._add_buckets(self.negative, -values[values < 0])
+
+    def _add_buckets(self, buckets, values):
+        if len(values) == 0:
+            return
+        keys, counts = np.unique(np.ceil(np.log(values) / self.log_gamma).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            buckets[key] = buckets.get(key, 0) + count
+
+    # Merge another sketch (with the same accuracy) into this one
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for buckets, other_buckets in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_buckets.items():
+                buckets[key] = buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    # Representative value of a bucket
+    def _bucket_value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    # Approximate value at quantile q (0-1)
+    def quantile(self, q):
+        if self.count == 0:
+            return math.nan
+
+        rank = q * (self.count - 1)
+        seen = 0
+
+        # Walk the buckets from the most negative value to the largest positive value
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return max(-self._bucket_value(key), self.min)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return min(self._bucket_value(key), self.max)
+        return self.max
+
+
+# ==================================================================================
+# Partitions
+# A file is split into byte ranges that begin at the start of a line, each worker seeks to its range
+# and parses only those bytes, so finding the ranges costs a seek per range and no row is parsed
+# twice (the data files have no quoted newlines, every newline ends a row)
+
+# Column names from the header line of a CSV file
+def read_header(path):
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+# Split the data rows of each file into byte ranges that start and end on line boundaries
+# returns a list of (path, start byte, end byte) and, per file, the indices of its partitions
+def split_partitions(paths, partitions):
+    ranges, by_file = [], []
+    for path in paths:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            f.readline()
+            offsets = [f.tell()]
+            # Move each even split point forward to the start of the next line
+            for i in range(1, partitions):
+                f.seek(max(offsets[0] + (size - offsets[0]) * i // partitions - 1, offsets[-1]))
+                f.readline()
+                offsets.append(f.tell())
+        offsets.append(size)
+        # A file smaller than the number of partitions has empty ranges, keep one range per file
+        bounds = [(start, end) for start, end in zip(offsets, offsets[1:]) if end > start] or [(offsets[0], size)]
+        by_file.append(list(range(len(ranges), len(ranges) + len(bounds))))
+        ranges += [(path, start, end) for start, end in bounds]
+    return ranges, by_file
+
+# Binary file object that reads at most length bytes of another one from its current position
+class ByteRange(io.RawIOBase):
+    def __init__(self, f, length):
+        self.f = f
+        self.remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            return 0
+        n = self.f.readinto(memoryview(buffer)[:min(len(buffer), self.remaining)])
+        self.remaining -= n
+        return n
+
+# Read the rows in bytes start to end of a file (a range from split_partitions) in chunks, applying
+# the table schema, end None reads to the end of the file
+def iter_partition(path, table, start=None, end=None, chunksize=100_000, usecols=None):
+    columns = read_header(path)
+    with open(path, 'rb') as f:
+        if start is None:
+            f.readline()
+        else:
+            f.seek(start)
+        length = (end if end is not None else os.path.getsize(path)) - f.tell()
+        if length <= 0:
+            return
+        yield from iter_table(ByteRange(f, length), table, chunksize=chunksize, usecols=usecols,
+                              header=None, names=columns)
+
+
+# ==================================================================================
+# Pass 1: Clipping Bounds
+
+# Build the sketches for one partition (bytes start to end of a file, the whole file by default)
+# returns {group key: QuantileSketch}, the key is None when by is None
+def sketch_file(path, table, column, by=None, chunksize=100_000, relative_accuracy=0.01, start=None, end=None):
+    usecols = [column] + list(by or [])
+    sketches = {}
+    for chunk in iter_partition(path, table, start, end, chunksize, usecols):
+        if by is None:
+            sketches.setdefault(None, QuantileSketch(relative_accuracy)).add(chunk[column].to_numpy())
+            continue
+        for key, values in chunk.groupby(list(by), observed=True)[column]:
+            sketches.setdefault(key, QuantileSketch(relative_accuracy)).add(values.to_numpy())
+    return sketches
+
+# Merge per-partition sketches into one sketch per group
+def merge_sketches(partition_sketches):
+    merged = {}
+    for sketches in partition_sketches:
+        for key, sketch in sketches.items():
+            if key in merged:
+                merged[key].merge(sketch)
+            else:
+                merged[key] = sketch
+    return merged
+
+# Compute the clipping bounds for a column over one or more files, sketched in parallel
+# limits are the fractions cut from the bottom and top, as in scipy's winsorize
+# by groups the bounds, e.g. ['StoreID', 'ItemID'], or None for one global pair of bounds
+# partitions is the number of byte ranges per file (default: one per worker)
+# returns {group key: (lower, upper)}
+def compute_clip_bounds(paths, table, column, limits=(0.05, 0.05), by=None, chunksize=100_000,
+                        relative_accuracy=0.01, max_workers=None, integer=True, partitions=None):
+    ranges, _ = split_partitions(paths, partitions or max_workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        partition_sketches = list(executor.map(
+            sketch_file, *zip(*((path, table, column, by, chunksize, relative_accuracy, start, end)
+                                for path, start, end in ranges))
+        ))
+
+    bounds = {}
+    for key, sketch in merge_sketches(partition_sketches).items():
+        lower, upper = sketch.quantile(limits[0]), sketch.quantile(1 - limits[1])
+        if integer:
+            lower, upper = round(lower), round(upper)
+        bounds[key] = (lower, upper)
+    return bounds
+
+
+# ==================================================================================
+# Pass 2: Clip
+
+# Clip one chunk to the bounds (global or per group)
+def clip_chunk(chunk, column, bounds, by=None):
+    chunk = chunk.copy()
+    if by is None:
+        lower, upper = bounds[None]
+        chunk[column] = chunk[column].clip(lower, upper)
+        return chunk
+
+    bounds_df = pd.DataFrame(
+        [(*(key if isinstance(key, tuple) else (key,)), lower, upper) for key, (lower, upper) in bounds.items()],
+        columns=list(by) + ['_lower', '_upper']
+    )
+    limits = chunk[list(by)].merge(bounds_df, on=list(by), how='left')
+    chunk[column] = chunk[column].clip(limits['_lower'].to_numpy(), limits['_upper'].to_numpy())
+    return chunk
+
+# Stream a partition (bytes start to end of a file, the whole file by default) through clip_chunk and
+# write the result chunk by chunk, header writes the column names first
+def winsorize_file(in_path, out_path, table, column, bounds, by=None, chunksize=100_000,
+                   start=None, end=None, header=True):
+    rows = 0
+    for i, chunk in enumerate(iter_partition(in_path, table, start, end, chunksize)):
+        chunk = clip_chunk(chunk, column, bounds, by)
+        write_table(chunk, out_path, table, mode='w' if i == 0 else 'a', header=header and i == 0)
+        rows += len(chunk)
+    return rows
+
+# Winsorize a column across one or more files
+# in_paths and out_paths are matching lists of files, each file is split into partitions byte
+# ranges (default: one per worker) that are clipped in parallel into part files, joined in order
+# returns the bounds that were applied
+def winsorize_partitions(in_paths, out_paths, table, column, limits=(0.05, 0.05), by=None,
+                         chunksize=100_000, max_workers=None, partitions=None):
+    partitions = partitions or max_workers or os.cpu_count() or 1
+    bounds = compute_clip_bounds(in_paths, table, column, limits, by, chunksize,
+                                 max_workers=max_workers, partitions=partitions)
+
+    ranges, by_file = split_partitions(in_paths, partitions)
+    first = {indices[0] for indices in by_file}
+    part_paths = [f'{out_path}.part{i}' for out_path, indices in zip(out_paths, by_file) for i in indices]
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(
+                winsorize_file, *zip(*((path, part_path, table, column, bounds, by, chunksize, start, end, i in first)
+                                       for i, ((path, start, end), part_path) in enumerate(zip(ranges, part_paths))))
+            ))
+
+        for out_path, indices in zip(out_paths, by_file):
+            with open(out_path, 'wb') as out:
+                # An empty partition writes no part
+                for i in filter(lambda i: os.path.exists(part_paths[i]), indices):
+                    with open(part_paths[i], 'rb') as part:
+                        shutil.copyfileobj(part, out)
+    finally:
+        for part_path in part_paths:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+    return bounds
+
+
+# ==================================================================================
+# Stage
+
+# Outlier treatment from Data_understanding.ipynb: SalesQuantity in sales_forecast_data.csv
+# and Quantity in lead_time_data.csv are winsorized at the 5th/95th percentiles
+WINSORIZE_TARGETS = [
+    ('sales_forecast_data', 'sales_forecast_data.csv', 'SalesQuantity'),
+    ('lead_time_data', 'lead_time_data.csv', 'Quantity'),
+]
+
+# Run the winsorization stage from Data/Prepped to Data/final
+# by=['StoreID', 'ItemID'] clips each store-item pair to its own percentiles instead of the global ones
+# partitions is the number of byte ranges each file is split into (default: one per worker)
+# returns {file name: bounds}
+def run_winsorization(prepped_path='../../Data/Prepped/', final_path='../../Data/final/', limits=(0.05, 0.05),
+                      by=None, chunksize=100_000, max_workers=None, partitions=None):
+    os.makedirs(final_path, exist_ok=True)
+
+    applied = {}
+    for table, filename, column in WINSORIZE_TARGETS:
+        in_path = os.path.join(prepped_path, filename)
+        if not os.path.exists(in_path):
+            print(f"Skipping {filename}: not found in {prepped_path}")
+            continue
+
+        print(f"Winsorizing {column} in {filename}...")
+        applied[filename] = winsorize_partitions(
+            [in_path], [os.path.join(final_path, filename)], table, column, limits, by, chunksize, max_workers,
+            partitions
+        )
+    return applied
@@ -0,0 +1,234 @@
+# ==================================================================================
+# Rolling-origin backtest of the sales forecast against the 2016 history
+# For every store-item pair a forecast is started at each origin date (every origin_step days).
+# The forecast uses the pair's actual lags at that date and the same lag logic as the WebApp
+# (recursive_forecast) and is scored against the sales recorded in the next horizon days.
+# The forecasts from an origin come from a model fitted on the sales up to that origin (all pairs,
+# same settings as train_sales_model), so no day it is scored on was in its training data.
+# Pairs are split into chunks that run on a process pool. Each chunk steps all of its
+# pair/origin forecasts together, and per-pair metrics are appended to the output file as
+# soon as a chunk finishes.
+#
+# Scoring only uses the days with recorded sales: days without a sale are not in
+# sales_forecast_data.csv, so a missing day cannot be told apart from a day with no data.
+
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from .sales_forecast import (load_sales_training_data, add_origin_lags, recursive_forecast_batch, direct_forecast,
+                             fit_sales_model, TARGET_COLUMN)
+
+# Models of each origin date, passed once to each worker process
+_worker_models = {}
+
+PAIR_METRIC_COLUMNS = ['StoreID', 'ItemID', 'Origins', 'DaysScored', 'ActualTotal', 'ForecastTotal',
+                       'MAE', 'RMSE', 'Bias', 'WAPE']
+
+
+# ==================================================================================
+# Origins
+
+# Origin dates from the first date + min_history days, every origin_step days, leaving at least
+# one day to score after the last origin
+def build_origin_dates(history, origin_step=7, min_history=7):
+    first_date, last_date = history['SalesDate'].min(), history['SalesDate'].max()
+    return pd.date_range(first_date + pd.Timedelta(days=min_history), last_date - pd.Timedelta(days=1),
+                         freq=f'{origin_step}D')
+
+# The state of each pair at each origin: its last recorded sale on or before the origin date
+# returns one row per (pair, origin) with the origin lags, origins before the pair's first sale
+# or after its last sale (nothing left to score) are left out
+def build_origin_states(history, origin_dates):
+    origins = pd.DataFrame({'OriginDate': origin_dates})
+
+    # Match each pair's origins to the pair's last row on or before the origin date
+    pairs = history[['StoreID', 'ItemID']].drop_duplicates()
+    grid = pairs.merge(origins, how='cross').sort_values('OriginDate')
+    states = pd.merge_asof(
+        grid,
+        history[['StoreID', 'ItemID', 'SalesDate', 'Origin_Lag_1', 'Origin_Lag_7', 'Origin_RollingAvg_7']]
+            .sort_values('SalesDate'),
+        left_on='OriginDate', right_on='SalesDate', by=['StoreID', 'ItemID'], direction='backward'
+    )
+    last_sale = history.groupby(['StoreID', 'ItemID'])['SalesDate'].max().rename('LastSalesDate').reset_index()
+    states = states.dropna(subset=['SalesDate']).merge(last_sale, on=['StoreID', 'ItemID'])
+    states = states[states['OriginDate'] < states['LastSalesDate']].drop(columns='LastSalesDate')
+    return states.sort_values(['StoreID', 'ItemID', 'OriginDate']).reset_index(drop=True)
+
+
+# ==================================================================================
+# Models
+
+# Fit a model for each origin date on the training rows (load_sales_training_data) dated on or
+# before it, the direct model only learns horizons up to horizon
+# returns {origin date: model}
+def fit_origin_models(training_data, origin_dates, horizon, mode='recursive'):
+    models = {}
+    for origin_date in origin_dates:
+        known = training_data[training_data['SalesDate'] <= origin_date]
+        models[origin_date] = fit_sales_model(known, mode, max_horizon=horizon)
+    return models
+
+
+# ==================================================================================
+# Workers
+
+def _init_worker(models):
+    _worker_models.update(models)
+
+# Forecast the origins of a chunk of pairs that share an origin date with that date's model
+def _forecast_origin(states, horizon, mode):
+    model = _worker_models[states['OriginDate'].iloc[0]]
+    start_dates = states['OriginDate'] + pd.Timedelta(days=1)
+    lag_1 = states['Origin_Lag_1'].to_numpy(dtype=float)
+    lag_7 = states['Origin_Lag_7'].to_numpy(dtype=float)
+    rolling_avg_7 = states['Origin_RollingAvg_7'].to_numpy(dtype=float)
+
+    if mode == 'recursive':
+        return recursive_forecast_batch(model, start_dates, lag_1, lag_7, rolling_avg_7, horizon)
+    return np.vstack([
+        direct_forecast(model, pd.date_range(start, periods=horizon), l1, l7, r)
+        for start, l1, l7, r in zip(start_dates, lag_1, lag_7, rolling_avg_7)
+    ])
+
+# Forecast and score every origin of a chunk of pairs
+# returns (pair metrics DataFrame, (per-horizon absolute, squared and signed error sums, per-horizon
+#          counts, total actual sales)) so the runner can combine chunks into aggregate metrics
+def backtest_chunk(states, actuals, horizon, mode='recursive'):
+    states = states.reset_index(drop=True)
+    forecasts = np.empty((len(states), horizon))
+    for _, origin_states in states.groupby('OriginDate'):
+        forecasts[origin_states.index] = _forecast_origin(origin_states, horizon, mode)
+
+    # Line up the recorded sales with the forecast days of each origin
+    states = states.assign(Series=np.arange(len(states)))
+    scored = states[['StoreID', 'ItemID', 'OriginDate', 'Series']].merge(actuals, on=['StoreID', 'ItemID'])
+    scored['Horizon'] = (scored['SalesDate'] - scored['OriginDate']).dt.days
+    scored = scored[(scored['Horizon'] >= 1) & (scored['Horizon'] <= horizon)]
+
+    scored['Forecast'] = forecasts[scored['Series'].to_numpy(), scored['Horizon'].to_numpy() - 1]
+    scored['Error'] = scored['Forecast'] - scored[TARGET_COLUMN]
+    scored['AbsError'] = scored['Error'].abs()
+    scored['SquaredError'] = scored['Error'] ** 2
+
+    grouped = scored.groupby(['StoreID', 'ItemID'])
+    metrics = grouped.agg(
+        Origins=('Series', 'nunique'),
+        DaysScored=('Error', 'size'),
+        ActualTotal=(TARGET_COLUMN, 'sum'),
+        ForecastTotal=('Forecast', 'sum'),
+        MAE=('AbsError', 'mean'),
+        RMSE=('SquaredError', 'mean'),
+        Bias=('Error', 'mean'),
+        AbsErrorTotal=('AbsError', 'sum'),
+    ).reset_index()
+    metrics['RMSE'] = np.sqrt(metrics['RMSE'])
+    metrics['WAPE'] = metrics['AbsErrorTotal'] / metrics['ActualTotal']
+
+    horizon_index = scored['Horizon'].to_numpy() - 1
+    abs_error_sums = np.bincount(horizon_index, weights=scored['AbsError'].to_numpy(), minlength=horizon)
+    squared_error_sums = np.bincount(horizon_index, weights=scored['SquaredError'].to_numpy(), minlength=horizon)
+    error_sums = np.bincount(horizon_index, weights=scored['Error'].to_numpy(), minlength=horizon)
+    counts = np.bincount(horizon_index, minlength=horizon)
+    actual_sum = scored[TARGET_COLUMN].sum()
+    return metrics[PAIR_METRIC_COLUMNS], (abs_error_sums, squared_error_sums, error_sums, counts, actual_sum)
+
+
+# ==================================================================================
+# Runner
+
+# Aggregate metric as a JSON value: NaN and infinity (no days scored, no actual sales) become null
+def _json_number(value):
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+# Run the rolling-origin backtest
+# horizon is the number of days forecast from each origin, origin_step the days between origins
+# pairs limits the scored pairs to a list of (StoreID, ItemID), the models are fitted on every pair
+# chunk_pairs is the number of pairs per task
+# Writes pair_metrics.csv (appended as chunks finish) and aggregate.json to output_path
+# returns (pair metrics DataFrame, aggregate dictionary)
+def run_backtest(final_path='../../Data/final/', output_path='../../artifacts/backtest/', horizon=14,
+                 origin_step=7, mode='recursive', pairs=None, chunk_pairs=250, max_workers=None):
+    start = time.perf_counter()
+    os.makedirs(output_path, exist_ok=True)
+    pair_metrics_path = os.path.join(output_path, 'pair_metrics.csv')
+
+    training_data = load_sales_training_data(final_path)
+    history = add_origin_lags(training_data)
+    if pairs is not None:
+        history = history.merge(pd.DataFrame(list(pairs), columns=['StoreID', 'ItemID']), on=['StoreID', 'ItemID'])
+
+    origin_dates = build_origin_dates(history, origin_step)
+    states = build_origin_states(history, origin_dates)
+    models = fit_origin_models(training_data, states['OriginDate'].unique(), horizon, mode)
+    print(f"Fitted {len(models)} origin models ({time.perf_counter() - start:.1f}s)")
+    actuals = history[['StoreID', 'ItemID', 'SalesDate', TARGET_COLUMN]]
+
+    # Chunks of whole pairs, each with its own slice of the history
+    pair_keys = states[['StoreID', 'ItemID']].drop_duplicates().reset_index(drop=True)
+    chunk_ids = pd.Series(np.arange(len(pair_keys)) // chunk_pairs, name='Chunk')
+    pair_chunks = pd.concat([pair_keys, chunk_ids], axis=1)
+    states = states.merge(pair_chunks, on=['StoreID', 'ItemID'])
+    actuals = actuals.merge(pair_chunks, on=['StoreID', 'ItemID'])
+    chunk_states = dict(tuple(states.groupby('Chunk')))
+    chunk_actuals = dict(tuple(actuals.groupby('Chunk')))
+
+    print(f"Backtesting {len(pair_keys)} pairs x {len(origin_dates)} origins "
+          f"({len(states)} forecasts of {horizon} days) in {len(chunk_states)} chunks")
+
+    abs_error_sums = np.zeros(horizon)
+    squared_error_sums = np.zeros(horizon)
+    error_sums = np.zeros(horizon)
+    counts = np.zeros(horizon, dtype=np.int64)
+    actual_total = 0
+    all_metrics = []
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(models,)) as executor:
+        futures = [
+            executor.submit(backtest_chunk, chunk_states[chunk].drop(columns='Chunk'),
+                            chunk_actuals[chunk].drop(columns='Chunk'), horizon, mode)
+            for chunk in chunk_states
+        ]
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            metrics, (chunk_abs, chunk_squared, chunk_errors, chunk_counts, chunk_actual) = future.result()
+            metrics.to_csv(pair_metrics_path, mode='w' if done == 1 else 'a', header=(done == 1), index=False)
+            all_metrics.append(metrics)
+
+            abs_error_sums += chunk_abs
+            squared_error_sums += chunk_squared
+            error_sums += chunk_errors
+            counts += chunk_counts
+            actual_total += chunk_actual
+            print(f"Chunk {done}/{len(futures)} done ({time.perf_counter() - start:.1f}s)")
+
+    pair_metrics = pd.concat(all_metrics, ignore_index=True) if all_metrics else pd.DataFrame(columns=PAIR_METRIC_COLUMNS)
+    total_count = counts.sum()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        aggregate = {
+            'mode': mode,
+            'horizon': horizon,
+            'origin_step': origin_step,
+            'pairs': int(len(pair_metrics)),
+            'forecasts': int(len(states)),
+            'days_scored': int(total_count),
+            'MAE': _json_number(abs_error_sums.sum() / total_count),
+            'RMSE': _json_number(np.sqrt(squared_error_sums.sum() / total_count)),
+            'Bias': _json_number(error_sums.sum() / total_count),
+            'WAPE': _json_number(np.float64(abs_error_sums.sum()) / actual_total),
+            'MAE_by_horizon': [_json_number(v) for v in abs_error_sums / counts],
+            'days_scored_by_horizon': counts.tolist(),
+            'seconds': round(time.perf_counter() - start, 3),
+        }
+
+    with open(os.path.join(output_path, 'aggregate.json'), 'w') as f:
+        json.dump(aggregate, f, indent=2, allow_nan=False)
+
+    print(f"Backtest MAE {aggregate['MAE']}, RMSE {aggregate['RMSE']}, WAPE {aggregate['WAPE']} "
+          f"in {aggregate['seconds']}s")
+    return pair_metrics, aggregate
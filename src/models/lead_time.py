@@ -1 +1,50 @@
-#
\ No newline at end of file
+# ==================================================================================
+# Lead time model
+# Training code from Notebooks/Models/lead_time_model_RF.ipynb
+
+import os
+import pickle
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import train_test_split, GridSearchCV
+from ..DataPrep.schema import read_table
+
+# Features the lead time model is trained on (and that the WebApp builds for each order)
+FEATURE_COLUMNS = ['ItemID', 'StoreID', 'Quantity', 'Week', 'Month', 'Day']
+TARGET_COLUMN = 'LeadTimeDays'
+
+# Hyper parameter grid searched by the notebook
+HYPER_PARAMS = {
+    'max_features': ['sqrt'],
+    'max_depth': [16, 17],
+    'min_samples_split': [2, 5],
+    'min_samples_leaf': [6, 10],
+    'n_estimators': [265, 270]
+}
+
+
+# ==================================================================================
+# Train the RandomForest lead time model with a grid search and save it to every path in model_paths
+# returns the fitted GridSearchCV (its predict uses the best estimator)
+def train_lead_time_model(final_path='../../Data/final/', model_paths=('../../artifacts/models/leadtime_model.pkl',
+                                                                     '../../WebApp/models/leadtime_model.pkl')):
+    df = read_table(os.path.join(final_path, 'lead_time_data.csv'), 'lead_time_data')
+
+    y = df[TARGET_COLUMN]
+    x = df[FEATURE_COLUMNS]
+    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.2, random_state=7)
+
+    model = GridSearchCV(
+        estimator=RandomForestRegressor(random_state=7),
+        param_grid=HYPER_PARAMS,
+        cv=5,
+        scoring='neg_mean_absolute_error',
+        n_jobs=-1
+    )
+    model.fit(x_train, y_train)
+
+    for model_path in model_paths:
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        with open(model_path, 'wb') as f:
+            pickle.dump(model, f)
+
+    return model
@@ -0,0 +1,103 @@
+# ==================================================================================
+# Empirical lead time lookup tables
+# Precomputes lead time quantiles from the historical purchases (lead_time_data.csv) per
+# (StoreID, ItemID) pair, per ItemID and overall. A lookup falls back from the pair to the item
+# to the overall table when a level has fewer than min_samples orders, so every lookup is a
+# dictionary hit plus an interpolation in one row of a float32 array: no model inference.
+
+import numpy as np
+from ..DataPrep.schema import read_table
+
+# Quantile levels stored for every key (every 5%)
+QUANTILE_LEVELS = np.linspace(0, 1, 21)
+
+
+# ==================================================================================
+class LeadTimeTable:
+    def __init__(self, levels, pair_keys, pair_quantiles, item_keys, item_quantiles, global_quantiles):
+        self.levels = np.asarray(levels, dtype=np.float32)
+        self.pair_keys = np.asarray(pair_keys, dtype=np.int64)
+        self.pair_quantiles = np.asarray(pair_quantiles, dtype=np.float32)
+        self.item_keys = np.asarray(item_keys, dtype=np.int64)
+        self.item_quantiles = np.asarray(item_quantiles, dtype=np.float32)
+        self.global_quantiles = np.asarray(global_quantiles, dtype=np.float32)
+
+        # Key -> row index, built once so lookups are O(1)
+        self._pair_rows = {key: row for row, key in enumerate(self.pair_keys.tolist())}
+        self._item_rows = {key: row for row, key in enumerate(self.item_keys.tolist())}
+
+    # Pack a store-item pair into one int64 key
+    @staticmethod
+    def pair_key(store_id, item_id):
+        return (int(store_id) << 32) | int(item_id)
+
+    # Quantile row for a store-item pair, falling back to the item and then to all orders
+    # returns (row, level) where level is 'pair', 'item' or 'global'
+    def quantile_row(self, store_id, item_id):
+        row = self._pair_rows.get(self.pair_key(store_id, item_id))
+        if row is not None:
+            return self.pair_quantiles[row], 'pair'
+        row = self._item_rows.get(int(item_id))
+        if row is not None:
+            return self.item_quantiles[row], 'item'
+        return self.global_quantiles, 'global'
+
+    # Lead time in days at quantile q (0-1) for a store-item pair
+    def lookup(self, store_id, item_id, q=0.5):
+        row, _ = self.quantile_row(store_id, item_id)
+        return int(round(float(np.interp(q, self.levels, row))))
+
+    # Save the tables to a compressed .npz file
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            levels=self.levels,
+            pair_keys=self.pair_keys,
+            pair_quantiles=self.pair_quantiles,
+            item_keys=self.item_keys,
+            item_quantiles=self.item_quantiles,
+            global_quantiles=self.global_quantiles
+        )
+
+    # Load tables saved with save()
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data['levels'], data['pair_keys'], data['pair_quantiles'],
+                data['item_keys'], data['item_quantiles'], data['global_quantiles']
+            )
+
+
+# ==================================================================================
+# Quantiles of LeadTimeDays per group, only for groups with at least min_samples orders
+# returns (group keys, quantile array with one row per group)
+def _group_quantiles(df, by, levels, min_samples):
+    counts = df.groupby(by)['LeadTimeDays'].size()
+    keep = counts[counts >= min_samples].index
+    if len(keep) == 0:
+        return keep, np.empty((0, len(levels)), dtype=np.float32)
+
+    grouped = df.set_index(by).loc[keep].groupby(level=by)['LeadTimeDays']
+    quantiles = grouped.quantile(list(levels)).unstack()
+    return quantiles.index, quantiles.to_numpy(dtype=np.float32)
+
+# Build the lookup tables from lead time data (create_lead_time_data output)
+def build_lead_time_table(lead_time_df, levels=QUANTILE_LEVELS, min_samples=5):
+    df = lead_time_df[['StoreID', 'ItemID', 'LeadTimeDays']].dropna()
+
+    pair_index, pair_quantiles = _group_quantiles(df, ['StoreID', 'ItemID'], levels, min_samples)
+    item_index, item_quantiles = _group_quantiles(df, ['ItemID'], levels, min_samples)
+    global_quantiles = np.quantile(df['LeadTimeDays'].to_numpy(), levels)
+
+    pair_keys = np.array([LeadTimeTable.pair_key(store_id, item_id) for store_id, item_id in pair_index], dtype=np.int64)
+    item_keys = np.asarray(item_index, dtype=np.int64)
+    return LeadTimeTable(levels, pair_keys, pair_quantiles, item_keys, item_quantiles, global_quantiles)
+
+# Build the tables from a lead_time_data.csv file and save them
+def create_lead_time_table(lead_time_path='../../Data/Prepped/lead_time_data.csv',
+                           table_path='../../WebApp/models/leadtime_table.npz'):
+    lead_time_df = read_table(lead_time_path, 'lead_time_data', usecols=['StoreID', 'ItemID', 'LeadTimeDays'])
+    table = build_lead_time_table(lead_time_df)
+    table.save(table_path)
+    return table
@@ -1 +1,367 @@
-#
\ No newline at end of file
+# ==================================================================================
+# Sales forecast models
+# Training code from Notebooks/Models/sales_forecast_model.ipynb (recursive model) and a
+# direct multi-horizon model, plus the forecasting kernels the WebApp uses for both.
+#   Recursive: each day is predicted from the previous predictions (Lag_1, Lag_7, RollingAvg_7),
+#              so the days of a forecast run one after the other.
+#   Direct:    each day is predicted from the lags known at the forecast origin plus the horizon
+#              and the calendar features of the day, so a forecast is one batched predict call.
+# xgboost and sklearn are imported inside the training functions so the WebApp can use the
+# kernels without loading them.
+
+import math
+import os
+import pickle
+import time
+import numpy as np
+import pandas as pd
+from ..DataPrep.schema import read_table
+
+# Features the sales model is trained on (and that the WebApp builds for each forecast day)
+FEATURE_COLUMNS = ['Lag_1', 'Lag_7', 'RollingAvg_7', 'Month', 'DayOfWeek', 'DayOfMonth', 'IsWeekend']
+TARGET_COLUMN = 'SalesQuantity'
+
+# Features of the direct model: lags at the origin, days since the origin and the target day's calendar
+DIRECT_FEATURE_COLUMNS = ['Origin_Lag_1', 'Origin_Lag_7', 'Origin_RollingAvg_7', 'Horizon',
+                          'Month', 'DayOfWeek', 'DayOfMonth', 'IsWeekend']
+
+# Sales assumed for the days before the forecast when there is no history
+INITIAL_SALES = 10
+
+# Days the WebApp forecasts (Jan 1 - Jul 31, 2025)
+FORECAST_HORIZON_DAYS = 212
+
+# Share of the training rows, the last ones in StoreID, ItemID, SalesDate order, that the XGBoost
+# models are not fitted on (they only pick the early stopping round)
+EARLY_STOPPING_FRACTION = 0.2
+
+
+# ==================================================================================
+# Load the final sales forecast data and add the seasonal features used by the model
+def load_sales_training_data(final_path='../../Data/final/'):
+    df = read_table(os.path.join(final_path, 'sales_forecast_data.csv'), 'sales_forecast_data')
+    df = df.sort_values(by=['StoreID', 'ItemID', 'SalesDate'])
+
+    # Season feature engineering to increase the accuracy of the model
+    df['DayOfWeek'] = df['SalesDate'].dt.dayofweek
+    df['DayOfMonth'] = df['SalesDate'].dt.day
+    df['IsWeekend'] = (df['DayOfWeek'] >= 5).astype(int)
+    return df
+
+# Calendar features for a range of forecast dates
+def build_calendar_features(dates):
+    dates = pd.DatetimeIndex(dates)
+    return pd.DataFrame({
+        'Month': dates.month,
+        'DayOfWeek': dates.dayofweek,
+        'DayOfMonth': dates.day,
+        'IsWeekend': (dates.dayofweek >= 5).astype(int)
+    })
+
+# Lags known at each row when the row is used as a forecast origin (its own sales are known)
+def add_origin_lags(df):
+    df = df.copy()
+    sales = df.groupby(['StoreID', 'ItemID'])[TARGET_COLUMN]
+    df['Origin_Lag_1'] = df[TARGET_COLUMN].astype('float32')
+    df['Origin_Lag_7'] = sales.shift(6).fillna(0).astype('float32')
+    df['Origin_RollingAvg_7'] = df['RollingAvg_7']
+    return df
+
+# Pair every row (the origin) with each later row of the same store-item pair (the target)
+# max_horizon limits how many days after the origin a target may be
+def build_direct_training_data(df, max_horizon=None):
+    df = add_origin_lags(df).reset_index(drop=True)
+    df['Row'] = np.arange(len(df))
+
+    origins = df[['StoreID', 'ItemID', 'Row', 'SalesDate', 'Origin_Lag_1', 'Origin_Lag_7', 'Origin_RollingAvg_7']]
+    targets = df[['StoreID', 'ItemID', 'Row', 'SalesDate', 'Month', 'DayOfWeek', 'DayOfMonth', 'IsWeekend', TARGET_COLUMN]]
+    pairs = origins.merge(targets, on=['StoreID', 'ItemID'], suffixes=('_Origin', ''))
+    pairs = pairs[pairs['Row'] > pairs['Row_Origin']].copy()
+
+    # Rows on the same day as the origin are not in the future
+    pairs['Horizon'] = (pairs['SalesDate'] - pairs['SalesDate_Origin']).dt.days
+    pairs = pairs[pairs['Horizon'] > 0]
+    if max_horizon is not None:
+        pairs = pairs[pairs['Horizon'] <= max_horizon]
+    return pairs.sort_values(by=['StoreID', 'ItemID', 'Row_Origin', 'Row']).reset_index(drop=True)
+
+
+# ==================================================================================
+# Forecasting Kernels
+
+# Recursive forecast: each prediction becomes Lag_1 of the next day, Lag_7 seven days later and
+# part of the 7-day rolling average. The lags before the first day default to INITIAL_SALES.
+# returns an array of predicted sales (at least 1 per day)
+def recursive_forecast(model, dates, lag_1=INITIAL_SALES, lag_7=INITIAL_SALES, rolling_avg_7=INITIAL_SALES):
+    calendar = build_calendar_features(dates)
+    predictions = []
+
+    for i in range(len(calendar)):
+
+        # Produce lag features, use the origin lags if out of bounds
+        day_lag_1 = predictions[i-1] if i > 0 else lag_1
+        day_lag_7 = predictions[i-7] if i >= 7 else lag_7
+
+        # Calculate rolling average for the last 7 days
+        if i >= 7:
+            day_rolling_avg_7 = sum(predictions[i-7:i]) / 7
+        elif i > 0:
+            day_rolling_avg_7 = sum(predictions[:i]) / i
+        else:
+            day_rolling_avg_7 = rolling_avg_7
+
+        # Populate engineered features
+        row = calendar.iloc[i]
+        X_row = pd.DataFrame([{
+            'Lag_1': day_lag_1,
+            'Lag_7': day_lag_7,
+            'RollingAvg_7': day_rolling_avg_7,
+            'Month': row['Month'],
+            'DayOfWeek': row['DayOfWeek'],
+            'DayOfMonth': row['DayOfMonth'],
+            'IsWeekend': row['IsWeekend']
+        }])
+
+        pred = model.predict(X_row)[0]
+        predictions.append(max(1, int(round(pred))))
+
+    return np.array(predictions)
+
+# Recursive forecast for many series at once (e.g. every pair and origin of a backtest)
+# Uses the same lag logic as recursive_forecast, but each day is one predict call for all series.
+# start_dates and the lag arrays hold one value per series
+# returns a series x horizon array of predicted sales (at least 1 per day)
+def recursive_forecast_batch(model, start_dates, lag_1, lag_7, rolling_avg_7, horizon):
+    start_dates = pd.DatetimeIndex(start_dates)
+    predictions = np.zeros((len(start_dates), horizon))
+
+    for i in range(horizon):
+        calendar = build_calendar_features(start_dates + pd.Timedelta(days=i))
+        X = pd.DataFrame({
+            'Lag_1': predictions[:, i-1] if i > 0 else lag_1,
+            'Lag_7': predictions[:, i-7] if i >= 7 else lag_7,
+            'RollingAvg_7': (predictions[:, max(0, i-7):i].sum(axis=1) / min(i, 7)) if i > 0 else rolling_avg_7,
+            'Month': calendar['Month'],
+            'DayOfWeek': calendar['DayOfWeek'],
+            'DayOfMonth': calendar['DayOfMonth'],
+            'IsWeekend': calendar['IsWeekend']
+        })
+        predictions[:, i] = np.maximum(1, np.rint(model.predict(X[FEATURE_COLUMNS])))
+
+    return predictions.astype(int)
+
+# Direct forecast: every day is predicted in one call from the origin lags and its horizon
+# The origin is the day before the first date
+# returns an array of predicted sales (at least 1 per day)
+def direct_forecast(model, dates, lag_1=INITIAL_SALES, lag_7=INITIAL_SALES, rolling_avg_7=INITIAL_SALES):
+    X = build_calendar_features(dates)
+    X['Origin_Lag_1'] = lag_1
+    X['Origin_Lag_7'] = lag_7
+    X['Origin_RollingAvg_7'] = rolling_avg_7
+    X['Horizon'] = np.arange(1, len(X) + 1)
+
+    predictions = model.predict(X[DIRECT_FEATURE_COLUMNS])
+    return np.maximum(1, np.rint(predictions)).astype(int)
+
+FORECAST_KERNELS = {
+    'recursive': recursive_forecast,
+    'direct': direct_forecast,
+}
+
+
+# ==================================================================================
+# Tree Subsets
+
+# Bagged forests (RandomForest, ExtraTrees) average independent trees, so each of their estimators_
+# is a full prediction on its own. Boosted models (GradientBoosting) also have estimators_, but
+# each stage only fits the residuals of the stages before it.
+def is_bagged_forest(model):
+    if not hasattr(model, 'estimators_'):
+        return False
+    from sklearn.ensemble import RandomForestRegressor, ExtraTreesRegressor
+    return isinstance(model, (RandomForestRegressor, ExtraTreesRegressor))
+
+# Number of trees the model's own predict uses
+# XGBoost: the boosting rounds up to the early stopping best iteration, forests: every estimator
+def count_trees(model):
+    if hasattr(model, 'get_booster'):
+        try:
+            return model.best_iteration + 1
+        except AttributeError:
+            return model.get_booster().num_boosted_rounds()
+    if is_bagged_forest(model):
+        return len(model.estimators_)
+    return None
+
+# Model that predicts with the first n_trees trees of an ensemble, for a quick approximate forecast
+# XGBoost sums the first n_trees boosting rounds (iteration_range) on the booster directly, which also
+# skips the sklearn wrapper's checks on every call. Forests (RandomForest, ExtraTrees) average their
+# first n_trees estimators. Can be passed to the forecast kernels in place of the model.
+class TreeSubsetModel:
+    def __init__(self, model, n_trees):
+        total = count_trees(model)
+        if total is None:
+            raise ValueError(f"{type(model).__name__} is not a tree ensemble")
+        self.model = model
+        self.n_trees = max(1, min(int(n_trees), total))
+        self.total_trees = total
+        if hasattr(model, 'get_booster'):
+            self._booster = model.get_booster()
+            self._columns = self._booster.feature_names
+        else:
+            self._booster = None
+            self._columns = list(getattr(model, 'feature_names_in_', [])) or None
+
+    def predict(self, X):
+        values = (X[self._columns] if self._columns else X).to_numpy(dtype=float)
+        if self._booster is not None:
+            return self._booster.inplace_predict(values, iteration_range=(0, self.n_trees))
+        return np.mean([tree.predict(values) for tree in self.model.estimators_[:self.n_trees]], axis=0)
+
+
+# ==================================================================================
+# Training
+
+# Rows of the training data (load_sales_training_data order) that the sales model was not fitted on
+def early_stopping_rows(df):
+    return df.iloc[len(df) - math.ceil(len(df) * EARLY_STOPPING_FRACTION):]
+
+def _fit_xgb(X, y):
+    import xgboost as xgb
+    from sklearn.model_selection import train_test_split
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=EARLY_STOPPING_FRACTION, random_state=42, shuffle=False)
+
+    model = xgb.XGBRegressor(
+        objective='reg:squarederror',
+        n_estimators=100,
+        max_depth=6,
+        learning_rate=0.1,
+        random_state=42,
+        eval_metric='rmse',
+        early_stopping_rounds=10
+    )
+    model.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=False)
+    return model
+
+# Drop the rows of the given (StoreID, ItemID) pairs, so they are in neither the training nor the
+# early stopping split
+def _drop_pairs(df, exclude_pairs):
+    if not exclude_pairs:
+        return df
+    excluded = pd.MultiIndex.from_tuples(list(exclude_pairs), names=['StoreID', 'ItemID'])
+    return df[~pd.MultiIndex.from_frame(df[['StoreID', 'ItemID']]).isin(excluded)]
+
+def _save_model(model, model_paths):
+    for model_path in model_paths:
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        with open(model_path, 'wb') as f:
+            pickle.dump(model, f)
+
+# Fit the sales model of a forecast mode on training data (load_sales_training_data rows) without saving it
+# max_horizon limits the direct model's horizons
+def fit_sales_model(df, mode='recursive', max_horizon=None):
+    if mode == 'direct':
+        pairs = build_direct_training_data(df, max_horizon)
+        return _fit_xgb(pairs[DIRECT_FEATURE_COLUMNS], pairs[TARGET_COLUMN])
+    return _fit_xgb(df[FEATURE_COLUMNS], df[TARGET_COLUMN])
+
+# Train the XGBoost sales model and save it to every path in model_paths
+# exclude_pairs leaves (StoreID, ItemID) pairs out of the training data, e.g. for a benchmark
+# returns the trained model
+def train_sales_model(final_path='../../Data/final/', model_paths=('../../artifacts/models/sales_model.pkl',
+                                                                 '../../WebApp/models/sales_model.pkl'),
+                      exclude_pairs=None):
+    df = _drop_pairs(load_sales_training_data(final_path), exclude_pairs)
+    model = fit_sales_model(df)
+    _save_model(model, model_paths)
+    return model
+
+# Train the direct multi-horizon XGBoost sales model and save it to every path in model_paths
+# The data only spans Jan-Feb 2016, so horizons beyond ~60 days reuse what was learnt for the longest ones
+# exclude_pairs leaves (StoreID, ItemID) pairs out of the training data, e.g. for a benchmark
+# returns the trained model
+def train_sales_direct_model(final_path='../../Data/final/', model_paths=('../../artifacts/models/sales_direct_model.pkl',
+                                                                        '../../WebApp/models/sales_direct_model.pkl'),
+                             max_horizon=None, exclude_pairs=None):
+    df = _drop_pairs(load_sales_training_data(final_path), exclude_pairs)
+    model = fit_sales_model(df, 'direct', max_horizon)
+    _save_model(model, model_paths)
+    return model
+
+
+# ==================================================================================
+# Benchmark
+
+# Compare the recursive and direct models on store-item pairs that neither model has seen
+# The last 20% of the pairs (in StoreID, ItemID order) are held out: both models are trained here
+# without them, so the held-out pairs are also not in the 20% row split _fit_xgb uses for early stopping.
+# For each pair the origin is the last sale before cutoff (by default a week after the first date, so
+# the origin lags are real), both models forecast horizon days as the WebApp does (Jan 1 - Jul 31) and
+# are scored on the days that have sales. The 2016 data only covers the first ~2 months of the
+# horizon, so the rest of it is described by the forecasts themselves:
+#   LateMean   mean forecast over the days after the last recorded sale
+#   FlatShare  share of the horizon's days with the same forecast as the day before
+# returns a DataFrame with the accuracy, the horizon statistics and the forecast latency of each mode
+def benchmark_forecast_modes(final_path='../../Data/final/', cutoff=None, horizon=FORECAST_HORIZON_DAYS,
+                             n_pairs=200, seed=42):
+    df = add_origin_lags(load_sales_training_data(final_path))
+
+    pairs = df[['StoreID', 'ItemID']].drop_duplicates()
+    holdout_pairs = pairs.iloc[int(len(pairs) * 0.8):]
+    holdout_keys = list(holdout_pairs.itertuples(index=False, name=None))
+    models = {
+        'recursive': train_sales_model(final_path, model_paths=(), exclude_pairs=holdout_keys),
+        'direct': train_sales_direct_model(final_path, model_paths=(), exclude_pairs=holdout_keys),
+    }
+    df = df.merge(holdout_pairs, on=['StoreID', 'ItemID'])
+
+    start_date, end_date = df['SalesDate'].min(), df['SalesDate'].max()
+    cutoff = pd.Timestamp(cutoff) if cutoff is not None else start_date + pd.Timedelta(days=7)
+    history = df[df['SalesDate'] < cutoff].groupby(['StoreID', 'ItemID']).tail(1).set_index(['StoreID', 'ItemID'])
+    actuals = df[df['SalesDate'] >= cutoff].set_index(['StoreID', 'ItemID'])
+
+    # Pairs that have both an origin and sales to score against
+    scorable = set(history.index) & set(actuals.index)
+    holdout = [pair for pair in holdout_keys if pair in scorable]
+    rng = np.random.default_rng(seed)
+    if len(holdout) > n_pairs:
+        holdout = [holdout[i] for i in sorted(rng.choice(len(holdout), n_pairs, replace=False))]
+
+    errors = {mode: [] for mode in models}
+    late_forecasts = {mode: [] for mode in models}
+    flat_days = {mode: [] for mode in models}
+    seconds = {mode: [] for mode in models}
+
+    for pair in holdout:
+        origin = history.loc[pair]
+        dates = pd.date_range(origin['SalesDate'] + pd.Timedelta(days=1), periods=horizon)
+        pair_actuals = actuals.loc[[pair]]
+        pair_actuals = pair_actuals[pair_actuals['SalesDate'] <= dates[-1]]
+        day_index = (pair_actuals['SalesDate'] - dates[0]).dt.days.to_numpy()
+
+        for mode, model in models.items():
+            start = time.perf_counter()
+            forecast = FORECAST_KERNELS[mode](
+                model, dates, origin['Origin_Lag_1'], origin['Origin_Lag_7'], origin['Origin_RollingAvg_7']
+            )
+            seconds[mode].append(time.perf_counter() - start)
+            errors[mode].append(forecast[day_index] - pair_actuals[TARGET_COLUMN].to_numpy())
+            late_forecasts[mode].append(forecast[dates > end_date])
+            flat_days[mode].append(np.mean(forecast[1:] == forecast[:-1]))
+
+    rows = []
+    for mode in models:
+        mode_errors = np.concatenate(errors[mode])
+        rows.append({
+            'Mode': mode,
+            'Pairs': len(holdout),
+            'DaysScored': len(mode_errors),
+            'MAE': np.abs(mode_errors).mean(),
+            'RMSE': np.sqrt((mode_errors ** 2).mean()),
+            'LateMean': np.concatenate(late_forecasts[mode]).mean(),
+            'FlatShare': np.mean(flat_days[mode]),
+            'MeanLatencyMs': 1000 * np.mean(seconds[mode]),
+            'P95LatencyMs': 1000 * np.percentile(seconds[mode], 95),
+        })
+    return pd.DataFrame(rows)
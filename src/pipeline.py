@@ -0,0 +1,348 @@
+# ==================================================================================
+# Pipeline runner for Raw -> Processed -> Prepped -> final -> models
+# (see Documentation/Data Flow.txt)
+# Each stage declares its input files, output files and the source files of its code.
+# A stage is skipped when the hash of its inputs, code and parameters matches the hash recorded
+# the last time it ran and its outputs are unchanged. Stages whose upstream stages are done run
+# concurrently, so a change to feature engineering only reruns data_prep and what follows it.
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Manifest with the hash each stage last ran with, relative to the project root
+MANIFEST_FILE = os.path.join('Data', '.pipeline_manifest.json')
+
+
+# ==================================================================================
+# Stage Functions
+# Imports are done inside the stages so that only the libraries a stage needs are loaded
+
+def _run_data_load(root):
+    from .DataPrep.data_load import process_all_data
+    process_all_data(os.path.join(root, 'Data', 'Raw'), os.path.join(root, 'Data', 'Processed'), download=False)
+
+def _run_lead_time_data(root):
+    from .DataPrep.data_prep import create_lead_time_data
+    create_lead_time_data(os.path.join(root, 'Data', 'Processed'), os.path.join(root, 'Data', 'Prepped'))
+
+def _run_sales_forecast_data(root):
+    from .DataPrep.data_prep import create_sales_forecast_data
+    create_sales_forecast_data(os.path.join(root, 'Data', 'Processed'), os.path.join(root, 'Data', 'Prepped'))
+
+def _run_winsorize(root, table, filename, column):
+    from .DataPrep.winsorize import winsorize_partitions
+    os.makedirs(os.path.join(root, 'Data', 'final'), exist_ok=True)
+    winsorize_partitions(
+        [os.path.join(root, 'Data', 'Prepped', filename)], [os.path.join(root, 'Data', 'final', filename)],
+        table, column
+    )
+
+def _run_train_sales_model(root):
+    from .models.sales_forecast import train_sales_model
+    train_sales_model(
+        os.path.join(root, 'Data', 'final'),
+        [os.path.join(root, 'artifacts', 'models', 'sales_model.pkl'),
+         os.path.join(root, 'WebApp', 'models', 'sales_model.pkl')]
+    )
+
+def _run_train_sales_direct_model(root):
+    from .models.sales_forecast import train_sales_direct_model
+    train_sales_direct_model(
+        os.path.join(root, 'Data', 'final'),
+        [os.path.join(root, 'artifacts', 'models', 'sales_direct_model.pkl'),
+         os.path.join(root, 'WebApp', 'models', 'sales_direct_model.pkl')]
+    )
+
+def _run_backtest_sales_model(root):
+    from .models.backtest import run_backtest
+    run_backtest(os.path.join(root, 'Data', 'final'), os.path.join(root, 'artifacts', 'backtest'))
+
+def _run_train_lead_time_model(root):
+    from .models.lead_time import train_lead_time_model
+    train_lead_time_model(
+        os.path.join(root, 'Data', 'final'),
+        [os.path.join(root, 'artifacts', 'models', 'leadtime_model.pkl'),
+         os.path.join(root, 'WebApp', 'models', 'leadtime_model.pkl')]
+    )
+
+def _run_lead_time_table(root):
+    from .models.lead_time_table import create_lead_time_table
+    create_lead_time_table(
+        os.path.join(root, 'Data', 'Prepped', 'lead_time_data.csv'),
+        os.path.join(root, 'WebApp', 'models', 'leadtime_table.npz')
+    )
+
+
+# ==================================================================================
+# Stage Declarations
+# name, function, extra arguments, inputs, outputs and code (paths relative to the project root / src)
+
+PROCESSED_FILES = ['Inventory.csv', 'OpeningStock.csv', 'Purchases.csv', 'Sales.csv', 'Stores.csv']
+
+STAGES = [
+    {
+        'name': 'data_load',
+        'func': _run_data_load,
+        'args': (),
+        'inputs': [os.path.join('Data', 'Raw', f) for f in
+                   ['SalesFINAL12312016.csv', 'PurchasesFINAL12312016.csv', 'BegInvFINAL12312016.csv']],
+        'outputs': [os.path.join('Data', 'Processed', f) for f in PROCESSED_FILES + ['history_cube.npz']],
+        'code': ['DataPrep/data_load.py', 'DataPrep/history_cube.py', 'DataPrep/schema.py'],
+    },
+    {
+        'name': 'lead_time_data',
+        'func': _run_lead_time_data,
+        'args': (),
+        'inputs': [os.path.join('Data', 'Processed', f) for f in ['Purchases.csv', 'Inventory.csv', 'Stores.csv']],
+        'outputs': [os.path.join('Data', 'Prepped', 'lead_time_data.csv')],
+        'code': ['DataPrep/data_prep.py', 'DataPrep/schema.py'],
+    },
+    {
+        'name': 'sales_forecast_data',
+        'func': _run_sales_forecast_data,
+        'args': (),
+        'inputs': [os.path.join('Data', 'Processed', f) for f in ['Sales.csv', 'Inventory.csv', 'Stores.csv']],
+        'outputs': [os.path.join('Data', 'Prepped', 'sales_forecast_data.csv')],
+        'code': ['DataPrep/data_prep.py', 'DataPrep/schema.py'],
+    },
+    {
+        'name': 'winsorize_lead_time',
+        'func': _run_winsorize,
+        'args': ('lead_time_data', 'lead_time_data.csv', 'Quantity'),
+        'inputs': [os.path.join('Data', 'Prepped', 'lead_time_data.csv')],
+        'outputs': [os.path.join('Data', 'final', 'lead_time_data.csv')],
+        'code': ['DataPrep/winsorize.py', 'DataPrep/schema.py'],
+    },
+    {
+        'name': 'winsorize_sales',
+        'func': _run_winsorize,
+        'args': ('sales_forecast_data', 'sales_forecast_data.csv', 'SalesQuantity'),
+        'inputs': [os.path.join('Data', 'Prepped', 'sales_forecast_data.csv')],
+        'outputs': [os.path.join('Data', 'final', 'sales_forecast_data.csv')],
+        'code': ['DataPrep/winsorize.py', 'DataPrep/schema.py'],
+    },
+    {
+        'name': 'train_lead_time_model',
+        'func': _run_train_lead_time_model,
+        'args': (),
+        'inputs': [os.path.join('Data', 'final', 'lead_time_data.csv')],
+        'outputs': [os.path.join('artifacts', 'models', 'leadtime_model.pkl'),
+                    os.path.join('WebApp', 'models', 'leadtime_model.pkl')],
+        'code': ['models/lead_time.py', 'DataPrep/schema.py'],
+    },
+    {
+        # Built from the prepped data: the lead times themselves are not winsorized
+        'name': 'lead_time_table',
+        'func': _run_lead_time_table,
+        'args': (),
+        'inputs': [os.path.join('Data', 'Prepped', 'lead_time_data.csv')],
+        'outputs': [os.path.join('WebApp', 'models', 'leadtime_table.npz')],
+        'code': ['models/lead_time_table.py', 'DataPrep/schema.py'],
+    },
+    {
+        'name': 'train_sales_model',
+        'func': _run_train_sales_model,
+        'args': (),
+        'inputs': [os.path.join('Data', 'final', 'sales_forecast_data.csv')],
+        'outputs': [os.path.join('artifacts', 'models', 'sales_model.pkl'),
+                    os.path.join('WebApp', 'models', 'sales_model.pkl')],
+        'code': ['models/sales_forecast.py', 'DataPrep/schema.py'],
+    },
+    {
+        'name': 'train_sales_direct_model',
+        'func': _run_train_sales_direct_model,
+        'args': (),
+        'inputs': [os.path.join('Data', 'final', 'sales_forecast_data.csv')],
+        'outputs': [os.path.join('artifacts', 'models', 'sales_direct_model.pkl'),
+                    os.path.join('WebApp', 'models', 'sales_direct_model.pkl')],
+        'code': ['models/sales_forecast.py', 'DataPrep/schema.py'],
+    },
+    {
+        'name': 'backtest_sales_model',
+        'func': _run_backtest_sales_model,
+        'args': (),
+        'inputs': [os.path.join('Data', 'final', 'sales_forecast_data.csv')],
+        'outputs': [os.path.join('artifacts', 'backtest', 'pair_metrics.csv'),
+                    os.path.join('artifacts', 'backtest', 'aggregate.json')],
+        'code': ['models/backtest.py', 'models/sales_forecast.py', 'DataPrep/schema.py'],
+    },
+]
+
+
+# ==================================================================================
+# Hashing
+
+# sha256 of a file's contents, read in blocks so large files are not loaded into memory
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Hash of everything a stage depends on: its input files, its code files and its arguments
+def stage_hash(stage, root):
+    digest = hashlib.sha256()
+    digest.update(stage['name'].encode())
+    digest.update(repr(stage['args']).encode())
+    for path in stage['inputs']:
+        digest.update(path.encode())
+        digest.update(hash_file(os.path.join(root, path)).encode())
+    for path in stage['code']:
+        digest.update(path.encode())
+        digest.update(hash_file(os.path.join(SRC_DIR, path)).encode())
+    return digest.hexdigest()
+
+def load_manifest(root):
+    path = os.path.join(root, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(root, manifest):
+    path = os.path.join(root, MANIFEST_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+# ==================================================================================
+# Runner
+
+# Map each stage to the stages that produce its inputs
+def stage_dependencies(stages):
+    producers = {output: stage['name'] for stage in stages for output in stage['outputs']}
+    return {
+        stage['name']: {producers[path] for path in stage['inputs'] if path in producers}
+        for stage in stages
+    }
+
+# Decide whether a stage must run
+# returns (must_run, hash, reason)
+def check_stage(stage, root, manifest, force=False):
+    missing_inputs = [p for p in stage['inputs'] if not os.path.exists(os.path.join(root, p))]
+    outputs_exist = all(os.path.exists(os.path.join(root, p)) for p in stage['outputs'])
+
+    if missing_inputs:
+        if outputs_exist:
+            return False, None, f"inputs not available ({', '.join(missing_inputs)}), keeping existing outputs"
+        raise FileNotFoundError(f"Stage {stage['name']} is missing inputs: {missing_inputs}")
+
+    current_hash = stage_hash(stage, root)
+    if force:
+        return True, current_hash, 'forced'
+    if not outputs_exist:
+        return True, current_hash, 'outputs missing'
+
+    record = manifest.get(stage['name'])
+    if record is None:
+        return True, current_hash, 'never run'
+    if record['hash'] != current_hash:
+        return True, current_hash, 'inputs or code changed'
+    for path, output_hash in record['outputs'].items():
+        if hash_file(os.path.join(root, path)) != output_hash:
+            return True, current_hash, f'{path} changed since last run'
+    return False, current_hash, 'up to date'
+
+# Run one stage and return the manifest record for it
+def execute_stage(stage, root, current_hash):
+    start = time.perf_counter()
+    stage['func'](root, *stage['args'])
+    return {
+        'hash': current_hash,
+        'outputs': {path: hash_file(os.path.join(root, path)) for path in stage['outputs']},
+        'seconds': round(time.perf_counter() - start, 3),
+        'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+# Run the pipeline from the project root
+# targets limits the run to those stages and everything upstream of them
+# force reruns every selected stage, dry_run only reports what would run
+# returns {stage name: status}
+def run_pipeline(root='../..', targets=None, force=False, dry_run=False, max_workers=None, stages=STAGES):
+    dependencies = stage_dependencies(stages)
+    by_name = {stage['name']: stage for stage in stages}
+
+    # Select the targets and everything upstream of them
+    selected = set()
+    pending = list(targets or by_name)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(dependencies[name])
+
+    manifest = load_manifest(root)
+    status = {}
+    remaining = [name for name in by_name if name in selected]
+    # Dry run: stages that would run, their downstream stages would get new inputs and run too
+    would_run = set()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+
+        while remaining or running:
+            # Start every stage whose upstream stages have all finished
+            for name in list(remaining):
+                if any(dep in remaining or dep in running.values() for dep in dependencies[name] if dep in selected):
+                    continue
+                remaining.remove(name)
+
+                failed = [dep for dep in dependencies[name] if status.get(dep, '').startswith('failed')]
+                if failed:
+                    status[name] = f"skipped: upstream {failed} failed"
+                    print(f"[{name}] {status[name]}")
+                    continue
+
+                # Dry run below a stage that would run: not checked, its inputs would be rewritten first
+                # and may not exist yet
+                upstream = sorted(dependencies[name] & would_run)
+                if upstream:
+                    would_run.add(name)
+                    status[name] = f"would run: upstream {upstream} would run"
+                    print(f"[{name}] {status[name]}")
+                    continue
+
+                stage = by_name[name]
+                try:
+                    must_run, current_hash, reason = check_stage(stage, root, manifest, force)
+                except FileNotFoundError as e:
+                    status[name] = f"failed: {e}"
+                    print(f"[{name}] {status[name]}")
+                    continue
+                if not must_run or dry_run:
+                    if must_run:
+                        would_run.add(name)
+                    status[name] = f"{'would run' if must_run else 'skipped'}: {reason}"
+                    print(f"[{name}] {status[name]}")
+                    continue
+
+                print(f"[{name}] running: {reason}")
+                running[executor.submit(execute_stage, stage, root, current_hash)] = name
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    manifest[name] = future.result()
+                    save_manifest(root, manifest)
+                    status[name] = f"ran in {manifest[name]['seconds']}s"
+                except Exception as e:
+                    status[name] = f"failed: {e}"
+                print(f"[{name}] {status[name]}")
+
+    return status
+
+
+if __name__ == '__main__':
+    # Run from the project root: python -m src.pipeline
+    run_pipeline('.')
@@ -0,0 +1,40 @@
+# test_backtest.py
+# Rolling-origin backtest: models only see sales up to their origin, aggregate.json is valid JSON
+# Run from the project root: python -m pytest tests
+import os
+import sys
+import json
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models import backtest
+from src.models.backtest import fit_origin_models, run_backtest
+
+FINAL_PATH = os.path.join(os.path.dirname(__file__), '..', 'Data', 'final')
+
+
+# json.load calls this for NaN and Infinity, which are not valid JSON
+def reject_constant(constant):
+    raise AssertionError(f"aggregate.json contains {constant}")
+
+def test_origin_models_are_fitted_before_their_origin(monkeypatch):
+    # Each origin's "model" is the last date it was fitted on
+    monkeypatch.setattr(backtest, 'fit_sales_model', lambda df, mode, max_horizon: df['SalesDate'].max())
+    training_data = pd.DataFrame({'SalesDate': pd.date_range('2016-01-01', periods=30)})
+    origins = pd.to_datetime(['2016-01-08', '2016-01-15', '2016-01-22'])
+
+    fitted = fit_origin_models(training_data, origins, 14)
+    assert fitted == {origin: origin for origin in origins}
+
+def test_aggregate_has_no_nan(tmp_path):
+    # A horizon longer than the history leaves horizon days with nothing scored
+    _, aggregate = run_backtest(FINAL_PATH, str(tmp_path), horizon=70, origin_step=21,
+                                pairs=[(1, 1004), (1, 1010)], max_workers=1)
+
+    with open(tmp_path / 'aggregate.json') as f:
+        written = json.load(f, parse_constant=reject_constant)
+    assert written == aggregate
+    assert None in written['MAE_by_horizon']
+    assert all(value is None or value >= 0 for value in written['MAE_by_horizon'])
+    assert written['MAE'] is not None and written['days_scored'] > 0
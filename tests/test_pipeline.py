@@ -0,0 +1,59 @@
+# test_pipeline.py
+# Dry runs of the content-hashed pipeline on a copy of the project tree with placeholder files
+# Run from the project root: python -m pytest tests
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.pipeline import STAGES, run_pipeline, stage_hash, hash_file, save_manifest, load_manifest
+
+LEAD_TIME_STAGES = ['lead_time_data', 'winsorize_lead_time', 'train_lead_time_model', 'lead_time_table']
+
+
+# Tree where every stage's inputs and outputs exist and the manifest records every stage as up to date
+@pytest.fixture
+def root(tmp_path):
+    for path in {path for stage in STAGES for path in stage['inputs'] + stage['outputs']}:
+        os.makedirs(tmp_path / os.path.dirname(path), exist_ok=True)
+        (tmp_path / path).write_text(path)
+    save_manifest(tmp_path, {
+        stage['name']: {
+            'hash': stage_hash(stage, tmp_path),
+            'outputs': {path: hash_file(tmp_path / path) for path in stage['outputs']},
+        }
+        for stage in STAGES
+    })
+    return tmp_path
+
+def test_up_to_date_tree(root):
+    status = run_pipeline(root, dry_run=True)
+    assert status == {stage['name']: 'skipped: up to date' for stage in STAGES}
+
+def test_missing_intermediate_file(root):
+    os.remove(root / 'Data' / 'Prepped' / 'lead_time_data.csv')
+    manifest = load_manifest(root)
+    status = run_pipeline(root, dry_run=True)
+
+    # Every stage that reads the missing file, directly or through another stage, would run
+    assert status['lead_time_data'] == 'would run: outputs missing'
+    assert status['winsorize_lead_time'] == "would run: upstream ['lead_time_data'] would run"
+    assert status['lead_time_table'] == "would run: upstream ['lead_time_data'] would run"
+    assert status['train_lead_time_model'] == "would run: upstream ['winsorize_lead_time'] would run"
+    assert all(status[stage['name']] == 'skipped: up to date' for stage in STAGES if stage['name'] not in LEAD_TIME_STAGES)
+
+    # Nothing ran
+    assert not os.path.exists(root / 'Data' / 'Prepped' / 'lead_time_data.csv')
+    assert load_manifest(root) == manifest
+
+def test_changed_raw_input_with_targets(root):
+    (root / 'Data' / 'Raw' / 'PurchasesFINAL12312016.csv').write_text('changed')
+    status = run_pipeline(root, targets=['train_lead_time_model'], dry_run=True)
+
+    assert status == {
+        'data_load': 'would run: inputs or code changed',
+        'lead_time_data': "would run: upstream ['data_load'] would run",
+        'winsorize_lead_time': "would run: upstream ['lead_time_data'] would run",
+        'train_lead_time_model': "would run: upstream ['winsorize_lead_time'] would run",
+    }